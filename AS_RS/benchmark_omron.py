@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+OMRON AS/RS Throughput Benchmark
+Compares single-task execution with parallel execution on the mock PLC,
+drives the controller with mixed traffic, load-tests the HTTP API with
+many concurrent keep-alive clients and tracks import (start-up) time.
+Results can be saved as JSON and compared with an earlier run.
+"""
+
+import argparse
+import copy
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+from omron_asrs_api import ASRSApiServer
+from omron_asrs_controller import OmronASRSController
+from omron_asrs_core import ASRSTask, TaskType, configure_logging
+from omron_asrs_latency import percentile
+from omron_asrs_loadgen import LoadGenerator, LoadMix, instrument_locks
+from omron_asrs_sim import QUIET_LOGGERS, HandlingModel, SimulatedPLC
+from omron_asrs_waves import DistanceMatrix, nearest_neighbour, plan_route
+
+
+def make_controller(base_config, max_parallel_tasks, mock_latency, handling=None, before_start=None,
+                    **safety):
+    """Controller on the mock PLC with the given execution width
+
+    With a HandlingModel the controller talks to the simulated PLC
+    instead, where LED writes also take the (wall-clock) move time.
+    """
+    config = copy.deepcopy(base_config)
+    config.setdefault('safety', {}).update(safety)
+    config['shared_occupancy'] = {"enabled": False}
+    config['history'] = {"archive_enabled": False, "latency_window": 100000}
+    config['communication'].update(use_mock=True, mock_latency=mock_latency)
+    config['operations']['scheduling']['max_parallel_tasks'] = max_parallel_tasks
+    # Operators press briefly; poll fast enough to see it
+    config['operations']['pushbuttons'].update(poll_interval_seconds=0.01, debounce_seconds=0.01)
+    controller = OmronASRSController(config=config)
+    controller.initialize()
+    if handling is not None:
+        SimulatedPLC.attach(controller, handling, mock_latency)
+    if before_start:
+        before_start(controller)
+    controller.start()
+    return controller
+
+
+def run_parallel_benchmark(base_config, max_parallel_tasks, mock_latency, rounds):
+    """Store then retrieve on every position; returns tasks/sec"""
+    controller = make_controller(base_config, max_parallel_tasks, mock_latency)
+    positions = list(controller.position_manager.positions.values())
+
+    try:
+        start = time.perf_counter()
+        submitted = 0
+        for round_number in range(rounds):
+            for position in positions:
+                controller.submit_task(ASRSTask(f"BENCH-S-{round_number}-{position.id}",
+                                                TaskType.STORE_ITEM, position, f"BENCH-{position.id}"))
+                # Same position: has to wait for the store above
+                controller.submit_task(ASRSTask(f"BENCH-R-{round_number}-{position.id}",
+                                                TaskType.RETRIEVE_ITEM, position))
+                submitted += 2
+        controller.wait_until_idle()
+        elapsed = time.perf_counter() - start
+    finally:
+        controller.stop()
+
+    failed = controller.history.total - controller.history.status_counts.get("completed", 0)
+    return {
+        "max_parallel_tasks": max_parallel_tasks,
+        "tasks": submitted,
+        "failed": failed,
+        "elapsed_s": round(elapsed, 3),
+        "tasks_per_sec": round(submitted / elapsed, 1),
+    }
+
+
+def run_load_benchmark(base_config, mix, clients, duration, mock_latency, max_parallel_tasks=3,
+                       rate=0.0, handling=None):
+    """Mixed traffic from closed-loop clients; tasks/sec, latency, lock contention, CPU per task"""
+    locks = {}
+
+    def instrument(controller):
+        locks.update(instrument_locks(controller))
+
+    # Stock-outs and a full rack are part of the mix; don't log each one
+    loggers = [logging.getLogger(name) for name in QUIET_LOGGERS]
+    levels = [each.level for each in loggers]
+    for each in loggers:
+        each.setLevel(logging.CRITICAL)
+    controller = make_controller(base_config, max_parallel_tasks, mock_latency, handling,
+                                 before_start=instrument)
+    try:
+        result = LoadGenerator(controller, mix, clients, duration, rate).run(locks)
+    finally:
+        controller.stop()
+        for each, level in zip(loggers, levels):
+            each.setLevel(level)
+
+    result = result.to_dict()
+    result.update(plc="simulated" if handling else "mock", max_parallel_tasks=max_parallel_tasks)
+    return result
+
+
+def run_api_benchmark(base_config, clients, duration, mock_latency, max_parallel_tasks=6):
+    """Concurrent clients, each on its own position, for duration seconds
+
+    Every client keeps one connection open and loops: store (queued,
+    202), read its position, retrieve once the store is done (?wait),
+    and poll the retrieve task.
+    """
+    controller = make_controller(base_config, max_parallel_tasks, mock_latency)
+    api = ASRSApiServer(controller, port=0)
+    port = api.start()
+    position_ids = sorted(controller.position_manager.positions)[:clients]
+    latencies = [[] for _ in position_ids]
+    errors = [0] * len(position_ids)
+    deadline = time.perf_counter() + duration
+
+    def request(connection, index, method, path, body=None):
+        started = time.perf_counter()
+        connection.request(method, path, body=json.dumps(body) if body else None,
+                           headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        payload = json.loads(response.read())
+        latencies[index].append(time.perf_counter() - started)
+        if response.status >= 400:
+            errors[index] += 1
+        return payload
+
+    def client(index, position_id):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        try:
+            while time.perf_counter() < deadline:
+                stored = request(connection, index, "POST", "/store",
+                                 {"product_id": f"LOAD-{position_id}", "position_id": position_id})
+                request(connection, index, "GET", f"/positions/{position_id}")
+                request(connection, index, "GET", f"/tasks/{stored.get('task_id')}?wait=5")
+                retrieved = request(connection, index, "POST", "/retrieve", {"position_id": position_id})
+                request(connection, index, "GET", f"/tasks/{retrieved.get('task_id')}?wait=5")
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=client, args=(index, position_id))
+               for index, position_id in enumerate(position_ids)]
+    start = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        api.stop()
+        controller.stop()
+
+    samples = sorted(value * 1000 for values in latencies for value in values)
+    return {
+        "clients": len(position_ids),
+        "requests": len(samples),
+        "errors": sum(errors),
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_sec": round(len(samples) / elapsed, 1),
+        "p50_ms": round(percentile(samples, 50), 2),
+        "p99_ms": round(percentile(samples, 99), 2),
+    }
+
+
+def run_estop_benchmark(base_config, trials, mock_latency, dedicated_watcher=True):
+    """Kill switch set on the simulated PLC with tasks in flight -> all LEDs off
+
+    Returns end-to-end times (ms) as seen from the simulator.
+    """
+    samples = []
+    for trial in range(trials):
+        controller = make_controller(base_config, 3, mock_latency, dedicated_watcher=dedicated_watcher)
+        plc = controller.opc_client.client.mock_values
+        leds = [position.led_node for position in controller.position_manager.positions.values()]
+        try:
+            for position_id in range(1, 11):
+                controller.store_item_at_position(position_id, f"ESTOP-{trial}-{position_id}")
+            time.sleep(0.05 + (trial % 5) * 0.007)  # vary where in the poll cycle the kill lands
+
+            kill_at = time.perf_counter()
+            plc[controller.config['control_nodes']['emergency_kill']] = True
+            while any(plc[led] for led in leds) or controller.status.value != "emergency_stop":
+                time.sleep(0.0005)
+            samples.append((time.perf_counter() - kill_at) * 1000)
+        finally:
+            controller.stop()
+
+    samples.sort()
+    return {
+        "trials": trials,
+        "p50_ms": round(percentile(samples, 50), 1),
+        "p99_ms": round(percentile(samples, 99), 1),
+        "max_ms": round(samples[-1], 1),
+    }
+
+
+def run_wave_benchmark(stops, grid=(40, 25), trials=5, seed=35):
+    """Planning time and route length for random orders on a large synthetic grid"""
+    rows, columns = grid
+    cells = {row * columns + column: (row + 1, column + 1)
+             for row in range(rows) for column in range(columns)}
+    matrix = DistanceMatrix(cells)
+
+    rng = random.Random(seed)
+    timings, unplanned, greedy, planned = [], 0, 0, 0
+    for _ in range(trials):
+        order = rng.sample(sorted(cells), stops)
+        started = time.perf_counter()
+        route = plan_route(matrix, order)
+        timings.append((time.perf_counter() - started) * 1000)
+
+        def length(keys):
+            return matrix.route_length([0] + [matrix.node_of[key] for key in keys] + [0])
+        unplanned += length(order)
+        greedy += matrix.route_length(nearest_neighbour(matrix.rows, [matrix.node_of[k] for k in order]) + [0])
+        planned += length(route)
+
+    timings.sort()
+    return {
+        "stops": stops,
+        "p50_ms": round(percentile(timings, 50), 1),
+        "max_ms": round(timings[-1], 1),
+        "unplanned": unplanned // trials,
+        "nearest_neighbour": greedy // trials,
+        "planned": planned // trials,
+    }
+
+
+# Import budget per entry module (python -X importtime, warm bytecode cache)
+IMPORT_BUDGET_MS = 250
+IMPORT_MODULES = ("omron_asrs_controller", "omron_asrs_app", "omron_asrs_api", "omron_asrs_sim")
+
+
+def run_import_benchmark(module, runs=5):
+    """Median import time of a module in fresh interpreters, and the slowest modules it pulls in"""
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)  # measure start-up as deployed, with .pyc files
+    command = [sys.executable, "-X", "importtime", "-c", f"import {module}"]
+    subprocess.run(command, env=env, capture_output=True, check=True)  # warm the bytecode cache
+
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        stderr = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stderr
+        wall = (time.perf_counter() - started) * 1000
+        modules = {}  # name -> (self us, cumulative us)
+        for line in stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+                continue
+            own, cumulative, name = line[len("import time:"):].split("|")
+            modules[name.strip()] = (int(own), int(cumulative))
+        samples.append((modules[module][1] / 1000, wall, modules))
+
+    samples.sort(key=lambda sample: sample[0])
+    import_ms, wall_ms, modules = samples[len(samples) // 2]
+    slowest = sorted(modules.items(), key=lambda item: -item[1][0])[:5]
+    return {
+        "module": module,
+        "import_ms": round(import_ms, 1),
+        "process_ms": round(wall_ms, 1),
+        "modules": len(modules),
+        "within_budget": import_ms <= IMPORT_BUDGET_MS,
+        "slowest": [{"module": name, "self_ms": round(own / 1000, 1)} for name, (own, _) in slowest],
+    }
+
+
+# Identity of a result within its section, and the metrics compared across runs
+# (higher_is_better for each)
+_COMPARE = {
+    "parallel": (("max_parallel_tasks",), {"tasks_per_sec": True}),
+    "load": (("mix", "clients", "plc"), {"tasks_per_sec": True, "cpu_per_task_ms": False}),
+    "api": (("clients",), {"requests_per_sec": True, "p99_ms": False}),
+    "waves": (("stops",), {"p50_ms": False, "planned": False}),
+    "estop": (("path",), {"p50_ms": False, "max_ms": False}),
+    "imports": (("module",), {"import_ms": False, "process_ms": False}),
+}
+
+
+def run_metadata(args) -> dict:
+    """What produced a result file: code revision, interpreter, machine, arguments"""
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                  text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        revision = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "arguments": vars(args),
+    }
+
+
+def compare_results(baseline: dict, current: dict):
+    """Print metric changes between two saved runs"""
+    print(f"\n📈 Compared with {baseline['meta'].get('revision')} ({baseline['meta'].get('timestamp')})")
+    for section, (keys, metrics) in _COMPARE.items():
+        old_rows = {tuple(row.get(key) for key in keys): row for row in baseline["results"].get(section, [])}
+        for row in current["results"].get(section, []):
+            identity = tuple(row.get(key) for key in keys)
+            old = old_rows.get(identity)
+            if not old:
+                continue
+            for metric, higher_is_better in metrics.items():
+                before, after = old.get(metric), row.get(metric)
+                if not before or after is None:
+                    continue
+                change = (after - before) / before * 100
+                better = change >= 0 if higher_is_better else change <= 0
+                print(f"   {section:<8} {'/'.join(map(str, identity)):<28} {metric:<16} "
+                      f"{before:>9} → {after:>9}  {change:+6.1f}% {'✅' if better else '⚠️'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OMRON AS/RS throughput benchmark")
+    parser.add_argument("--config", default="omron_asrs_config.json")
+    parser.add_argument("--latency", type=float, default=0.005, help="mock PLC round-trip (s)")
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--width", type=int, nargs="+", default=[1, 3, 6])
+    parser.add_argument("--mix", nargs="*", default=[],
+                        help="also run mixed traffic, e.g. store=4,retrieve=4,display=1,button=1")
+    parser.add_argument("--clients", type=int, nargs="+", default=[4], help="load clients per mix")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per load run")
+    parser.add_argument("--rate", type=float, default=0.0, help="total operations/s (0 = flat out)")
+    parser.add_argument("--plc", choices=("mock", "simulated"), default="mock",
+                        help="simulated: LED writes also take the move time (see --cell-ms)")
+    parser.add_argument("--cell-ms", type=float, default=1.0, help="simulated travel per grid step (ms)")
+    parser.add_argument("--api-clients", type=int, nargs="*", default=[],
+                        help="also load-test the HTTP API with these client counts")
+    parser.add_argument("--api-duration", type=float, default=5.0, help="seconds per API run")
+    parser.add_argument("--wave-stops", type=int, nargs="*", default=[],
+                        help="also benchmark wave planning for orders of these sizes (40x25 grid)")
+    parser.add_argument("--estop-trials", type=int, default=0,
+                        help="also measure emergency-stop reaction time over this many trials")
+    parser.add_argument("--imports", action="store_true",
+                        help=f"also measure import time of the entry modules (budget {IMPORT_BUDGET_MS} ms)")
+    parser.add_argument("--json", help="save all results (with revision and platform) to this file")
+    parser.add_argument("--compare", help="compare with results saved earlier by --json")
+    args = parser.parse_args()
+
+    configure_logging(logging.WARNING)
+    with open(args.config, 'r') as f:
+        base_config = json.load(f)
+    results = {"parallel": [], "load": [], "api": [], "waves": [], "estop": [], "imports": []}
+
+    print("⏱️  OMRON AS/RS Parallel Execution Benchmark")
+    print(f"   Mock PLC latency: {args.latency * 1000:.1f} ms, rounds: {args.rounds}")
+    print(f"   {'Width':>5}  {'Tasks':>6}  {'Failed':>6}  {'Time (s)':>8}  {'Tasks/s':>8}")
+
+    baseline = None
+    for width in args.width:
+        result = run_parallel_benchmark(base_config, width, args.latency, args.rounds)
+        results["parallel"].append(result)
+        baseline = baseline or result["tasks_per_sec"]
+        print(f"   {width:>5}  {result['tasks']:>6}  {result['failed']:>6}  "
+              f"{result['elapsed_s']:>8}  {result['tasks_per_sec']:>8}  "
+              f"(x{result['tasks_per_sec'] / baseline:.1f})")
+
+    if args.mix:
+        handling = HandlingModel(0.0, args.cell_ms / 1000) if args.plc == "simulated" else None
+        print(f"\n🔀 Mixed Traffic ({args.plc} PLC, {args.duration:g} s per run)")
+        print(f"   {'Mix':<36}  {'Clients':>7}  {'Tasks':>6}  {'Tasks/s':>8}  {'CPU/task ms':>11}  "
+              f"{'Contended':>9}")
+        for spec in args.mix:
+            for clients in args.clients:
+                result = run_load_benchmark(base_config, LoadMix.parse(spec), clients, args.duration,
+                                            args.latency, rate=args.rate, handling=handling)
+                results["load"].append(result)
+                contended = sum(lock["contended"] for lock in result["locks"].values())
+                print(f"   {result['mix']:<36}  {clients:>7}  {result['tasks']:>6}  "
+                      f"{result['tasks_per_sec']:>8}  {result['cpu_per_task_ms']:>11}  {contended:>9}")
+                for operation, stats in result["operations"].items():
+                    print(f"      {operation:<9} {stats['issued']:>6} issued {stats.get('completed', 0):>6} ok "
+                          f"{stats.get('rejected', 0):>6} rejected {stats.get('timeout', 0):>3} timeouts  "
+                          f"p50 {stats.get('p50_ms', '-')} ms  p99 {stats.get('p99_ms', '-')} ms")
+                busiest = sorted(result["locks"].items(), key=lambda item: -item[1]["wait_ms"])[:3]
+                for name, lock in busiest:
+                    print(f"      🔒 {name:<17} {lock['contention_ratio']:>7.2%} contended, "
+                          f"{lock['wait_ms']} ms waiting (max {lock['max_wait_ms']} ms)")
+
+    if args.api_clients:
+        print("\n🌐 HTTP API Load Test (keep-alive, one position per client)")
+        print(f"   {'Clients':>7}  {'Requests':>8}  {'Errors':>6}  {'Req/s':>8}  {'p50 ms':>7}  {'p99 ms':>7}")
+        for clients in args.api_clients:
+            result = run_api_benchmark(base_config, clients, args.api_duration, args.latency)
+            results["api"].append(result)
+            print(f"   {result['clients']:>7}  {result['requests']:>8}  {result['errors']:>6}  "
+                  f"{result['requests_per_sec']:>8}  {result['p50_ms']:>7}  {result['p99_ms']:>7}")
+
+    if args.wave_stops:
+        print("\n🌊 Wave Planning (random orders on a 40×25 grid, round trip from R1C1)")
+        print(f"   {'Stops':>5}  {'p50 ms':>7}  {'Max ms':>7}  {'As typed':>8}  {'NN':>6}  {'NN+2opt':>7}")
+        for stops in args.wave_stops:
+            result = run_wave_benchmark(stops)
+            results["waves"].append(result)
+            print(f"   {stops:>5}  {result['p50_ms']:>7}  {result['max_ms']:>7}  {result['unplanned']:>8}  "
+                  f"{result['nearest_neighbour']:>6}  {result['planned']:>7}")
+
+    if args.estop_trials:
+        print("\n🚨 Emergency Stop Reaction (kill set -> all outputs off, tasks in flight)")
+        print(f"   {'Path':<18}  {'Trials':>6}  {'p50 ms':>7}  {'p99 ms':>7}  {'Max ms':>7}")
+        for label, dedicated in (("safety watcher", True), ("monitoring loop", False)):
+            result = run_estop_benchmark(base_config, args.estop_trials, args.latency, dedicated)
+            results["estop"].append(dict(result, path=label))
+            print(f"   {label:<18}  {result['trials']:>6}  {result['p50_ms']:>7}  "
+                  f"{result['p99_ms']:>7}  {result['max_ms']:>7}")
+
+    if args.imports:
+        print(f"\n📦 Import Time (python -X importtime, median of 5, budget {IMPORT_BUDGET_MS} ms)")
+        print(f"   {'Module':<21}  {'Import ms':>9}  {'Process ms':>10}  {'Modules':>7}  Slowest (self ms)")
+        for module in IMPORT_MODULES:
+            result = run_import_benchmark(module)
+            results["imports"].append(result)
+            slowest = ", ".join(f"{entry['module']} {entry['self_ms']}" for entry in result["slowest"][:3])
+            print(f"   {module:<21}  {result['import_ms']:>9}  {result['process_ms']:>10}  "
+                  f"{result['modules']:>7}  {slowest} {'✅' if result['within_budget'] else '⚠️'}")
+
+    report = {"meta": run_metadata(args), "results": results}
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results saved to {args.json}")
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare_results(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+"""
+OMRON AS/RS HTTP API
+Headless JSON interface for WMS integration (stdlib HTTP/1.1 server, keep-alive)
+
+Store and retrieve requests are queued and answered right away with
+202 and the task; GET /tasks/<id> (or ?wait=<seconds> on the request)
+reports the outcome.
+
+/events streams a full snapshot first and then only deltas from the
+controller's event bus, so any number of screens can watch the rack
+without polling the controller or the PLC.
+
+    GET  /status                  system status
+    GET  /positions[/<id>]        position details
+    GET  /tasks/<id>[?wait=s]     task state
+    GET  /events[?types=a,b]      live rack state (Server-Sent Events)
+    POST /store                   {"product_id", "position_id"?, "expires_at"?, "priority"?}
+    POST /retrieve                {"position_id"} or {"product_id", "policy"?}
+    POST /batch/store             {"items": [{"product_id", "position_id"?, "expires_at"?}, ...]}
+    POST /batch/retrieve          {"items": [{"product_id"?, "position_id"?}, ...], "policy"?}
+    POST /wave                    {"lines": [{"product_id", "quantity"?}, ...], "policy"?, "plan_only"?}
+"""
+
+import argparse
+import json
+import logging
+import socket
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from omron_asrs_core import ASRSStatus, RetrievalPolicy, TaskHandle, TaskPriority
+from omron_asrs_events import DropPolicy, EventType
+from omron_asrs_waves import OrderLine
+
+logger = logging.getLogger(__name__)
+
+# Longest a client may block on ?wait=
+MAX_WAIT_SECONDS = 30.0
+
+# Event stream: idle keep-alive comment interval, buffered events per client
+# and how long a write to a client that stopped reading may block
+STREAM_HEARTBEAT_SECONDS = 15.0
+STREAM_QUEUE_SIZE = 256
+STREAM_WRITE_TIMEOUT = 5.0
+
+
+class APIError(Exception):
+    """Request failure reported to the client as {"error": message}"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _task_json(task) -> Dict[str, Any]:
+    """ASRSTask or TaskRecord as JSON"""
+    def ts(value):
+        return value.isoformat() if value else None
+
+    position_id = getattr(task, "position_id", None)
+    if position_id is None and getattr(task, "position", None) is not None:
+        position_id = task.position.id
+    return {
+        "task_id": task.task_id,
+        "task_type": task.task_type.value,
+        "status": task.status,
+        "position_id": position_id,
+        "product_id": task.product_id,
+        "result": task.result,
+        "created_at": ts(task.created_at),
+        "started_at": ts(task.started_at),
+        "completed_at": ts(task.completed_at),
+    }
+
+
+def _sse(event: str, data: Any, event_id: Optional[int] = None) -> bytes:
+    """One Server-Sent Events message"""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise APIError(400, f"Invalid datetime: {value}")
+
+
+def _parse_policy(value: Optional[str]) -> Optional[RetrievalPolicy]:
+    if not value:
+        return None
+    try:
+        return RetrievalPolicy(value.lower())
+    except ValueError:
+        raise APIError(400, f"Unknown retrieval policy: {value}")
+
+
+def _parse_int(value: Any, name: str) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise APIError(400, f"{name} must be an integer")
+
+
+class _ThreadingAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many WMS clients connect at once; the default backlog of 5 resets them
+    request_queue_size = 128
+
+
+class ASRSApiServer:
+    """Threaded HTTP server exposing an OmronASRSController"""
+
+    def __init__(self, controller, host: str = "127.0.0.1", port: int = 8080, max_tracked_tasks: int = 10000,
+                 stream_queue_size: int = STREAM_QUEUE_SIZE):
+        self.controller = controller
+        self.host = host
+        self.port = port
+        self.max_tracked_tasks = max_tracked_tasks
+        self.stream_queue_size = stream_queue_size
+        # Event subscriptions of connected /events clients (closed on stop)
+        self._streams = set()
+        self._streams_lock = threading.Lock()
+        # Handles of tasks submitted through the API, most recent last
+        self._handles: "OrderedDict[str, TaskHandle]" = OrderedDict()
+        self._handles_lock = threading.Lock()
+        self._server: Optional[_ThreadingAPIServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_config(cls, controller) -> "ASRSApiServer":
+        api_config = controller.config.get('api', {})
+        return cls(controller, api_config.get('host', '127.0.0.1'), api_config.get('port', 8080),
+                   api_config.get('max_tracked_tasks', 10000),
+                   api_config.get('stream_queue_size', STREAM_QUEUE_SIZE))
+
+    def start(self) -> int:
+        """Serve from a daemon thread; returns the bound port (useful with port 0)"""
+        api = self
+
+        class Handler(_APIRequestHandler):
+            server_api = api
+
+        self._server = _ThreadingAPIServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="asrs-api", daemon=True)
+        self._thread.start()
+        logger.info(f"🌐 AS/RS API listening on http://{self.host}:{self.port}")
+        return self.port
+
+    def stop(self):
+        with self._streams_lock:
+            streams = list(self._streams)
+        for subscription in streams:
+            subscription.close()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join(timeout=2)
+            self._server = None
+
+    @property
+    def stream_count(self) -> int:
+        return len(self._streams)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Full rack state sent when a stream starts or has to resynchronise"""
+        occupancy = self.controller.position_manager.get_occupancy_stats()
+        return {
+            "status": self.controller.status.value,
+            "emergency_stop": self.controller.status == ASRSStatus.EMERGENCY_STOP,
+            "occupancy": {key: value for key, value in occupancy.items() if key != "grid_layout"},
+            "active_tasks": sorted(task.task_id for task in list(self.controller.active_tasks)),
+            "positions": self.controller.get_position_details(),
+        }
+
+    def open_stream(self, event_types=None):
+        subscription = self.controller.subscribe(event_types, self.stream_queue_size, DropPolicy.DROP_OLDEST)
+        with self._streams_lock:
+            self._streams.add(subscription)
+        return subscription
+
+    def close_stream(self, subscription):
+        subscription.close()
+        with self._streams_lock:
+            self._streams.discard(subscription)
+
+    # Request handling (returns status code and JSON body)
+
+    def handle(self, method: str, path: str, query: Dict[str, str],
+               body: Dict[str, Any]) -> Tuple[int, Any]:
+        parts = [part for part in path.split("/") if part]
+
+        if method == "GET":
+            if parts == ["status"]:
+                return 200, self.controller.get_system_status()
+            if parts == ["positions"]:
+                return 200, self.controller.get_position_details()
+            if len(parts) == 2 and parts[0] == "positions":
+                return 200, self._position(_parse_int(parts[1], "position_id"))
+            if len(parts) == 2 and parts[0] == "tasks":
+                return self._task(parts[1], query.get("wait"))
+        elif method == "POST":
+            if parts == ["store"]:
+                return self._respond_handle(self._store(body), query.get("wait"))
+            if parts == ["retrieve"]:
+                return self._respond_handle(self._retrieve(body), query.get("wait"))
+            if parts == ["batch", "store"]:
+                return 200, self._batch_store(body)
+            if parts == ["batch", "retrieve"]:
+                return 200, self._batch_retrieve(body)
+            if parts == ["wave"]:
+                return 200, self._wave(body)
+        else:
+            raise APIError(405, f"Method {method} not allowed")
+
+        raise APIError(404, f"No route for {method} {path}")
+
+    def _position(self, position_id: int) -> Dict[str, Any]:
+        for details in self.controller.get_position_details():
+            if details["id"] == position_id:
+                return details
+        raise APIError(404, f"Position {position_id} not found")
+
+    def _known_position(self, position_id: Optional[int]) -> Optional[int]:
+        """404 for IDs outside the rack, so 409 only ever means a real conflict"""
+        if position_id is not None and position_id not in self.controller.position_manager.positions:
+            raise APIError(404, f"Position {position_id} not found")
+        return position_id
+
+    def _store(self, body: Dict[str, Any]) -> Optional[TaskHandle]:
+        product_id = body.get("product_id")
+        if not product_id:
+            raise APIError(400, "product_id is required")
+        position_id = self._known_position(_parse_int(body.get("position_id"), "position_id"))
+        expires_at = _parse_datetime(body.get("expires_at"))
+        priority = _parse_int(body.get("priority"), "priority")
+        priority = TaskPriority.NORMAL if priority is None else priority
+
+        if position_id is not None:
+            return self.controller.store_item_at_position(position_id, str(product_id), expires_at, priority)
+        return self.controller.store_item_auto_position(str(product_id), expires_at, priority)
+
+    def _retrieve(self, body: Dict[str, Any]) -> Optional[TaskHandle]:
+        position_id = self._known_position(_parse_int(body.get("position_id"), "position_id"))
+        priority = _parse_int(body.get("priority"), "priority")
+        priority = TaskPriority.NORMAL if priority is None else priority
+
+        if position_id is not None:
+            return self.controller.retrieve_item_from_position(position_id, priority)
+        if body.get("product_id"):
+            return self.controller.retrieve_item_by_product(str(body["product_id"]),
+                                                            _parse_policy(body.get("policy")), priority)
+        raise APIError(400, "position_id or product_id is required")
+
+    def _batch_store(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        items = []
+        for item in self._batch_items(body):
+            if not item.get("product_id"):
+                raise APIError(400, "Every item needs a product_id")
+            items.append((str(item["product_id"]), _parse_int(item.get("position_id"), "position_id"),
+                          _parse_datetime(item.get("expires_at"))))
+        return {"results": self.controller.store_items_batch(items)}
+
+    def _batch_retrieve(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        items = [(item.get("product_id"), _parse_int(item.get("position_id"), "position_id"))
+                 for item in self._batch_items(body)]
+        return {"results": self.controller.retrieve_items_batch(items, _parse_policy(body.get("policy")))}
+
+    def _wave(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        lines = []
+        for line in body.get("lines") or []:
+            if not isinstance(line, dict) or not line.get("product_id"):
+                raise APIError(400, "Every line needs a product_id")
+            quantity = _parse_int(line.get("quantity"), "quantity")
+            lines.append(OrderLine(str(line["product_id"]), 1 if quantity is None else quantity))
+        if not lines:
+            raise APIError(400, "lines must be a non-empty list")
+
+        policy = _parse_policy(body.get("policy"))
+        if body.get("plan_only"):
+            plan, results = self.controller.plan_wave(lines, policy), None
+        else:
+            plan, results = self.controller.pick_wave(lines, policy)
+        return {
+            "picks": [{"position_id": position_id, "product_id": product_id}
+                      for position_id, product_id in plan.picks],
+            "shortages": plan.shortages,
+            "distance": plan.distance,
+            "unplanned_distance": plan.unplanned_distance,
+            "planning_ms": round(plan.planning_ms, 3),
+            "results": results,
+        }
+
+    @staticmethod
+    def _batch_items(body: Dict[str, Any]):
+        items = body.get("items")
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise APIError(400, "items must be a list of objects")
+        return items
+
+    def _respond_handle(self, handle: Optional[TaskHandle], wait: Optional[str]) -> Tuple[int, Any]:
+        if handle is None:
+            raise APIError(409, "Task was not queued (position unavailable or already pending)")
+        with self._handles_lock:
+            self._handles[handle.task_id] = handle
+            self._handles.move_to_end(handle.task_id)
+            while len(self._handles) > self.max_tracked_tasks:
+                self._handles.popitem(last=False)
+        return self._handle_response(handle, wait)
+
+    def _task(self, task_id: str, wait: Optional[str]) -> Tuple[int, Any]:
+        with self._handles_lock:
+            handle = self._handles.get(task_id)
+        if handle is not None:
+            return self._handle_response(handle, wait)
+
+        # Tasks submitted elsewhere (console, push buttons) once they finished
+        for record in reversed(self.controller.history.recent()):
+            if record.task_id == task_id:
+                return 200, _task_json(record)
+        raise APIError(404, f"Task {task_id} not found")
+
+    @staticmethod
+    def _handle_response(handle: TaskHandle, wait: Optional[str]) -> Tuple[int, Any]:
+        if wait:
+            try:
+                handle.wait(min(max(float(wait), 0.0), MAX_WAIT_SECONDS))
+            except ValueError:
+                raise APIError(400, "wait must be a number of seconds")
+        return (200 if handle.done() else 202), _task_json(handle.task)
+
+
+class _APIRequestHandler(BaseHTTPRequestHandler):
+    """JSON over HTTP/1.1; connections stay open between requests"""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY every
+    # keep-alive response stalls on the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+    server_api: ASRSApiServer = None
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method: str):
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if method == "GET" and url.path.rstrip("/") == "/events":
+            self._stream_events(query)
+            return
+        try:
+            body = self._read_body()
+            status, payload = self.server_api.handle(method, url.path, query, body)
+        except APIError as e:
+            status, payload = e.status, {"error": str(e)}
+        except Exception as e:
+            logger.error(f"❌ API error on {method} {self.path}: {e}")
+            status, payload = 500, {"error": "Internal error"}
+        self._send_json(status, payload)
+
+    def _stream_events(self, query: Dict[str, str]):
+        """Snapshot, then deltas until the client or the server goes away
+
+        Each client has a bounded queue. If it falls behind, the oldest
+        events are dropped and it gets a fresh snapshot instead, so a slow
+        screen costs the controller nothing and still ends up correct. A
+        client that stops reading altogether is disconnected after
+        STREAM_WRITE_TIMEOUT.
+        """
+        try:
+            event_types = [EventType(name) for name in query["types"].split(",")] if query.get("types") else None
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        api = self.server_api
+        subscription = api.open_stream(event_types)
+        self.close_connection = True
+        try:
+            self.connection.settimeout(STREAM_WRITE_TIMEOUT)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(_sse("snapshot", api.snapshot()))
+
+            dropped = 0
+            while not subscription.closed:
+                event = subscription.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                if subscription.dropped != dropped:
+                    dropped = subscription.dropped
+                    subscription.drain()
+                    self.wfile.write(_sse("snapshot", api.snapshot()))
+                elif event is not None:
+                    self.wfile.write(_sse(event.event_type.value, event.data, event.sequence))
+                elif not subscription.closed:
+                    self.wfile.write(b": keep-alive\n\n")
+        except (BrokenPipeError, ConnectionResetError, socket.timeout):
+            logger.debug(f"🌐 Event stream to {self.address_string()} closed")
+        finally:
+            api.close_stream(subscription)
+
+    def _read_body(self) -> Dict[str, Any]:
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            if length < 0:
+                raise ValueError(length)
+        except ValueError:
+            # The body's extent is unknown, so the connection cannot be reused
+            self.close_connection = True
+            raise APIError(400, "Invalid Content-Length header")
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except (ValueError, UnicodeDecodeError):
+            raise APIError(400, "Request body must be JSON")
+        if not isinstance(body, dict):
+            raise APIError(400, "Request body must be a JSON object")
+        return body
+
+    def _send_json(self, status: int, payload: Any):
+        data = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(f"🌐 {self.address_string()} {format % args}")
+
+
+def main():
+    from omron_asrs_controller import OmronASRSController
+    from omron_asrs_core import configure_logging
+
+    parser = argparse.ArgumentParser(description="OMRON AS/RS headless HTTP API")
+    parser.add_argument("--config", default="omron_asrs_config.json")
+    parser.add_argument("--host", help="bind address (default: api.host or 127.0.0.1)")
+    parser.add_argument("--port", type=int, help="port (default: api.port or 8080)")
+    args = parser.parse_args()
+
+    configure_logging()
+    controller = OmronASRSController(args.config)
+    if not controller.initialize():
+        raise SystemExit("❌ Failed to initialize AS/RS system")
+    controller.start()
+
+    api = ASRSApiServer.from_config(controller)
+    api.host = args.host or api.host
+    api.port = args.port if args.port is not None else api.port
+    api.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.stop()
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
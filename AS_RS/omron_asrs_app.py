@@ -4,9 +4,20 @@ OMRON Auto Rack35 AS/RS Control Application
 Interactive control interface for 35-position storage system
 """
 
+import logging
 import sys
 import time
-from omron_asrs_controller import *
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from omron_asrs_controller import OmronASRSController
+from omron_asrs_core import PositionStatus, RetrievalPolicy, TaskHandle, TaskPriority, configure_logging
+from omron_asrs_events import EventType
+from omron_asrs_script import USAGE as SCRIPT_USAGE, CommandScript, read_batch_csv
+from omron_asrs_waves import OrderLine
+
+logger = logging.getLogger(__name__)
+
 
 class OmronASRSApplication:
     """Main application for OMRON Auto Rack35 AS/RS control"""
@@ -82,6 +93,21 @@ class OmronASRSApplication:
                 elif command == 'E':
                     self.check_emergency_status()
 
+                elif command == 'C':
+                    self.cancel_task_interface()
+
+                elif command == 'B':
+                    self.batch_interface()
+
+                elif command == 'X':
+                    self.export_latency_interface()
+
+                elif command == 'W':
+                    self.wave_pick_interface()
+
+                elif command == 'V':
+                    self.run_tui()
+
                 elif command == 'H':
                     self.show_help()
 
@@ -117,8 +143,10 @@ class OmronASRSApplication:
         print("  [R] → Retrieve Item          [P] → Position Details")  
         print("  [T] → System Status          [M] → Monitor Push Buttons")
         print("  [L] → List Stored Items      [U] → Update LED Display")
-        print("  [E] → Emergency Status       [H] → Help")
-        print("  [Q] → Quit System")
+        print("  [E] → Emergency Status       [C] → Cancel Pending Task")
+        print("  [B] → Batch from CSV File    [X] → Export Latency CSV")
+        print("  [W] → Wave Pick Order        [V] → Live Rack View (full screen)")
+        print("  [H] → Help                   [Q] → Quit System")
         print("-" * 60)
 
     def display_live_grid(self):
@@ -130,12 +158,12 @@ class OmronASRSApplication:
         print("   📦 STORAGE RACK LAYOUT - LIVE STATUS")
         print("="*60)
         print(f"Occupancy: {stats['occupied_positions']}/{stats['total_positions']} ({stats['occupancy_percent']}%)")
-        print("Legend: [##] = Occupied, ## = Empty")
+        print("Legend: [##] = Occupied, <##> = Reserved, ## = Empty")
         print()
 
         # Display column headers
         print("    ", end="")
-        for col in range(1, 6):  # Columns 1-5
+        for col in range(1, self.controller.config['storage_rack']['layout']['columns'] + 1):
             print(f"  C{col}  ", end="")
         print()
 
@@ -156,6 +184,15 @@ class OmronASRSApplication:
                 time_str = task.completed_at.strftime("%H:%M:%S") if task.completed_at else "Unknown"
                 print(f"  {time_str}: {task.task_type.value} - {task.status}")
 
+    def run_script(self, lines, output=None, sync: bool = False) -> Dict[str, Any]:
+        """Run text commands without prompting, writing JSONL results (stdout by default)"""
+        return CommandScript(self.controller, output, sync=sync).run(lines)
+
+    def run_tui(self) -> bool:
+        """Full-screen live rack view, redrawn from controller events"""
+        from omron_asrs_tui import RackTUI
+        return RackTUI(self.controller).run()
+
     def store_item_interface(self):
         """Interactive store item interface"""
         print("\n📦 STORE ITEM IN RACK")
@@ -167,6 +204,13 @@ class OmronASRSApplication:
                 print("❌ Product ID cannot be empty")
                 return
 
+            expiry_input = input("Expiry date (YYYY-MM-DD, blank for none): ").strip()
+            try:
+                expires_at = datetime.strptime(expiry_input, "%Y-%m-%d") if expiry_input else None
+            except ValueError:
+                print("❌ Invalid expiry date")
+                return
+
             print("Storage options:")
             print("1. Auto-assign to first empty position")
             print("2. Specify position (1-35)")
@@ -175,16 +219,13 @@ class OmronASRSApplication:
 
             if choice == "1":
                 # Auto-assign position
-                if self.controller.store_item_auto_position(product_id):
+                handle = self.controller.store_item_auto_position(product_id, expires_at)
+                if handle:
                     print(f"✅ Storage task submitted for {product_id}")
 
                     # Wait for completion and show progress
-                    start_time = time.time()
-                    while self.controller.active_task and time.time() - start_time < 10:
-                        print(f"\r⏱️  Storing {product_id}... ({time.time() - start_time:.1f}s)", end='', flush=True)
-                        time.sleep(0.5)
-
-                    print("\n✅ Item stored successfully")
+                    if self._wait_for_task(handle, f"Storing {product_id}"):
+                        print("✅ Item stored successfully")
                     self.display_live_grid()
                 else:
                     print("❌ Failed to store item")
@@ -198,17 +239,17 @@ class OmronASRSApplication:
                         if position and position.occupied:
                             print(f"❌ Position {position_id} is already occupied with {position.product_id}")
                             return
+                        if position and position.status == PositionStatus.RESERVED:
+                            print(f"❌ Position {position_id} is reserved for an incoming item")
+                            return
 
-                        if self.controller.store_item_at_position(position_id, product_id):
+                        handle = self.controller.store_item_at_position(position_id, product_id, expires_at)
+                        if handle:
                             print(f"✅ Storage task submitted: {product_id} → Position {position_id}")
 
                             # Wait for completion
-                            start_time = time.time()
-                            while self.controller.active_task and time.time() - start_time < 10:
-                                print(f"\r⏱️  Storing... ({time.time() - start_time:.1f}s)", end='', flush=True)
-                                time.sleep(0.5)
-
-                            print("\n✅ Item stored successfully")
+                            if self._wait_for_task(handle, "Storing"):
+                                print("✅ Item stored successfully")
                             self.display_live_grid()
                         else:
                             print("❌ Failed to store item")
@@ -249,16 +290,14 @@ class OmronASRSApplication:
                         confirm = input("Retrieve this item? (y/N): ").strip().lower()
 
                         if confirm == 'y':
-                            if self.controller.retrieve_item_from_position(position_id):
+                            priority = self._prompt_priority()
+                            handle = self.controller.retrieve_item_from_position(position_id, priority)
+                            if handle:
                                 print(f"✅ Retrieval task submitted for position {position_id}")
 
                                 # Wait for completion
-                                start_time = time.time()
-                                while self.controller.active_task and time.time() - start_time < 10:
-                                    print(f"\r⏱️  Retrieving... ({time.time() - start_time:.1f}s)", end='', flush=True)
-                                    time.sleep(0.5)
-
-                                print("\n✅ Item retrieved successfully")
+                                if self._wait_for_task(handle, "Retrieving"):
+                                    print("✅ Item retrieved successfully")
                                 self.display_live_grid()
                             else:
                                 print("❌ Failed to retrieve item")
@@ -276,26 +315,31 @@ class OmronASRSApplication:
                     print("❌ Product ID cannot be empty")
                     return
 
-                position = self.controller.position_manager.find_product(product_id)
+                policy = self._prompt_retrieval_policy()
+                if not policy:
+                    return
+
+                position = self.controller.position_manager.find_product(product_id, policy)
                 if not position:
                     print(f"❌ Product {product_id} not found in rack")
                     return
 
-                print(f"📍 Found {product_id} at position {position.id}")
+                quantity = self.controller.position_manager.get_product_quantity(product_id)
+                print(f"📍 Found {product_id} at position {position.id} ({policy.name}, {quantity} in stock)")
                 print(f"📅 Stored at: {position.stored_at.strftime('%Y-%m-%d %H:%M:%S') if position.stored_at else 'Unknown'}")
+                if position.expires_at:
+                    print(f"⌛ Expires: {position.expires_at.strftime('%Y-%m-%d')}")
 
                 confirm = input("Retrieve this item? (y/N): ").strip().lower()
                 if confirm == 'y':
-                    if self.controller.retrieve_item_by_product(product_id):
+                    priority = self._prompt_priority()
+                    handle = self.controller.retrieve_item_by_product(product_id, policy, priority)
+                    if handle:
                         print(f"✅ Retrieval task submitted for {product_id}")
 
                         # Wait for completion
-                        start_time = time.time()
-                        while self.controller.active_task and time.time() - start_time < 10:
-                            print(f"\r⏱️  Retrieving... ({time.time() - start_time:.1f}s)", end='', flush=True)
-                            time.sleep(0.5)
-
-                        print("\n✅ Item retrieved successfully")
+                        if self._wait_for_task(handle, "Retrieving"):
+                            print("✅ Item retrieved successfully")
                         self.display_live_grid()
                     else:
                         print("❌ Failed to retrieve item")
@@ -308,6 +352,37 @@ class OmronASRSApplication:
         except Exception as e:
             print(f"❌ Error: {e}")
 
+    def _wait_for_task(self, handle: TaskHandle, label: str, timeout: float = 10) -> bool:
+        """Show progress until the task finishes; True if it succeeded"""
+        start_time = time.time()
+        while not handle.wait(min(0.1, max(0.0, timeout - (time.time() - start_time)))):
+            if time.time() - start_time >= timeout:
+                print(f"\n⏳ {handle.task_id} still running after {timeout:.0f}s")
+                return False
+            print(f"\r⏱️  {label}... ({time.time() - start_time:.1f}s)", end='', flush=True)
+
+        print()
+        if not handle.succeeded:
+            print(f"❌ {handle.task_id} {handle.status}: {handle.result}")
+        return handle.succeeded
+
+    def _prompt_priority(self) -> int:
+        """Ask for a task priority (urgent tasks jump the queue)"""
+        choice = input("Priority [N]ormal/[H]igh/[U]rgent (default N): ").strip().upper()
+        return {"H": TaskPriority.HIGH, "U": TaskPriority.URGENT}.get(choice, TaskPriority.NORMAL)
+
+    def _prompt_retrieval_policy(self) -> Optional[RetrievalPolicy]:
+        """Ask for a retrieval policy, defaulting to the configured one"""
+        default = self.controller.position_manager.default_retrieval_policy
+        choice = input(f"Retrieval policy [FIFO/LIFO/FEFO/NEAREST] (default {default.name}): ").strip().lower()
+        if not choice:
+            return default
+        try:
+            return RetrievalPolicy(choice)
+        except ValueError:
+            print(f"❌ Unknown retrieval policy: {choice}")
+            return None
+
     def show_position_details(self):
         """Show detailed position information"""
         print("\n📍 POSITION DETAILS")
@@ -381,6 +456,7 @@ class OmronASRSApplication:
         storage = status['storage']
         print(f"   Total Positions: {storage['total_positions']}")
         print(f"   Occupied: {storage['occupied_positions']}")
+        print(f"   Reserved: {storage['reserved_positions']}")
         print(f"   Available: {storage['empty_positions']}")
         print(f"   Occupancy: {storage['occupancy_percent']}%")
         print(f"   Layout: {storage['grid_layout']}")
@@ -388,9 +464,24 @@ class OmronASRSApplication:
         print(f"\n📋 TASKS:")
         tasks = status['tasks']
         print(f"   Pending: {tasks['pending']}")
-        print(f"   Active: {tasks['active'] or 'None'}")
+        print(f"   Active: {', '.join(tasks['active']) or 'None'} (max {tasks['max_parallel']} parallel)")
         print(f"   Completed: {tasks['completed']}")
 
+        if tasks['queues']:
+            print(f"\n⏳ Queues by Priority:")
+            print(f"   {'Priority':<9} {'Depth':<6} {'Oldest':<9} {'Avg Wait':<9} {'Max Wait'}")
+            for name, queue_stats in tasks['queues'].items():
+                print(f"   {name:<9} {queue_stats['depth']:<6} {queue_stats['oldest_wait_s']:<9.2f} "
+                      f"{queue_stats['avg_wait_s']:<9.2f} {queue_stats['max_wait_s']:.2f}")
+
+        if tasks['latency']:
+            print(f"\n⏱️  Task Latency (ms, last {self.controller.latency.window} per type):")
+            print(f"   {'Type':<15} {'Phase':<11} {'Count':<6} {'p50':<8} {'p90':<8} {'p99':<8} {'Max'}")
+            for task_type, metrics in tasks['latency'].items():
+                for metric, stats in metrics.items():
+                    print(f"   {task_type:<15} {metric:<11} {stats['count']:<6} {stats['p50_ms']:<8.1f} "
+                          f"{stats['p90_ms']:<8.1f} {stats['p99_ms']:<8.1f} {stats['max_ms']:.1f}")
+
         if tasks['recent']:
             print(f"\n🔄 Recent Tasks:")
             for task in tasks['recent']:
@@ -403,6 +494,120 @@ class OmronASRSApplication:
 
         print("="*70)
 
+    def cancel_task_interface(self):
+        """Cancel a pending task by ID"""
+        pending = self.controller.task_queue.pending()
+        if not pending:
+            print("\n📭 No pending tasks")
+            return
+
+        print("\n⏳ PENDING TASKS")
+        print("-" * 20)
+        for task in pending:
+            print(f"   {task.task_id}: {task.task_type.value} (priority {task.priority})")
+
+        task_id = input("Task ID to cancel: ").strip()
+        if task_id and self.controller.cancel_task(task_id):
+            print(f"✅ Task {task_id} cancelled")
+        else:
+            print("❌ Task not cancelled")
+
+    def export_latency_interface(self):
+        """Export per-task latency samples to CSV"""
+        path = input("CSV file (default task_latency.csv): ").strip() or "task_latency.csv"
+        try:
+            rows = self.controller.export_latency_csv(path)
+            print(f"✅ Exported {rows} task latency samples to {path}")
+        except OSError as e:
+            print(f"❌ Could not write {path}: {e}")
+
+    def wave_pick_interface(self):
+        """Pick a multi-line order as one wave in travel-optimized order"""
+        print("\n🌊 WAVE PICK ORDER")
+        print("-" * 20)
+        print("Enter one line per product as PRODUCT or PRODUCT:QTY, blank line to finish")
+
+        lines = []
+        while True:
+            entry = input(f"Line {len(lines) + 1}: ").strip()
+            if not entry:
+                break
+            product_id, _, quantity = entry.partition(":")
+            try:
+                lines.append(OrderLine(product_id.strip(), int(quantity) if quantity.strip() else 1))
+            except ValueError:
+                print("❌ Quantity must be a number")
+
+        if not lines:
+            print("📭 Empty order")
+            return
+
+        policy = self._prompt_retrieval_policy()
+        plan = self.controller.plan_wave(lines, policy)
+        for product_id, missing in plan.shortages.items():
+            print(f"⚠️ {product_id}: {missing} unit(s) not in stock")
+        if not plan.picks:
+            return
+
+        print(f"\n{'#':<4} {'Position':<10} {'Product'}")
+        print("-" * 35)
+        for number, (position_id, product_id) in enumerate(plan.picks, start=1):
+            print(f"{number:<4} {position_id:<10} {product_id}")
+        print(f"\n🚶 Travel: {plan.distance} grid steps (order as entered: {plan.unplanned_distance}), "
+              f"planned in {plan.planning_ms:.1f} ms")
+
+        if input("Pick this wave? (y/N): ").strip().lower() != 'y':
+            return
+        results = self.controller.execute_wave(plan)
+        succeeded = sum(1 for result in results if result["success"])
+        for result in results:
+            if not result["success"]:
+                print(f"❌ {result['product_id']} @ {result['position_id']}: {result['error']}")
+        print(f"✅ {succeeded}/{len(results)} picks retrieved")
+        self.display_live_grid()
+
+    def batch_interface(self):
+        """Store or retrieve a batch of items listed in a CSV file
+
+        The file needs a header row with product_id and optionally position
+        and expires_at (YYYY-MM-DD) columns; a blank position means
+        auto-assign (store) or pick by retrieval policy (retrieve).
+        """
+        print("\n📋 BATCH FROM CSV FILE")
+        print("-" * 25)
+
+        path = input("CSV file: ").strip()
+        action = input("Action ([S]tore / [R]etrieve): ").strip().upper()
+        if action not in ("S", "R"):
+            print("❌ Invalid action")
+            return
+
+        try:
+            items = read_batch_csv(path, action)
+        except (OSError, ValueError) as e:
+            print(f"❌ Could not read batch: {e}")
+            return
+
+        if not items:
+            print("📭 No items in file")
+            return
+
+        if action == "S":
+            results = self.controller.store_items_batch(items)
+        else:
+            results = self.controller.retrieve_items_batch(items, self._prompt_retrieval_policy())
+
+        print(f"\n{'Product':<15} {'Position':<10} {'Result'}")
+        print("-" * 45)
+        for result in results:
+            position = result["position_id"] if result["position_id"] is not None else "-"
+            outcome = "✅" if result["success"] else f"❌ {result['error']}"
+            print(f"{result['product_id'] or '-':<15} {position!s:<10} {outcome}")
+
+        succeeded = sum(1 for result in results if result["success"])
+        print(f"\n{succeeded}/{len(results)} items {'stored' if action == 'S' else 'retrieved'}")
+        self.display_live_grid()
+
     def monitor_pushbuttons(self):
         """Monitor push button presses in real-time"""
         print("\n🔘 PUSH BUTTON MONITORING")
@@ -410,27 +615,28 @@ class OmronASRSApplication:
         print("Press Ctrl+C to stop monitoring...")
         print("Push buttons will trigger automatic retrieval of items")
 
+        events = self.controller.subscribe([EventType.BUTTON_PRESSED, EventType.TASK_STATE], maxsize=100)
         try:
-            last_pressed = set()
             while True:
-                pressed = set(self.controller.position_manager.monitor_pushbuttons())
-
-                # Check for new button presses
-                new_presses = pressed - last_pressed
-                if new_presses:
-                    for pos_id in new_presses:
-                        position = self.controller.position_manager.get_position(pos_id)
-                        if position:
-                            if position.occupied:
-                                print(f"🔘 Button {pos_id} pressed - Auto-retrieving {position.product_id}")
-                            else:
-                                print(f"🔘 Button {pos_id} pressed - Position empty")
-
-                last_pressed = pressed
-                time.sleep(0.2)  # Check 5 times per second
+                event = events.get(timeout=0.5)
+                if event is None:
+                    continue
+
+                data = event.data
+                if event.event_type == EventType.BUTTON_PRESSED:
+                    position = self.controller.position_manager.get_position(data["position_id"])
+                    if position and position.occupied:
+                        print(f"🔘 Button {data['position_id']} pressed - Auto-retrieving {position.product_id}")
+                    else:
+                        print(f"🔘 Button {data['position_id']} pressed - Position empty")
+                elif data["task_id"].startswith("AUTO-RETRIEVE-") and data["status"] in ("completed", "failed"):
+                    icon = "✅" if data["status"] == "completed" else "❌"
+                    print(f"{icon} {data['result']}")
 
         except KeyboardInterrupt:
             print("\n⏹️ Stopped monitoring push buttons")
+        finally:
+            events.close()
 
     def list_stored_items(self):
         """List all currently stored items"""
@@ -449,18 +655,23 @@ class OmronASRSApplication:
                     products[pid] = []
                 products[pid].append(detail)
 
+            policy = self.controller.position_manager.default_retrieval_policy
+
             print(f"Total Items: {len(occupied_positions)}")
             print(f"Unique Products: {len(products)}")
+            print(f"Retrieval Policy: {policy.name}")
             print()
 
-            print(f"{'Product ID':<15} {'Qty':<4} {'Positions':<20} {'Last Stored'}")
-            print("-" * 65)
+            print(f"{'Product ID':<15} {'Qty':<4} {'Positions':<20} {'Next Out':<9} {'Last Stored'}")
+            print("-" * 75)
 
             for product_id, positions in products.items():
                 pos_list = ", ".join([f"P{p['id']:02d}" for p in positions])
-                last_stored = max([p['stored_at'] for p in positions if p['stored_at']])
+                last_stored = max([p['stored_at'] for p in positions if p['stored_at']], default=None)
                 last_stored_str = last_stored[:16] if last_stored else "Unknown"
-                print(f"{product_id:<15} {len(positions):<4} {pos_list:<20} {last_stored_str}")
+                next_out = self.controller.position_manager.find_product(product_id, policy)
+                next_out_str = next_out.position_id if next_out else "-"
+                print(f"{product_id:<15} {len(positions):<4} {pos_list:<20} {next_out_str:<9} {last_stored_str}")
         else:
             print("📭 No items currently stored in the rack")
 
@@ -468,16 +679,13 @@ class OmronASRSApplication:
         """Update all LED displays"""
         print("\n💡 UPDATING LED DISPLAY...")
 
-        if self.controller.update_display():
+        handle = self.controller.update_display()
+        if handle:
             print("✅ LED update task submitted")
 
             # Wait for completion
-            start_time = time.time()
-            while self.controller.active_task and time.time() - start_time < 5:
-                print(f"\r⏱️  Updating LEDs... ({time.time() - start_time:.1f}s)", end='', flush=True)
-                time.sleep(0.5)
-
-            print("\n✅ LED display updated successfully")
+            if self._wait_for_task(handle, "Updating LEDs", timeout=5):
+                print("✅ LED display updated successfully")
             self.display_live_grid()
         else:
             print("❌ Failed to update LED display")
@@ -506,24 +714,60 @@ class OmronASRSApplication:
 
 def main():
     """Main entry point for OMRON AS/RS application"""
-    print("🏗️ Starting OMRON Auto Rack35 AS/RS Control System...")
+    import argparse
+
+    parser = argparse.ArgumentParser(description="OMRON Auto Rack35 AS/RS control",
+                                     epilog="script commands:\n" + SCRIPT_USAGE,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="omron_asrs_config.json", help="configuration file")
+    parser.add_argument("--tui", action="store_true", help="start in the full-screen live rack view")
+    parser.add_argument("--script", metavar="FILE",
+                        help="run commands from FILE ('-' for stdin) and print JSONL results")
+    parser.add_argument("--sync", action="store_true",
+                        help="with --script: wait for each command before the next")
+    args = parser.parse_args()
+
+    # Script results go to stdout; keep everything else off it
+    out = sys.stderr if args.script else sys.stdout
+    # Per-task INFO logs would pace a script
+    configure_logging(logging.WARNING if args.script else logging.INFO)
+
+    # Open the script before connecting, so a wrong path fails fast and cleanly
+    script = None
+    if args.script == "-":
+        script = sys.stdin
+    elif args.script:
+        try:
+            script = open(args.script)
+        except OSError as e:
+            print(f"❌ Cannot read script {args.script}: {e.strerror or e}", file=out)
+            return 1
+
+    print("🏗️ Starting OMRON Auto Rack35 AS/RS Control System...", file=out)
 
-    app = OmronASRSApplication()
+    app = OmronASRSApplication(args.config)
 
-    if app.initialize():
+    try:
+        if not app.initialize():
+            print("❌ Failed to initialize OMRON AS/RS system", file=out)
+            return 1
         app.start()
 
         try:
-            app.run_interactive()
+            if script:
+                summary = app.run_script(script, sync=args.sync)
+                return 0 if not (summary["error"] or summary["timed_out"]) else 1
+            if not (args.tui and app.run_tui()):
+                app.run_interactive()
         except KeyboardInterrupt:
-            print("\n🛑 Received shutdown signal")
+            print("\n🛑 Received shutdown signal", file=out)
         finally:
             app.stop()
-    else:
-        print("❌ Failed to initialize OMRON AS/RS system")
-        return 1
+    finally:
+        if script and script is not sys.stdin:
+            script.close()
 
-    print("👋 OMRON AS/RS Control System shut down successfully")
+    print("👋 OMRON AS/RS Control System shut down successfully", file=out)
     return 0
 
 
@@ -0,0 +1,46 @@
+"""
+OMRON AS/RS Clock
+Installable time source shared by the controller, its events and the simulator
+"""
+
+import time
+from datetime import datetime
+
+
+class Clock:
+    """Time source for the controller: the wall clock unless a virtual one is installed
+
+    Everything that stamps, ages or waits on tasks goes through the
+    module-level clock, so the simulator (omron_asrs_sim) can run the
+    real controller logic on virtual time.
+    """
+
+    def __init__(self):
+        self._source = None
+
+    def install(self, source=None):
+        """Use source (now/monotonic/perf_counter/sleep) instead of the wall clock; None restores it"""
+        previous, self._source = self._source, source
+        return previous
+
+    @property
+    def virtual(self) -> bool:
+        return self._source is not None
+
+    def now(self) -> datetime:
+        return self._source.now() if self._source else datetime.now()
+
+    def monotonic(self) -> float:
+        return self._source.monotonic() if self._source else time.monotonic()
+
+    def perf_counter(self) -> float:
+        return self._source.perf_counter() if self._source else time.perf_counter()
+
+    def sleep(self, seconds: float):
+        if self._source:
+            self._source.sleep(seconds)
+        else:
+            time.sleep(seconds)
+
+
+clock = Clock()
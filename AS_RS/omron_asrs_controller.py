@@ -4,40 +4,96 @@ OMRON AS/RS Main Controller
 Coordinates 35-position storage operations, LED control, and push button monitoring
 """
 
-from omron_asrs_core import *
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
 from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from omron_asrs_core import (ASRSStatus, ASRSTask, ButtonEvent, OmronOPCClient, PositionManager,
+                             PositionReservation, RetrievalPolicy, TaskHandle, TaskPriority,
+                             TaskScheduler, TaskType, clock)
+from omron_asrs_events import DropPolicy, EventBus, EventType, Subscription
+from omron_asrs_history import TaskHistory, TaskRecord
+from omron_asrs_latency import TaskLatencyTracker
+from omron_asrs_layout import ConfigError, compile_config, load_config
+from omron_asrs_metrics import MetricsExporter, controller_registry
+from omron_asrs_safety import EmergencyStopReport, EmergencyStopWatcher
+from omron_asrs_waves import OrderLine, WavePlan, WavePlanner
+
+logger = logging.getLogger(__name__)
+
 
 class OmronASRSController:
     """Main controller for OMRON Auto Rack35 AS/RS system"""
 
-    def __init__(self, config_path: str = 'omron_asrs_config.json'):
-        self.config = self._load_config(config_path)
+    def __init__(self, config_path: str = 'omron_asrs_config.json',
+                 config: Optional[Dict[str, Any]] = None):
+        # Positions expanded from the rack's ranges and validated (see omron_asrs_layout)
+        self.config = compile_config(config) if config is not None else self._load_config(config_path)
         self.opc_client = OmronOPCClient(self.config['communication'])
-        self.position_manager = PositionManager(self.config, self.opc_client)
+        # State changes for UIs, logging and sync jobs (see subscribe())
+        self.events = EventBus()
+        self.position_manager = PositionManager(self.config, self.opc_client, self.events)
 
         self.status = ASRSStatus.IDLE
-        self.task_queue = queue.Queue()
-        self.active_task: Optional[ASRSTask] = None
-        self.completed_tasks: List[ASRSTask] = []
+        scheduling_config = self.config.get('operations', {}).get('scheduling', {})
+        self.task_queue = TaskScheduler(
+            aging_interval=scheduling_config.get('aging_interval_seconds', 10.0),
+            urgent_priority=scheduling_config.get('urgent_priority', TaskPriority.URGENT)
+        )
+        # Recent tasks in memory, full history in the SQLite archive
+        self.history = TaskHistory.from_config(self.config)
+        self.latency = TaskLatencyTracker(self.config.get('history', {}).get('latency_window', 1000))
+
+        # Multi-line orders: picks sequenced for minimal travel
+        wave_config = self.config.get('operations', {}).get('waves', {})
+        self.wave_planner = WavePlanner(self.position_manager, wave_config.get('return_to_origin', True))
+
+        button_config = self.config.get('operations', {}).get('pushbuttons', {})
+        self.button_poll_interval = button_config.get('poll_interval_seconds', 0.1)
+
+        # Concurrent execution: tasks on disjoint positions run in parallel
+        self.max_parallel_tasks = max(1, scheduling_config.get('max_parallel_tasks', 3))
+        self.active_tasks: Set[ASRSTask] = set()
+        self._busy_positions: Set[int] = set()
+        self._exclusive_active = False
+        self._deferred_tasks: List[ASRSTask] = []
+        self._dispatch_cond = threading.Condition()
+        # Keeps task IDs unique when one position sees several tasks in a second
+        self._task_seq = itertools.count(1)
 
         self._running = False
         self._monitoring_thread = None
         self._task_processor_thread = None
-        self._executor = ThreadPoolExecutor(max_workers=3)
+        self._reservation_thread = None
+        # One extra worker so an urgent task never waits for a free slot
+        self._executor = ThreadPoolExecutor(max_workers=self.max_parallel_tasks + 1)
+
+        # Optional Prometheus endpoint, served from in-memory state only
+        self.metrics_exporter: Optional[MetricsExporter] = None
+        # Kill switch watcher on its own PLC session (see start())
+        self.safety_watcher: Optional[EmergencyStopWatcher] = None
 
         logger.info(f"🏭 OMRON AS/RS Controller initialized: {self.config['system']['name']}")
 
     def _load_config(self, config_path: str) -> Dict[str, Any]:
-        """Load configuration from JSON file"""
+        """Load the compiled configuration (cached next to the JSON file)"""
         try:
-            with open(config_path, 'r') as f:
-                return json.load(f)
+            return load_config(config_path)
         except FileNotFoundError:
             logger.error(f"❌ Configuration file not found: {config_path}")
             raise
         except json.JSONDecodeError as e:
             logger.error(f"❌ Invalid JSON in configuration file: {e}")
             raise
+        except ConfigError as e:
+            logger.error(f"❌ Invalid configuration: {e}")
+            raise
 
     def initialize(self) -> bool:
         """Initialize the AS/RS system"""
@@ -45,7 +101,10 @@ class OmronASRSController:
             logger.info("🔧 Initializing OMRON AS/RS system...")
 
             # Connect to OPC UA server
-            if not self.opc_client.connect():
+            connected = self.opc_client.connect()
+            self.events.publish(EventType.CONNECTION, connected=connected,
+                                endpoint=self.config['communication']['endpoint'])
+            if not connected:
                 logger.error("❌ Failed to connect to OMRON PLC")
                 return False
 
@@ -75,6 +134,14 @@ class OmronASRSController:
         logger.info("🚀 Starting OMRON AS/RS system...")
         self._running = True
 
+        # Emergency stop first, independent of everything below
+        if self.config.get('safety', {}).get('dedicated_watcher', True):
+            watcher = EmergencyStopWatcher.from_controller(self, self._on_emergency_stop)
+            if watcher.start():
+                self.safety_watcher = watcher
+            else:
+                logger.warning("⚠️ Falling back to kill switch polling in the monitoring loop")
+
         # Start monitoring thread for push buttons and emergency stop
         self._monitoring_thread = threading.Thread(target=self._monitoring_loop, daemon=True)
         self._monitoring_thread.start()
@@ -83,6 +150,15 @@ class OmronASRSController:
         self._task_processor_thread = threading.Thread(target=self._task_processing_loop, daemon=True)
         self._task_processor_thread.start()
 
+        # Start reservation expiry thread
+        self._reservation_thread = threading.Thread(target=self._reservation_expiry_loop, daemon=True)
+        self._reservation_thread.start()
+
+        metrics_config = self.config.get('metrics', {})
+        if metrics_config.get('enabled', False):
+            self.start_metrics_exporter(metrics_config.get('host', '127.0.0.1'),
+                                        metrics_config.get('port', 9108))
+
         self.status = ASRSStatus.MONITORING
         logger.info("✅ OMRON AS/RS system started successfully")
 
@@ -90,43 +166,73 @@ class OmronASRSController:
         """Stop the AS/RS system"""
         logger.info("⏹️ Stopping OMRON AS/RS system...")
         self._running = False
+        self.stop_metrics_exporter()
 
         # Wait for threads to finish
         if self._monitoring_thread:
             self._monitoring_thread.join(timeout=3)
         if self._task_processor_thread:
             self._task_processor_thread.join(timeout=3)
+        if self._reservation_thread:
+            self._reservation_thread.join(timeout=3)
+
+        # Let running tasks finish before the PLC connection goes away
+        self._executor.shutdown(wait=True)
+
+        if self.safety_watcher:
+            self.safety_watcher.stop()
+            self.safety_watcher = None
 
         # Disconnect OPC UA
         self.opc_client.disconnect()
+        self.events.publish(EventType.CONNECTION, connected=False,
+                            endpoint=self.config['communication']['endpoint'])
 
-        # Shutdown executor
-        self._executor.shutdown(wait=True)
+        # Release the shared occupancy table
+        self.position_manager.close()
+
+        # Write out the remaining task history
+        self.history.close()
 
         self.status = ASRSStatus.IDLE
         logger.info("✅ OMRON AS/RS system stopped")
 
+    def start_metrics_exporter(self, host: str = '127.0.0.1', port: int = 9108) -> int:
+        """Serve Prometheus metrics on http://host:port/metrics; returns the bound port"""
+        if self.metrics_exporter is None:
+            self.metrics_exporter = MetricsExporter(controller_registry(self), host, port)
+            self.metrics_exporter.start()
+        return self.metrics_exporter.port
+
+    def stop_metrics_exporter(self):
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.stop()
+            self.metrics_exporter = None
+
     def _monitoring_loop(self):
         """Background monitoring loop for push buttons and emergency stop"""
         logger.info("🔄 Monitoring loop started")
 
         while self._running:
             try:
-                # Check emergency kill switch
-                kill_status = self.opc_client.read_value(self.config['control_nodes']['emergency_kill'])
-                if kill_status:
-                    logger.error("🚨 EMERGENCY KILL ACTIVATED!")
-                    self.status = ASRSStatus.EMERGENCY_STOP
-                    self._handle_emergency_stop()
+                if self.status == ASRSStatus.EMERGENCY_STOP:
                     break
 
-                # Check push button presses
-                pressed_buttons = self.position_manager.monitor_pushbuttons()
-                if pressed_buttons:
-                    for pos_id in pressed_buttons:
-                        self._handle_pushbutton_press(pos_id)
+                # Check emergency kill switch (unless the safety watcher does)
+                if self.safety_watcher is None:
+                    kill_status = self.opc_client.read_value(self.config['control_nodes']['emergency_kill'])
+                    if kill_status:
+                        logger.error("🚨 EMERGENCY KILL ACTIVATED!")
+                        self.status = ASRSStatus.EMERGENCY_STOP
+                        self.events.publish(EventType.EMERGENCY_STOP, active=True)
+                        self._handle_emergency_stop()
+                        break
 
-                time.sleep(0.5)  # Check every 500ms
+                # Check push button presses (debounced rising edges only)
+                for event in self.position_manager.poll_button_events():
+                    self._handle_pushbutton_press(event)
+
+                time.sleep(self.button_poll_interval)
 
             except Exception as e:
                 logger.error(f"❌ Error in monitoring loop: {e}")
@@ -134,20 +240,43 @@ class OmronASRSController:
 
         logger.info("⏹️ Monitoring loop stopped")
 
+    @property
+    def completed_tasks(self) -> List[TaskRecord]:
+        """Recent finished tasks, oldest first (bounded by history.ring_size)"""
+        return self.history.recent()
+
+    def get_task_history(self, product_id: Optional[str] = None, position_id: Optional[int] = None,
+                         start: Optional[datetime] = None, end: Optional[datetime] = None,
+                         limit: int = 100) -> List[TaskRecord]:
+        """Query archived tasks by product, position or completion time range"""
+        if product_id is not None:
+            return self.history.by_product(product_id, limit)
+        if position_id is not None:
+            return self.history.by_position(position_id, limit)
+        return self.history.between(start or datetime.fromtimestamp(0), end or clock.now(), limit)
+
+    @property
+    def active_task(self) -> Optional[ASRSTask]:
+        """One of the running tasks, or None when idle"""
+        return next(iter(list(self.active_tasks)), None)
+
     def _task_processing_loop(self):
-        """Main task processing loop"""
-        logger.info("🔄 Task processing loop started")
+        """Main task processing loop: dispatches tasks to the worker pool"""
+        logger.info(f"🔄 Task processing loop started ({self.max_parallel_tasks} parallel)")
 
         while self._running:
             try:
+                if not self._wait_for_slot():
+                    continue
+
                 # Get task from queue with timeout
                 try:
-                    task = self.task_queue.get(timeout=1)
+                    task = self.task_queue.get(timeout=0.2)
                 except queue.Empty:
                     continue
 
                 # Process task
-                self._execute_task(task)
+                self._dispatch_task(task)
 
             except Exception as e:
                 logger.error(f"❌ Error in task processing loop: {e}")
@@ -155,60 +284,239 @@ class OmronASRSController:
 
         logger.info("⏹️ Task processing loop stopped")
 
-    def _handle_emergency_stop(self):
-        """Handle emergency stop condition"""
-        # Turn off all LEDs as safety measure
-        for position in self.position_manager.positions.values():
-            self.opc_client.write_value(position.led_node, False)
+    @staticmethod
+    def _task_positions(task: ASRSTask) -> Optional[Set[int]]:
+        """Positions a task touches; None means it needs the whole rack"""
+        if task.task_type in (TaskType.STORE_ITEM, TaskType.RETRIEVE_ITEM) and task.position:
+            return {task.position.id}
+        return None
+
+    def _wait_for_slot(self) -> bool:
+        """Wait briefly for a free worker slot (urgent tasks get one extra)"""
+        with self._dispatch_cond:
+            limit = self.max_parallel_tasks + (1 if self.task_queue.urgent_pending() else 0)
+            if not self._exclusive_active and len(self.active_tasks) < limit:
+                return True
+            self._dispatch_cond.wait(0.05)
+            return False
+
+    def _dispatch_task(self, task: ASRSTask):
+        """Start a task unless it conflicts with a running one"""
+        positions = self._task_positions(task)
+
+        with self._dispatch_cond:
+            if positions is None:
+                # Whole-rack task: let running tasks finish, holding back new ones
+                while self._running and self.active_tasks:
+                    self._dispatch_cond.wait(0.1)
+                if not self._running:
+                    self._deferred_tasks.append(task)
+                    return
+                self._exclusive_active = True
+            elif positions & self._busy_positions:
+                # Same position as a running task: keep them serialized
+                self._deferred_tasks.append(task)
+                return
+            else:
+                self._busy_positions |= positions
+
+            self.active_tasks.add(task)
+
+        self._executor.submit(self._run_task, task, positions)
+
+    def _run_task(self, task: ASRSTask, positions: Optional[Set[int]]):
+        """Worker: execute a task and release its positions"""
+        try:
+            self._execute_task(task)
+        finally:
+            self._finish_task(task, positions)
+
+    def _finish_task(self, task: ASRSTask, positions: Optional[Set[int]]):
+        """Release a finished task's positions, requeue unblocked tasks and notify waiters"""
+        with self._dispatch_cond:
+            self.active_tasks.discard(task)
+            if positions is None:
+                self._exclusive_active = False
+            else:
+                self._busy_positions -= positions
+
+            # Requeue deferred tasks whose positions are free again
+            ready = [t for t in self._deferred_tasks
+                     if not (self._task_positions(t) or set()) & self._busy_positions]
+            self._deferred_tasks = [t for t in self._deferred_tasks if t not in ready]
+            self._dispatch_cond.notify_all()
+
+        for deferred in ready:
+            self.task_queue.put(deferred)
+        self._refresh_status()
+
+        # Waiters see the task done only once its positions are free
+        self._publish_task_state(task)
+        if task.handle:
+            task.handle.set_done()
+
+    def _set_busy_status(self, status: ASRSStatus):
+        """STORING/RETRIEVING, never overriding an emergency stop"""
+        if self.status != ASRSStatus.EMERGENCY_STOP:
+            self.status = status
+
+    def _refresh_status(self):
+        """Return to MONITORING once no store/retrieve is running"""
+        if self.status not in (ASRSStatus.STORING, ASRSStatus.RETRIEVING):
+            return
+        with self._dispatch_cond:
+            busy = any(t.task_type in (TaskType.STORE_ITEM, TaskType.RETRIEVE_ITEM)
+                       for t in self.active_tasks)
+        if not busy:
+            self.status = ASRSStatus.MONITORING
+
+    def wait_until_idle(self, timeout: Optional[float] = None) -> bool:
+        """Wait until no task is pending, deferred or running"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._dispatch_cond:
+            while not self.task_queue.empty() or self.active_tasks or self._deferred_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._dispatch_cond.wait(0.05 if remaining is None else min(remaining, 0.05))
+        return True
 
-        # Cancel any pending tasks
-        while not self.task_queue.empty():
+    def _reservation_expiry_loop(self):
+        """Release position reservations whose TTL has elapsed"""
+        tick = self.position_manager._reservation_wheel.tick
+        while self._running:
             try:
-                task = self.task_queue.get_nowait()
-                task.status = "cancelled"
-                task.result = "Emergency stop activated"
-                self.completed_tasks.append(task)
-            except queue.Empty:
-                break
+                self.position_manager.expire_reservations()
+                time.sleep(tick)
+            except Exception as e:
+                logger.error(f"❌ Error in reservation expiry loop: {e}")
+                time.sleep(1)
+
+    def _handle_emergency_stop(self):
+        """Handle emergency stop condition (monitoring loop fallback)"""
+        # Turn off all LEDs as safety measure
+        self.opc_client.write_values({position.led_node: False
+                                      for position in self.position_manager.positions.values()})
+        self._cancel_for_emergency()
+
+    def _on_emergency_stop(self, report: EmergencyStopReport):
+        """Safety watcher tripped: outputs are already safe, stop everything else"""
+        self.status = ASRSStatus.EMERGENCY_STOP
+        self.events.publish(EventType.EMERGENCY_STOP, active=True, **report.to_dict())
+        self._cancel_for_emergency()
+
+        # A task that was mid-write may have switched an LED back on
+        watcher = self.safety_watcher
+        if watcher and self.active_tasks and self.wait_until_idle(timeout=5):
+            watcher.reassert()
+
+    def _cancel_for_emergency(self):
+        """Cancel pending and deferred tasks"""
+        with self._dispatch_cond:
+            deferred, self._deferred_tasks = self._deferred_tasks, []
+        for task in self.task_queue.drain() + deferred:
+            self._cancel_pending_task(task, "Emergency stop activated")
 
         logger.info("🚨 Emergency stop procedures completed")
 
-    def _handle_pushbutton_press(self, position_id: int):
+    def _handle_pushbutton_press(self, event: ButtonEvent):
         """Handle push button press event"""
+        position_id = event.position_id
+        self.events.publish(EventType.BUTTON_PRESSED, position_id=position_id,
+                            pressed_at=event.pressed_at, held_for=event.held_for)
         position = self.position_manager.get_position(position_id)
         if position:
-            if position.occupied:
+            task_id = f"AUTO-RETRIEVE-{position_id}"
+            if self._task_in_flight(task_id):
+                logger.debug(f"🔘 Button pressed: Position {position_id} - retrieval already under way")
+            elif position.occupied:
                 logger.info(f"🔘 Button pressed: Position {position_id} - Retrieving {position.product_id}")
                 # Auto-retrieve item when button is pressed on occupied position
                 task = ASRSTask(
-                    task_id=f"AUTO-RETRIEVE-{position_id}",
+                    task_id=task_id,
                     task_type=TaskType.RETRIEVE_ITEM,
-                    position=position
+                    position=position,
+                    priority=TaskPriority.HIGH  # An operator is waiting at the rack
                 )
                 self.submit_task(task)
             else:
                 logger.info(f"🔘 Button pressed: Position {position_id} - Empty position")
 
-    def submit_task(self, task: ASRSTask) -> bool:
-        """Submit a task to the AS/RS system"""
-        try:
-            self.task_queue.put(task)
-            logger.info(f"📋 Task {task.task_id} submitted: {task.task_type.value}")
+    def _task_in_flight(self, task_id: str) -> bool:
+        """True if a task with this ID is pending, deferred or running"""
+        if task_id in self.task_queue:
             return True
+        with self._dispatch_cond:
+            return any(task.task_id == task_id
+                       for task in list(self.active_tasks) + self._deferred_tasks)
+
+    def submit_task(self, task: ASRSTask) -> Optional[TaskHandle]:
+        """Submit a task to the AS/RS system
+
+        Returns a handle to wait on or attach callbacks to, or None if the
+        task was not queued.
+        """
+        try:
+            handle = task.handle or TaskHandle(task)
+            if not self.task_queue.put(task):
+                logger.warning(f"⚠️ Task {task.task_id} is already pending")
+                return None
+            logger.info(f"📋 Task {task.task_id} submitted: {task.task_type.value} (priority {task.priority})")
+            self._publish_task_state(task)
+            return handle
         except Exception as e:
             logger.error(f"❌ Error submitting task: {e}")
+            return None
+
+    def _publish_task_state(self, task: ASRSTask):
+        self.events.publish(EventType.TASK_STATE, task_id=task.task_id,
+                            task_type=task.task_type.value, status=task.status,
+                            position_id=task.position.id if task.position else None,
+                            product_id=task.product_id, result=task.result)
+
+    def subscribe(self, event_types: Optional[List[EventType]] = None, maxsize: int = 1000,
+                  policy: DropPolicy = DropPolicy.DROP_OLDEST) -> Subscription:
+        """Subscribe to controller events (all types by default)"""
+        return self.events.subscribe(event_types, maxsize, policy)
+
+    def cancel_task(self, task_id: str) -> bool:
+        """Cancel a pending task by ID"""
+        task = self.task_queue.cancel(task_id)
+        if not task:
+            logger.error(f"❌ Task {task_id} is not pending")
             return False
 
+        self._cancel_pending_task(task, "Cancelled by operator")
+        logger.info(f"🚫 Task {task_id} cancelled")
+        return True
+
+    def _cancel_pending_task(self, task: ASRSTask, reason: str):
+        """Record a task that was removed from the queue before running"""
+        task.status = "cancelled"
+        task.result = reason
+        task.completed_at = clock.now()
+        if task.reservation_id:
+            self.position_manager.release_reservation(task.reservation_id)
+        self.history.add(task)
+        self._publish_task_state(task)
+        if task.handle:
+            task.handle.set_done()
+
     def _execute_task(self, task: ASRSTask):
         """Execute a specific task"""
         try:
-            self.active_task = task
-            task.started_at = datetime.now()
+            task.started_at = clock.now()
             task.status = "in_progress"
+            self.opc_client.reset_io_time()
+            self._publish_task_state(task)
 
             logger.info(f"🔄 Executing task {task.task_id}: {task.task_type.value}")
 
-            if task.task_type == TaskType.STORE_ITEM:
+            if self.status == ASRSStatus.EMERGENCY_STOP:
+                task.result = "Emergency stop active"
+                success = False
+
+            elif task.task_type == TaskType.STORE_ITEM:
                 success = self._execute_store_task(task)
 
             elif task.task_type == TaskType.RETRIEVE_ITEM:
@@ -222,10 +530,10 @@ class OmronASRSController:
                 success = False
 
             # Update task completion
-            task.completed_at = datetime.now()
+            task.completed_at = clock.now()
             task.status = "completed" if success else "failed"
-            self.completed_tasks.append(task)
-            self.active_task = None
+            self.latency.record(task, self.opc_client.io_time())
+            self.history.add(task)
 
             if success:
                 logger.info(f"✅ Task {task.task_id} completed successfully")
@@ -235,14 +543,15 @@ class OmronASRSController:
         except Exception as e:
             logger.error(f"❌ Error executing task {task.task_id}: {e}")
             task.status = "failed"
-            task.completed_at = datetime.now()
+            task.completed_at = clock.now()
             task.result = str(e)
-            self.active_task = None
+            self.latency.record(task, self.opc_client.io_time())
+            self.history.add(task)
 
     def _execute_store_task(self, task: ASRSTask) -> bool:
         """Execute a storage operation"""
         try:
-            self.status = ASRSStatus.STORING
+            self._set_busy_status(ASRSStatus.STORING)
 
             # Find empty position if not specified
             if not task.position:
@@ -256,10 +565,11 @@ class OmronASRSController:
                 task.result = f"Position {task.position.id} is already occupied"
                 return False
 
-            # Store the item
-            if self.position_manager.store_item(task.position.id, task.product_id):
+            # Store the item (committing the reservation made at submit time)
+            if self.position_manager.store_item(task.position.id, task.product_id, task.expires_at,
+                                                reservation_id=task.reservation_id):
                 task.result = f"Stored {task.product_id} in position {task.position.id}"
-                self.status = ASRSStatus.MONITORING
+                task.reservation_id = None
                 return True
             else:
                 task.result = "Failed to store item"
@@ -270,12 +580,13 @@ class OmronASRSController:
             task.result = str(e)
             return False
         finally:
-            self.status = ASRSStatus.MONITORING
+            if task.reservation_id:
+                self.position_manager.release_reservation(task.reservation_id)
 
     def _execute_retrieve_task(self, task: ASRSTask) -> bool:
         """Execute a retrieval operation"""
         try:
-            self.status = ASRSStatus.RETRIEVING
+            self._set_busy_status(ASRSStatus.RETRIEVING)
 
             if not task.position:
                 task.result = "No position specified for retrieval"
@@ -290,7 +601,6 @@ class OmronASRSController:
             retrieved_product = self.position_manager.retrieve_item(task.position.id)
             if retrieved_product:
                 task.result = f"Retrieved {retrieved_product} from position {task.position.id}"
-                self.status = ASRSStatus.MONITORING
                 return True
             else:
                 task.result = "Failed to retrieve item"
@@ -300,8 +610,6 @@ class OmronASRSController:
             logger.error(f"❌ Error in retrieve task: {e}")
             task.result = str(e)
             return False
-        finally:
-            self.status = ASRSStatus.MONITORING
 
     def _execute_display_update(self, task: ASRSTask) -> bool:
         """Execute a display update operation"""
@@ -315,63 +623,133 @@ class OmronASRSController:
             task.result = str(e)
             return False
 
-    def store_item_at_position(self, position_id: int, product_id: str) -> bool:
+    def _task_id(self, prefix: str) -> str:
+        return f"{prefix}-{clock.now().strftime('%H%M%S')}-{next(self._task_seq):04d}"
+
+    def store_item_at_position(self, position_id: int, product_id: str,
+                               expires_at: Optional[datetime] = None,
+                               priority: int = TaskPriority.NORMAL) -> Optional[TaskHandle]:
         """Store item at specific position"""
         position = self.position_manager.get_position(position_id)
         if not position:
             logger.error(f"❌ Invalid position ID: {position_id}")
-            return False
+            return None
 
-        task = ASRSTask(
-            task_id=f"STORE-P{position_id:02d}-{datetime.now().strftime('%H%M%S')}",
-            task_type=TaskType.STORE_ITEM,
-            position=position,
-            product_id=product_id
-        )
+        # Reserve the slot now so concurrent stores cannot claim it
+        reservation = self.position_manager.reserve_position(position_id, product_id)
+        if not reservation:
+            return None
 
-        return self.submit_task(task)
+        return self._submit_reserved_store(reservation, product_id, expires_at, priority)
 
-    def store_item_auto_position(self, product_id: str) -> bool:
+    def store_item_auto_position(self, product_id: str,
+                                 expires_at: Optional[datetime] = None,
+                                 priority: int = TaskPriority.NORMAL) -> Optional[TaskHandle]:
         """Store item in first available position"""
-        empty_position = self.position_manager.find_empty_position()
-        if not empty_position:
+        reservation = self.position_manager.reserve_position(product_id=product_id)
+        if not reservation:
             logger.error("❌ No empty positions available")
-            return False
+            return None
+
+        return self._submit_reserved_store(reservation, product_id, expires_at, priority)
+
+    def _submit_reserved_store(self, reservation: PositionReservation, product_id: str,
+                               expires_at: Optional[datetime], priority: int) -> Optional[TaskHandle]:
+        """Queue a store task that commits a position reservation"""
+        task = ASRSTask(
+            task_id=self._task_id(f"STORE-P{reservation.position_id:02d}"),
+            task_type=TaskType.STORE_ITEM,
+            position=self.position_manager.get_position(reservation.position_id),
+            product_id=product_id,
+            expires_at=expires_at,
+            reservation_id=reservation.reservation_id,
+            priority=priority
+        )
 
-        return self.store_item_at_position(empty_position.id, product_id)
+        handle = self.submit_task(task)
+        if not handle:
+            self.position_manager.release_reservation(reservation.reservation_id)
+        return handle
 
-    def retrieve_item_from_position(self, position_id: int) -> bool:
+    def retrieve_item_from_position(self, position_id: int,
+                                    priority: int = TaskPriority.NORMAL) -> Optional[TaskHandle]:
         """Retrieve item from specific position"""
         position = self.position_manager.get_position(position_id)
         if not position:
             logger.error(f"❌ Invalid position ID: {position_id}")
-            return False
+            return None
 
         if not position.occupied:
             logger.error(f"❌ Position {position_id} is empty")
-            return False
+            return None
 
         task = ASRSTask(
-            task_id=f"RETRIEVE-P{position_id:02d}-{datetime.now().strftime('%H%M%S')}",
+            task_id=self._task_id(f"RETRIEVE-P{position_id:02d}"),
             task_type=TaskType.RETRIEVE_ITEM,
-            position=position
+            position=position,
+            priority=priority
         )
 
         return self.submit_task(task)
 
-    def retrieve_item_by_product(self, product_id: str) -> bool:
-        """Retrieve item by product ID"""
-        position = self.position_manager.find_product(product_id)
+    def retrieve_item_by_product(self, product_id: str,
+                                 policy: Optional[RetrievalPolicy] = None,
+                                 priority: int = TaskPriority.NORMAL) -> Optional[TaskHandle]:
+        """Retrieve item by product ID, picking the unit by retrieval policy"""
+        position = self.position_manager.find_product(product_id, policy)
         if not position:
             logger.error(f"❌ Product {product_id} not found")
-            return False
-
-        return self.retrieve_item_from_position(position.id)
-
-    def update_display(self) -> bool:
+            return None
+
+        return self.retrieve_item_from_position(position.id, priority)
+
+    def store_items_batch(self, items: List[tuple]) -> List[Dict[str, Any]]:
+        """Store several items at once: [(product_id, position_id or None[, expires_at]), ...]
+
+        Runs directly rather than through the task queue: positions are
+        allocated and updated together and all LEDs go out in one write.
+        """
+        if self.status == ASRSStatus.EMERGENCY_STOP:
+            return self._reject_batch(items, "Emergency stop active")
+        return self.position_manager.store_items(items)
+
+    def retrieve_items_batch(self, items: List[tuple],
+                             policy: Optional[RetrievalPolicy] = None) -> List[Dict[str, Any]]:
+        """Retrieve several items at once: [(product_id or None, position_id or None), ...]"""
+        if self.status == ASRSStatus.EMERGENCY_STOP:
+            return self._reject_batch(items, "Emergency stop active")
+        return self.position_manager.retrieve_items(items, policy)
+
+    def plan_wave(self, lines: List[OrderLine],
+                  policy: Optional[RetrievalPolicy] = None) -> WavePlan:
+        """Resolve an order's lines to stored units and sequence the picks"""
+        return self.wave_planner.plan(lines, policy)
+
+    def pick_wave(self, lines: List[OrderLine],
+                  policy: Optional[RetrievalPolicy] = None) -> Tuple[WavePlan, List[Dict[str, Any]]]:
+        """Plan an order and retrieve all its units as one batch, in pick order"""
+        plan = self.plan_wave(lines, policy)
+        return plan, self.execute_wave(plan)
+
+    def execute_wave(self, plan: WavePlan) -> List[Dict[str, Any]]:
+        """Retrieve the picks of a plan as one batch (results in pick order)"""
+        logger.info(f"🌊 Wave: {len(plan.picks)} picks, {plan.distance} steps "
+                    f"(unplanned {plan.unplanned_distance}), planned in {plan.planning_ms:.1f} ms")
+        if not plan.picks:
+            return []
+        return self.retrieve_items_batch([(product_id, position_id)
+                                          for position_id, product_id in plan.picks])
+
+    @staticmethod
+    def _reject_batch(items: List[tuple], reason: str) -> List[Dict[str, Any]]:
+        logger.error(f"❌ Batch rejected: {reason}")
+        return [{"product_id": item[0], "position_id": item[1], "success": False, "error": reason}
+                for item in items]
+
+    def update_display(self) -> Optional[TaskHandle]:
         """Update all LED displays"""
         task = ASRSTask(
-            task_id=f"UPDATE-DISPLAY-{datetime.now().strftime('%H%M%S')}",
+            task_id=self._task_id("UPDATE-DISPLAY"),
             task_type=TaskType.UPDATE_DISPLAY
         )
 
@@ -382,12 +760,12 @@ class OmronASRSController:
         occupancy_stats = self.position_manager.get_occupancy_stats()
 
         # Get recent activity
-        recent_tasks = self.completed_tasks[-10:] if self.completed_tasks else []
+        recent_tasks = self.history.recent(10)
 
         return {
             "system_name": self.config['system']['name'],
             "plc_model": self.config['system']['plc_model'],
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": clock.now().isoformat(),
             "status": self.status.value,
             "communication": {
                 "protocol": self.config['communication']['protocol'],
@@ -397,15 +775,26 @@ class OmronASRSController:
             "storage": occupancy_stats,
             "tasks": {
                 "pending": self.task_queue.qsize(),
-                "active": self.active_task.task_id if self.active_task else None,
-                "completed": len(self.completed_tasks),
-                "recent": [{"id": t.task_id, "type": t.task_type.value, "status": t.status} for t in recent_tasks]
+                "queues": self.task_queue.stats(),
+                "active": sorted(t.task_id for t in list(self.active_tasks)),
+                "max_parallel": self.max_parallel_tasks,
+                "completed": self.history.total,
+                "recent": [{"id": t.task_id, "type": t.task_type.value, "status": t.status} for t in recent_tasks],
+                "latency": self.latency.summary()
             },
             "safety": {
-                "emergency_stop": self.opc_client.read_value(self.config['control_nodes']['emergency_kill']) or False
+                "emergency_stop": (self.status == ASRSStatus.EMERGENCY_STOP or
+                                   self.opc_client.read_value(self.config['control_nodes']['emergency_kill']) or False),
+                "dedicated_watcher": self.safety_watcher is not None,
+                "last_emergency_stop": (self.safety_watcher.last_report.to_dict()
+                                        if self.safety_watcher and self.safety_watcher.last_report else None)
             }
         }
 
+    def export_latency_csv(self, path: str) -> int:
+        """Write per-task latency samples (recent window) to a CSV file"""
+        return self.latency.export_csv(path)
+
     def get_position_grid(self) -> List[List[str]]:
         """Get visual grid representation"""
         return self.position_manager.get_grid_display()
@@ -422,14 +811,9 @@ class OmronASRSController:
                 "occupied": position.occupied,
                 "product_id": position.product_id,
                 "stored_at": position.stored_at.isoformat() if position.stored_at else None,
+                "expires_at": position.expires_at.isoformat() if position.expires_at else None,
+                "reservation_id": position.reservation_id,
                 "led_node": position.led_node,
                 "pushbutton_node": position.pushbutton_node
             })
         return details
-
-print("✅ OMRON AS/RS Controller created")
-print("   - 35-position storage management")  
-print("   - OPC UA LED and push button control")
-print("   - Real-time monitoring and task processing")
-print("   - Emergency stop handling")
-print("   - Visual grid display")
@@ -10,15 +10,31 @@ import threading
 import time
 import logging
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple, Any
-from enum import Enum
-from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from enum import Enum, IntEnum
+from datetime import datetime, timedelta
+from collections import deque
+import heapq
+import itertools
+import math
 import queue
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+from omron_asrs_clock import clock
+from omron_asrs_events import EventBus, EventType
+from omron_asrs_layout import expand_positions
+from omron_asrs_metrics import Histogram
+from omron_asrs_shared import SharedOccupancyTable
+
 logger = logging.getLogger(__name__)
 
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def configure_logging(level: int = logging.INFO):
+    """Log to stderr in the system's format (called by entry points, never on import)"""
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+
+
 class ASRSStatus(Enum):
     IDLE = "idle"
     STORING = "storing" 
@@ -39,6 +55,18 @@ class TaskType(Enum):
     UPDATE_DISPLAY = "update_display"
     EMERGENCY_STOP = "emergency_stop"
 
+class TaskPriority(IntEnum):
+    LOW = 0
+    NORMAL = 1
+    HIGH = 2
+    URGENT = 3     # Served from the urgent lane ahead of everything else
+
+class RetrievalPolicy(Enum):
+    FIFO = "fifo"          # Oldest stored unit first
+    LIFO = "lifo"          # Newest stored unit first
+    FEFO = "fefo"          # Earliest expiry first (FIFO among equal/no expiry)
+    NEAREST = "nearest"    # Closest to the retrieval origin on the grid
+
 @dataclass
 class StoragePosition:
     """Individual storage position in the rack"""
@@ -51,7 +79,9 @@ class StoragePosition:
     occupied: bool = False
     product_id: Optional[str] = None
     stored_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
     status: PositionStatus = PositionStatus.EMPTY
+    reservation_id: Optional[str] = None
 
     @property
     def position_id(self) -> str:
@@ -61,19 +91,371 @@ class StoragePosition:
     def grid_location(self) -> str:
         return f"R{self.row}C{self.column}"
 
-@dataclass
+@dataclass(eq=False)
 class ASRSTask:
-    """AS/RS operation task"""
+    """AS/RS operation task (hashable by identity so it can live in sets)"""
     task_id: str
     task_type: TaskType
     position: Optional[StoragePosition] = None
     product_id: Optional[str] = None
-    priority: int = 1
-    created_at: datetime = field(default_factory=datetime.now)
+    expires_at: Optional[datetime] = None
+    reservation_id: Optional[str] = None
+    priority: int = TaskPriority.NORMAL
+    created_at: datetime = field(default_factory=clock.now)
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     status: str = "pending"
     result: Optional[str] = None
+    queued_at: Optional[float] = None  # clock.monotonic() when first queued
+    handle: Optional["TaskHandle"] = field(default=None, repr=False)
+
+class TaskHandle:
+    """Completion handle for a submitted task
+
+    wait() blocks until the task finishes (completed, failed or
+    cancelled); callbacks run once, in the thread that finished the task,
+    or immediately if it already has.
+    """
+
+    FINAL_STATES = ("completed", "failed", "cancelled")
+
+    def __init__(self, task: ASRSTask):
+        self.task = task
+        task.handle = self
+        self._done = threading.Event()
+        self._callbacks: List[Callable[["TaskHandle"], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def task_id(self) -> str:
+        return self.task.task_id
+
+    @property
+    def status(self) -> str:
+        return self.task.status
+
+    @property
+    def result(self) -> Optional[str]:
+        """Result message of the finished task (None while pending)"""
+        return self.task.result if self.done() else None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.done() and self.task.status == "completed"
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the task to finish; False on timeout"""
+        return self._done.wait(timeout)
+
+    def add_done_callback(self, callback: Callable[["TaskHandle"], None]):
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        self._run_callback(callback)
+
+    def set_done(self):
+        """Mark the task finished and run callbacks (called by the controller)"""
+        with self._lock:
+            if self._done.is_set():
+                return
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            self._run_callback(callback)
+
+    def _run_callback(self, callback):
+        try:
+            callback(self)
+        except Exception as e:
+            logger.error(f"❌ Error in callback for task {self.task_id}: {e}")
+
+@dataclass
+class PositionReservation:
+    """Hold on an empty position for an incoming item"""
+    reservation_id: str
+    position_id: int
+    product_id: Optional[str] = None
+    ttl: float = 60.0
+    created_at: datetime = field(default_factory=clock.now)
+    deadline: float = 0.0  # clock.monotonic() at which the reservation lapses
+
+@dataclass
+class ButtonEvent:
+    """Debounced press of a position push button (rising edge)"""
+    position_id: int
+    pressed_at: datetime           # wall-clock time of the rising edge
+    timestamp: float               # clock.monotonic() of the rising edge
+    held_for: float = 0.0          # seconds held when the event was emitted
+
+class ButtonDebouncer:
+    """Turns sampled push-button levels into debounced rising-edge events
+
+    A level change only counts once it has been stable for debounce
+    seconds, and a press is reported once it has been held for
+    hold_time seconds. Each press yields exactly one event no matter
+    how long the button stays down.
+    """
+
+    def __init__(self, debounce: float = 0.05, hold_time: float = 0.0):
+        self.debounce = debounce
+        self.hold_time = hold_time
+        # position id -> [raw level, raw changed at, debounced level, pressed since, reported]
+        self._state: Dict[int, list] = {}
+
+    def update(self, position_id: int, level: bool, now: Optional[float] = None) -> Optional[ButtonEvent]:
+        """Feed one sample; returns an event on a qualifying press"""
+        now = clock.monotonic() if now is None else now
+        state = self._state.get(position_id)
+        if state is None:
+            # First sample: a button already down at startup is not a press
+            self._state[position_id] = [level, now, level, now, True]
+            return None
+
+        level = bool(level)
+        if level != state[0]:
+            state[0] = level
+            state[1] = now
+
+        if state[0] != state[2] and now - state[1] >= self.debounce:
+            state[2] = state[0]
+            if state[2]:
+                state[3] = state[1]
+                state[4] = False
+
+        if state[2] and not state[4] and now - state[3] >= self.hold_time:
+            state[4] = True
+            return ButtonEvent(position_id=position_id,
+                               pressed_at=clock.now() - timedelta(seconds=now - state[3]),
+                               timestamp=state[3],
+                               held_for=now - state[3])
+        return None
+
+    def is_pressed(self, position_id: int) -> bool:
+        """Debounced level of a button"""
+        state = self._state.get(position_id)
+        return bool(state and state[2])
+
+class TimerWheel:
+    """Hashed timer wheel for many cheap timeouts
+
+    Keys are hashed into slots by deadline tick, rounded up so a slot never
+    comes round before its keys are due. advance() only visits the slots
+    whose ticks have elapsed, so scheduling, cancelling and expiring are
+    O(1) per timer regardless of how many are pending.
+    """
+
+    def __init__(self, tick: float = 0.1, slots: int = 512, now: Optional[float] = None):
+        self.tick = tick
+        self._slots: List[Dict[Any, float]] = [{} for _ in range(slots)]
+        self._slot_of: Dict[Any, int] = {}
+        self._current_tick = int((clock.monotonic() if now is None else now) / tick)
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def schedule(self, key: Any, deadline: float):
+        """Schedule (or reschedule) a key to expire at a monotonic deadline"""
+        self.cancel(key)
+        slot = max(math.ceil(deadline / self.tick), self._current_tick + 1) % len(self._slots)
+        self._slots[slot][key] = deadline
+        self._slot_of[key] = slot
+
+    def cancel(self, key: Any) -> bool:
+        slot = self._slot_of.pop(key, None)
+        if slot is None:
+            return False
+        self._slots[slot].pop(key, None)
+        return True
+
+    def advance(self, now: Optional[float] = None) -> List[Any]:
+        """Advance the wheel to now and return the keys that expired"""
+        now = clock.monotonic() if now is None else now
+        target_tick = int(now / self.tick)
+        if target_tick <= self._current_tick:
+            return []
+        if not self._slot_of:
+            # Nothing scheduled: jump straight there
+            self._current_tick = target_tick
+            return []
+
+        # A gap longer than one revolution only needs each slot visited once
+        slot_count = len(self._slots)
+        ticks = range(self._current_tick + 1, target_tick + 1)
+        if len(ticks) > slot_count:
+            ticks = range(target_tick - slot_count + 1, target_tick + 1)
+
+        expired = []
+        almost_due = []
+        for tick in ticks:
+            slot = self._slots[tick % slot_count]
+            if not slot:
+                continue
+            for key, deadline in list(slot.items()):
+                if deadline <= now:
+                    del slot[key]
+                    del self._slot_of[key]
+                    expired.append(key)
+                elif deadline < now + self.tick:
+                    almost_due.append((key, deadline))
+
+        self._current_tick = target_tick
+        # Float rounding can bucket a key one tick early: look again next tick, not next revolution
+        for key, deadline in almost_due:
+            self.schedule(key, deadline)
+        return expired
+
+
+class TaskScheduler:
+    """Priority task queue with aging and an urgent lane
+
+    Drop-in replacement for queue.Queue in the task processing loop.
+    A task's effective priority grows by one level per aging_interval
+    seconds of waiting, which is equivalent to ordering the heap by
+    (enqueued_at - priority * aging_interval): the key never changes, so
+    aging costs nothing at dequeue time and nothing starves. Tasks at or
+    above urgent_priority bypass the heap and are always served first.
+    """
+
+    def __init__(self, aging_interval: float = 10.0, urgent_priority: int = TaskPriority.URGENT):
+        self.aging_interval = aging_interval
+        self.urgent_priority = urgent_priority
+        self._cond = threading.Condition()
+        self._urgent = deque()
+        self._heap = []
+        self._entries: Dict[str, list] = {}  # task_id -> [key, seq, task, enqueued_at]
+        self._seq = itertools.count()
+        self._wait_stats: Dict[int, List[float]] = {}  # priority -> [count, total wait, max wait]
+
+    def put(self, task: ASRSTask, enqueued_at: Optional[float] = None) -> bool:
+        """Queue a task; False if a task with the same ID is already pending
+
+        A task that is put back (e.g. deferred by the executor) keeps its
+        original queued_at and therefore its place in the aging order.
+        """
+        with self._cond:
+            if task.task_id in self._entries:
+                return False
+
+            if enqueued_at is None:
+                enqueued_at = task.queued_at if task.queued_at is not None else clock.monotonic()
+            task.queued_at = enqueued_at
+            entry = [enqueued_at - task.priority * self.aging_interval, next(self._seq), task, enqueued_at]
+            self._entries[task.task_id] = entry
+            if task.priority >= self.urgent_priority:
+                self._urgent.append(entry)
+            else:
+                heapq.heappush(self._heap, entry)
+            self._cond.notify()
+            return True
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> ASRSTask:
+        """Remove and return the next task; raises queue.Empty like queue.Queue"""
+        with self._cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                entry = self._pop_entry()
+                if entry:
+                    return self._dequeued(entry)
+                if not block:
+                    raise queue.Empty
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self._cond.wait(remaining)
+
+    def __contains__(self, task_id: str) -> bool:
+        with self._cond:
+            return task_id in self._entries
+
+    def get_nowait(self) -> ASRSTask:
+        return self.get(block=False)
+
+    def urgent_pending(self) -> bool:
+        """True if the urgent lane holds a task"""
+        with self._cond:
+            return any(entry[2] is not None for entry in self._urgent)
+
+    def _pop_entry(self) -> Optional[list]:
+        # Cancelled entries have their task cleared and are skipped here
+        while self._urgent:
+            entry = self._urgent.popleft()
+            if entry[2] is not None:
+                return entry
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if entry[2] is not None:
+                return entry
+        return None
+
+    def _dequeued(self, entry: list) -> ASRSTask:
+        task = entry[2]
+        del self._entries[task.task_id]
+        waited = clock.monotonic() - entry[3]
+        stats = self._wait_stats.setdefault(int(task.priority), [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += waited
+        stats[2] = max(stats[2], waited)
+        return task
+
+    def cancel(self, task_id: str) -> Optional[ASRSTask]:
+        """Remove a pending task by ID and return it"""
+        with self._cond:
+            entry = self._entries.pop(task_id, None)
+            if not entry:
+                return None
+            task, entry[2] = entry[2], None
+            return task
+
+    def drain(self) -> List[ASRSTask]:
+        """Remove and return all pending tasks"""
+        with self._cond:
+            tasks = [entry[2] for entry in self._entries.values()]
+            for entry in self._entries.values():
+                entry[2] = None
+            self._entries.clear()
+            self._urgent.clear()
+            self._heap.clear()
+            return tasks
+
+    def pending(self) -> List[ASRSTask]:
+        """Pending tasks in submission order"""
+        with self._cond:
+            return [entry[2] for entry in sorted(self._entries.values(), key=lambda e: e[1])]
+
+    def qsize(self) -> int:
+        return len(self._entries)
+
+    def empty(self) -> bool:
+        return not self._entries
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-priority queue depth and wait times (seconds)"""
+        now = clock.monotonic()
+        with self._cond:
+            pending: Dict[int, List[float]] = {}
+            for entry in self._entries.values():
+                pending.setdefault(int(entry[2].priority), []).append(now - entry[3])
+
+            result = {}
+            for priority in sorted(set(pending) | set(self._wait_stats), reverse=True):
+                waits = pending.get(priority, [])
+                count, total_wait, max_wait = self._wait_stats.get(priority, [0, 0.0, 0.0])
+                try:
+                    name = TaskPriority(priority).name.lower()
+                except ValueError:
+                    name = str(priority)
+                result[name] = {
+                    "depth": len(waits),
+                    "oldest_wait_s": round(max(waits), 3) if waits else 0.0,
+                    "dequeued": count,
+                    "avg_wait_s": round(total_wait / count, 3) if count else 0.0,
+                    "max_wait_s": round(max_wait, 3)
+                }
+            return result
 
 # OPC UA Client for OMRON communication
 class OmronOPCClient:
@@ -85,16 +467,42 @@ class OmronOPCClient:
         self.connected = False
         self.nodes_cache = {}
         self._lock = threading.Lock()
+        # Seconds spent in PLC round-trips, per calling thread
+        self._io = threading.local()
+        self.io_histogram = Histogram("asrs_plc_io_seconds", "PLC OPC UA round-trip time by operation")
+        self.connect_count = 0
+        # Set by the safety watcher on an emergency stop: refuse all writes
+        self.write_inhibited = False
+
+    def reset_io_time(self):
+        """Start a fresh I/O time measurement for the calling thread"""
+        self._io.seconds = 0.0
+
+    def io_time(self) -> float:
+        """Seconds the calling thread spent in PLC I/O since reset_io_time()"""
+        return getattr(self._io, 'seconds', 0.0)
+
+    def _account_io(self, started: float, operation: str):
+        elapsed = clock.perf_counter() - started
+        self._io.seconds = getattr(self._io, 'seconds', 0.0) + elapsed
+        self.io_histogram.observe(elapsed, operation=operation)
 
     def connect(self) -> bool:
         """Connect to OMRON OPC UA server"""
         try:
+            if self.config.get('use_mock', False):
+                self.client = MockOPCClient(self.config)
+                self.connected = True
+                self.connect_count += 1
+                return True
+
             # Try to import real OPC UA library
             try:
                 from opcua import Client
                 self.client = Client(self.config['endpoint'])
                 self.client.connect()
                 self.connected = True
+                self.connect_count += 1
                 logger.info(f"✅ Connected to OMRON PLC at {self.config['endpoint']}")
                 return True
 
@@ -102,6 +510,7 @@ class OmronOPCClient:
                 logger.warning("opcua package not found, using mock client for demonstration")
                 self.client = MockOPCClient(self.config)
                 self.connected = True
+                self.connect_count += 1
                 return True
 
         except Exception as e:
@@ -109,6 +518,18 @@ class OmronOPCClient:
             self.connected = False
             return False
 
+    def new_session(self) -> "OmronOPCClient":
+        """Unconnected client for a second, independent session to the same PLC
+
+        With the mock client both sessions see the same simulated PLC.
+        """
+        session = OmronOPCClient(self.config)
+        if isinstance(self.client, MockOPCClient):
+            session.client = MockOPCClient(self.config, self.client.mock_values)
+            session.connected = True
+            session.connect_count += 1
+        return session
+
     def disconnect(self):
         """Disconnect from OPC UA server"""
         if self.client and hasattr(self.client, 'disconnect'):
@@ -128,15 +549,22 @@ class OmronOPCClient:
 
     def read_value(self, node_id: str):
         """Read value from OPC UA node"""
+        started = clock.perf_counter()
         try:
             node = self.get_node(node_id)
             return node.get_value()
         except Exception as e:
             logger.error(f"❌ Error reading {node_id}: {e}")
             return None
+        finally:
+            self._account_io(started, 'read')
 
     def write_value(self, node_id: str, value: Any) -> bool:
         """Write value to OPC UA node"""
+        if self.write_inhibited:
+            logger.warning(f"🚨 Write to {node_id} blocked: emergency stop")
+            return False
+        started = clock.perf_counter()
         try:
             node = self.get_node(node_id)
             node.set_value(value)
@@ -145,12 +573,56 @@ class OmronOPCClient:
         except Exception as e:
             logger.error(f"❌ Error writing {node_id}: {e}")
             return False
+        finally:
+            self._account_io(started, 'write')
+
+    def write_values(self, values: Dict[str, Any]) -> bool:
+        """Write several nodes in a single request"""
+        if not values:
+            return True
+        if self.write_inhibited:
+            logger.warning(f"🚨 Write to {len(values)} nodes blocked: emergency stop")
+            return False
+        started = clock.perf_counter()
+        try:
+            nodes = [self.get_node(node_id) for node_id in values]
+            if hasattr(self.client, 'set_values'):
+                self.client.set_values(nodes, list(values.values()))
+            else:
+                for node, value in zip(nodes, values.values()):
+                    node.set_value(value)
+            logger.debug(f"📝 Wrote {len(values)} nodes")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error writing {len(values)} nodes: {e}")
+            return False
+        finally:
+            self._account_io(started, 'write')
+
+    def read_values(self, node_ids: List[str]) -> Optional[List[Any]]:
+        """Read several nodes in a single request"""
+        started = clock.perf_counter()
+        try:
+            nodes = [self.get_node(node_id) for node_id in node_ids]
+            if hasattr(self.client, 'get_values'):
+                return list(self.client.get_values(nodes))
+            return [node.get_value() for node in nodes]
+        except Exception as e:
+            logger.error(f"❌ Error reading {len(node_ids)} nodes: {e}")
+            return None
+        finally:
+            self._account_io(started, 'read')
 
 class MockOPCClient:
     """Mock OPC client for testing without hardware"""
 
-    def __init__(self, config):
+    def __init__(self, config, mock_values: Optional[Dict[str, Any]] = None):
         self.config = config
+        self.latency = config.get('mock_latency', 0.0)  # Simulated round-trip per read/write
+        if mock_values is not None:
+            # Another session on the same simulated PLC
+            self.mock_values = mock_values
+            return
         self.mock_values = {
             'ns=4;s=kill': False,  # Emergency kill switch
         }
@@ -161,16 +633,32 @@ class MockOPCClient:
         logger.info("🔧 Using Mock OPC Client for OMRON PLC")
 
     def get_node(self, node_id: str):
-        return MockNode(node_id, self.mock_values)
+        return MockNode(node_id, self.mock_values, self.latency)
+
+    def set_values(self, nodes, values):
+        """Bulk write costing a single round-trip"""
+        if self.latency:
+            clock.sleep(self.latency)
+        for node, value in zip(nodes, values):
+            self.mock_values[node.node_id] = value
+
+    def get_values(self, nodes):
+        """Bulk read costing a single round-trip"""
+        if self.latency:
+            clock.sleep(self.latency)
+        return [self.mock_values.get(node.node_id, False) for node in nodes]
 
 class MockNode:
     """Mock OPC UA node"""
 
-    def __init__(self, node_id: str, mock_values: Dict = None):
+    def __init__(self, node_id: str, mock_values: Dict = None, latency: float = 0.0):
         self.node_id = node_id
         self.mock_values = mock_values or {}
+        self.latency = latency
 
     def get_value(self):
+        if self.latency:
+            clock.sleep(self.latency)
         if self.mock_values and self.node_id in self.mock_values:
             return self.mock_values[self.node_id]
         # Simulate push button presses occasionally for demo
@@ -180,23 +668,179 @@ class MockNode:
         return False
 
     def set_value(self, value):
+        if self.latency:
+            clock.sleep(self.latency)
         if self.mock_values:
             self.mock_values[self.node_id] = value
         logger.debug(f"Mock set {self.node_id} = {value}")
 
+class ProductIndex:
+    """Per-product priority queues of stored units
+
+    Each product keeps one heap per ordered policy (FIFO, LIFO, FEFO).
+    Removed units are invalidated lazily and skipped when they reach the
+    top, so add, remove and pick are all O(log n).
+    """
+
+    _HEAP_POLICIES = (RetrievalPolicy.FIFO, RetrievalPolicy.LIFO, RetrievalPolicy.FEFO)
+
+    def __init__(self):
+        self._units: Dict[str, Dict[int, int]] = {}           # product -> {position id: token}
+        self._heaps: Dict[Tuple[str, RetrievalPolicy], list] = {}
+        self._position_product: Dict[int, str] = {}
+        self._token = 0
+
+    @staticmethod
+    def _sort_key(policy: RetrievalPolicy, position: StoragePosition) -> tuple:
+        stored = position.stored_at.timestamp() if position.stored_at else 0.0
+        if policy == RetrievalPolicy.LIFO:
+            return (-stored,)
+        if policy == RetrievalPolicy.FEFO:
+            expires = position.expires_at.timestamp() if position.expires_at else float('inf')
+            return (expires, stored)
+        return (stored,)
+
+    def update(self, position: StoragePosition):
+        """Sync the index with the current state of a position"""
+        indexed_product = self._position_product.get(position.id)
+        current_product = position.product_id if position.occupied else None
+
+        if indexed_product == current_product:
+            return
+        if indexed_product is not None:
+            self._remove(indexed_product, position.id)
+        if current_product is not None:
+            self._add(current_product, position)
+
+    def _add(self, product_id: str, position: StoragePosition):
+        self._token += 1
+        self._units.setdefault(product_id, {})[position.id] = self._token
+        self._position_product[position.id] = product_id
+        for policy in self._HEAP_POLICIES:
+            heap = self._heaps.setdefault((product_id, policy), [])
+            heapq.heappush(heap, (self._sort_key(policy, position), position.id, self._token))
+
+    def _remove(self, product_id: str, position_id: int):
+        units = self._units.get(product_id, {})
+        units.pop(position_id, None)
+        self._position_product.pop(position_id, None)
+        if not units:
+            self._units.pop(product_id, None)
+            for policy in self._HEAP_POLICIES:
+                self._heaps.pop((product_id, policy), None)
+            return
+
+        # Compact heaps that are mostly stale entries
+        for policy in self._HEAP_POLICIES:
+            heap = self._heaps[(product_id, policy)]
+            if len(heap) > 2 * len(units) + 16:
+                heap[:] = [entry for entry in heap if units.get(entry[1]) == entry[2]]
+                heapq.heapify(heap)
+
+    def product_at(self, position_id: int) -> Optional[str]:
+        return self._position_product.get(position_id)
+
+    def quantity(self, product_id: str) -> int:
+        return len(self._units.get(product_id, {}))
+
+    def products(self) -> List[str]:
+        return list(self._units.keys())
+
+    def pick(self, product_id: str, policy: RetrievalPolicy,
+             positions: Dict[int, StoragePosition],
+             origin: Tuple[int, int] = (1, 1),
+             exclude: Optional[Set[int]] = None) -> Optional[int]:
+        """Position id of the unit to retrieve next under a policy
+
+        Positions in exclude (already picked by a batch) are skipped;
+        that path scans the product's units instead of peeking the heap.
+        """
+        units = self._units.get(product_id)
+        if not units:
+            return None
+
+        if policy == RetrievalPolicy.NEAREST:
+            def distance(pos_id):
+                pos = positions[pos_id]
+                return (abs(pos.row - origin[0]) + abs(pos.column - origin[1]), pos_id)
+            candidates = [pos_id for pos_id in units if not exclude or pos_id not in exclude]
+            return min(candidates, key=distance) if candidates else None
+
+        heap = self._heaps[(product_id, policy)]
+        if exclude:
+            candidates = [entry for entry in heap
+                          if units.get(entry[1]) == entry[2] and entry[1] not in exclude]
+            return min(candidates)[1] if candidates else None
+
+        while heap:
+            _, pos_id, token = heap[0]
+            if units.get(pos_id) == token:
+                return pos_id
+            heapq.heappop(heap)
+        return None
+
+
 class PositionManager:
     """Manages the 35 storage positions"""
 
-    def __init__(self, config: Dict[str, Any], opc_client: OmronOPCClient):
+    # Number of grid cell changes kept for incremental readers
+    GRID_CHANGE_HISTORY = 1024
+
+    def __init__(self, config: Dict[str, Any], opc_client: OmronOPCClient,
+                 event_bus: Optional[EventBus] = None):
         self.config = config
         self.opc_client = opc_client
+        self.event_bus = event_bus
         self.positions: Dict[int, StoragePosition] = {}
         self._initialize_positions()
         self._lock = threading.Lock()
+        # Per-position locks serialize PLC I/O on one slot without blocking the rest
+        self._position_locks = {pos_id: threading.Lock() for pos_id in self.positions}
+
+        # Incrementally maintained occupancy counters and grid model
+        self._occupied_ids = {pos.id for pos in self.positions.values() if pos.occupied}
+        self._grid: List[List[str]] = []
+        self._grid_cells: Dict[int, Tuple[int, int]] = {}
+        self._grid_version = 0
+        self._grid_changes = deque(maxlen=self.GRID_CHANGE_HISTORY)
+        self._initialize_grid()
+
+        # stored_at/expiry ordered index for product retrieval
+        retrieval_config = self.config.get('operations', {}).get('retrieval', {})
+        self.default_retrieval_policy = RetrievalPolicy(retrieval_config.get('policy', 'fifo').lower())
+        origin = retrieval_config.get('origin', {})
+        self.retrieval_origin = (origin.get('row', 1), origin.get('column', 1))
+        self.product_index = ProductIndex()
+        for position in self.positions.values():
+            self.product_index.update(position)
+
+        # Reservations of empty positions, expired by a timer wheel
+        reservation_config = self.config.get('operations', {}).get('reservations', {})
+        self.default_reservation_ttl = reservation_config.get('ttl_seconds', 60.0)
+        self.reservations: Dict[str, PositionReservation] = {}
+        self._reserved_ids = set()
+        # Positions claimed by a store whose LED write is still in flight
+        self._storing: Set[int] = set()
+        self._reservation_wheel = TimerWheel(reservation_config.get('timer_tick_seconds', 0.1),
+                                             reservation_config.get('wheel_slots', 512))
+        self._reservation_counter = itertools.count(1)
+
+        # Edge detection for push buttons
+        button_config = self.config.get('operations', {}).get('pushbuttons', {})
+        self.button_debouncer = ButtonDebouncer(button_config.get('debounce_seconds', 0.05),
+                                                button_config.get('hold_seconds', 0.0))
+        self._button_nodes = [(pos.id, pos.pushbutton_node) for pos in self.positions.values()]
+
+        # Optional memory-mapped mirror for out-of-process readers
+        self.shared_table: Optional[SharedOccupancyTable] = None
+        self._initialize_shared_table()
 
     def _initialize_positions(self):
         """Initialize all 35 storage positions"""
-        storage_positions = self.config['storage_positions']
+        storage_positions = self.config.get('storage_positions')
+        if storage_positions is None:
+            # Not compiled yet (see omron_asrs_layout.compile_config): expand the ranges here
+            storage_positions = expand_positions(self.config['storage_rack'])
 
         for pos_key, pos_config in storage_positions.items():
             position = StoragePosition(
@@ -211,136 +855,545 @@ class PositionManager:
 
         logger.info(f"📦 Initialized {len(self.positions)} storage positions")
 
+    def _initialize_grid(self):
+        """Build the cached grid model once from the position layout"""
+        layout = self.config['storage_rack']['layout']
+        rows, cols = layout['rows'], layout['columns']
+        self._grid_layout = f"{rows}×{cols}"
+
+        self._grid = [["    " for _ in range(cols)] for _ in range(rows)]
+        taken = set()
+        for position in sorted(self.positions.values(), key=lambda p: p.id):
+            if 1 <= position.row <= rows and 1 <= position.column <= cols:
+                cell = (position.row - 1, position.column - 1)
+                if cell in taken:
+                    continue  # another rack's position at the same cell: the grid shows the lowest ID
+                taken.add(cell)
+                self._grid_cells[position.id] = cell
+                self._grid[cell[0]][cell[1]] = self._format_cell(position)
+
+    @staticmethod
+    def _format_cell(position: StoragePosition) -> str:
+        """Grid cell text for a position"""
+        if position.occupied:
+            return f"[{position.id:02d}]"  # Occupied
+        if position.status == PositionStatus.RESERVED:
+            return f"<{position.id:02d}>"  # Reserved
+        return f" {position.id:02d} "      # Empty
+
+    def _initialize_shared_table(self):
+        """Create the shared occupancy table if enabled in the configuration"""
+        shared_config = self.config.get('shared_occupancy', {})
+        if not shared_config.get('enabled', False):
+            return
+        if not shared_config.get('path'):
+            logger.error("❌ shared_occupancy.enabled needs a path; shared occupancy table disabled")
+            return
+
+        layout = self.config['storage_rack']['layout']
+        try:
+            self.shared_table = SharedOccupancyTable(
+                shared_config['path'],
+                self.positions.values(),
+                layout['rows'],
+                layout['columns'],
+                shared_config.get('product_id_length', 32)
+            )
+            self.shared_table.sync(self.positions.values())
+            logger.info(f"🗺️ Shared occupancy table at {self.shared_table.path}")
+        except OSError as e:
+            logger.error(f"❌ Could not create shared occupancy table: {e}")
+            self.shared_table = None
+
+    def _publish_position(self, position: StoragePosition):
+        """Propagate a position state change (called with the lock held)"""
+        was_occupied = position.id in self._occupied_ids
+        was_reserved = position.id in self._reserved_ids
+        previous_product = self.product_index.product_at(position.id)
+        self.product_index.update(position)
+
+        if position.occupied:
+            self._occupied_ids.add(position.id)
+        else:
+            self._occupied_ids.discard(position.id)
+        if position.status == PositionStatus.RESERVED:
+            self._reserved_ids.add(position.id)
+        else:
+            self._reserved_ids.discard(position.id)
+
+        if self.event_bus:
+            self._emit_position_event(position, was_occupied, was_reserved, previous_product)
+
+        # Dirty-cell update of the cached grid
+        cell = self._grid_cells.get(position.id)
+        if cell:
+            text = self._format_cell(position)
+            if self._grid[cell[0]][cell[1]] != text:
+                self._grid[cell[0]][cell[1]] = text
+                self._grid_version += 1
+                self._grid_changes.append((self._grid_version, cell[0], cell[1], text))
+
+        if self.shared_table:
+            self.shared_table.update_position(position)
+
+    def _emit_position_event(self, position: StoragePosition, was_occupied: bool,
+                             was_reserved: bool, previous_product: Optional[str]):
+        if position.occupied and not was_occupied:
+            event_type, product_id = EventType.POSITION_STORED, position.product_id
+        elif was_occupied and not position.occupied:
+            event_type, product_id = EventType.POSITION_RETRIEVED, previous_product
+        elif position.status == PositionStatus.RESERVED and not was_reserved:
+            event_type, product_id = EventType.POSITION_RESERVED, None
+        elif was_reserved and position.status != PositionStatus.RESERVED and not position.occupied:
+            event_type, product_id = EventType.POSITION_RELEASED, None
+        else:
+            return
+        self.event_bus.publish(event_type, position_id=position.id, row=position.row,
+                               column=position.column, product_id=product_id,
+                               status=position.status.value)
+
+    def close(self):
+        """Release resources held by the position manager"""
+        with self._lock:
+            if self.shared_table:
+                self.shared_table.close()
+                self.shared_table = None
+
     def get_position(self, position_id: int) -> Optional[StoragePosition]:
         """Get position by ID"""
         return self.positions.get(position_id)
 
     def find_empty_position(self) -> Optional[StoragePosition]:
-        """Find the first available empty position"""
+        """Find the first available empty position (reserved slots are skipped)"""
         with self._lock:
-            for position in self.positions.values():
-                if not position.occupied:
-                    return position
-            return None
+            return self._find_available_position()
+
+    def _find_available_position(self) -> Optional[StoragePosition]:
+        for position in self.positions.values():
+            if not position.occupied and position.status != PositionStatus.RESERVED:
+                return position
+        return None
 
-    def find_product(self, product_id: str) -> Optional[StoragePosition]:
-        """Find position containing specific product"""
+    def reserve_position(self, position_id: Optional[int] = None, product_id: Optional[str] = None,
+                         ttl: Optional[float] = None) -> Optional[PositionReservation]:
+        """Reserve a specific or the first available empty position"""
         with self._lock:
-            for position in self.positions.values():
-                if position.occupied and position.product_id == product_id:
-                    return position
-            return None
+            if position_id is None:
+                position = self._find_available_position()
+                if not position:
+                    logger.error("❌ No empty positions available to reserve")
+                    return None
+            else:
+                position = self.positions.get(position_id)
+                if not position:
+                    logger.error(f"❌ Invalid position ID: {position_id}")
+                    return None
+                if position.occupied or position.status == PositionStatus.RESERVED:
+                    logger.error(f"❌ Position {position_id} is not available for reservation")
+                    return None
+
+            ttl = self.default_reservation_ttl if ttl is None else ttl
+            reservation = PositionReservation(
+                reservation_id=f"RSV-{next(self._reservation_counter):06d}",
+                position_id=position.id,
+                product_id=product_id,
+                ttl=ttl,
+                deadline=clock.monotonic() + ttl
+            )
+            self.reservations[reservation.reservation_id] = reservation
+            self._reservation_wheel.schedule(reservation.reservation_id, reservation.deadline)
+
+            position.status = PositionStatus.RESERVED
+            position.reservation_id = reservation.reservation_id
+            self._publish_position(position)
+
+            logger.debug(f"🔒 Reserved position {position.id} ({reservation.reservation_id}, {ttl}s)")
+            return reservation
+
+    def commit_reservation(self, reservation_id: str, product_id: Optional[str] = None,
+                           expires_at: Optional[datetime] = None) -> bool:
+        """Store an item into a reserved position"""
+        reservation = self.reservations.get(reservation_id)
+        if not reservation:
+            logger.error(f"❌ Reservation {reservation_id} not found or expired")
+            return False
+
+        return self.store_item(reservation.position_id, product_id or reservation.product_id,
+                               expires_at, reservation_id=reservation_id)
 
-    def store_item(self, position_id: int, product_id: str) -> bool:
-        """Store item in specified position"""
+    def release_reservation(self, reservation_id: str) -> bool:
+        """Release a reservation without storing anything"""
         with self._lock:
-            position = self.positions.get(position_id)
-            if not position:
-                return False
+            return self._release_reservation(reservation_id)
 
-            if position.occupied:
-                logger.error(f"❌ Position {position_id} already occupied")
-                return False
+    def _release_reservation(self, reservation_id: str) -> bool:
+        reservation = self.reservations.pop(reservation_id, None)
+        if not reservation:
+            return False
+        self._reservation_wheel.cancel(reservation_id)
 
-            # Update position data
-            position.occupied = True
-            position.product_id = product_id
-            position.stored_at = datetime.now()
-            position.status = PositionStatus.OCCUPIED
+        position = self.positions.get(reservation.position_id)
+        if position and position.reservation_id == reservation_id:
+            position.reservation_id = None
+            if position.id in self._storing:
+                return True  # the store publishes the outcome once its LED write settles
+            if not position.occupied:
+                position.status = PositionStatus.EMPTY
+            self._publish_position(position)
+        return True
+
+    def expire_reservations(self, now: Optional[float] = None) -> List[str]:
+        """Release reservations whose TTL has elapsed"""
+        with self._lock:
+            expired = self._reservation_wheel.advance(now)
+            for reservation_id in expired:
+                self._release_reservation(reservation_id)
+
+        for reservation_id in expired:
+            logger.warning(f"⌛ Reservation {reservation_id} expired")
+        return expired
+
+    def find_product(self, product_id: str,
+                     policy: Optional[RetrievalPolicy] = None) -> Optional[StoragePosition]:
+        """Find the position holding the next unit of a product to retrieve"""
+        with self._lock:
+            pos_id = self.product_index.pick(product_id, policy or self.default_retrieval_policy,
+                                             self.positions, self.retrieval_origin)
+            return self.positions.get(pos_id) if pos_id is not None else None
+
+    def get_product_quantity(self, product_id: str) -> int:
+        """Number of stored units of a product"""
+        with self._lock:
+            return self.product_index.quantity(product_id)
+
+    def store_item(self, position_id: int, product_id: str,
+                   expires_at: Optional[datetime] = None,
+                   reservation_id: Optional[str] = None) -> bool:
+        """Store item in specified position
+
+        A reserved position only accepts the item holding its reservation.
+        The LED write happens under the position's own lock only, so
+        operations on other positions can proceed in parallel.
+        """
+        position_lock = self._position_locks.get(position_id)
+        if not position_lock:
+            return False
+
+        with position_lock:
+            with self._lock:
+                position = self.positions[position_id]
+
+                if position.occupied:
+                    logger.error(f"❌ Position {position_id} already occupied")
+                    return False
+
+                if position.status == PositionStatus.RESERVED and position.reservation_id != reservation_id:
+                    logger.error(f"❌ Position {position_id} is reserved ({position.reservation_id})")
+                    return False
+
+                # Update position data
+                position.occupied = True
+                position.product_id = product_id
+                position.stored_at = clock.now()
+                position.expires_at = expires_at
+                position.status = PositionStatus.OCCUPIED
+                # Claimed but not published until the LED write is confirmed
+                self._storing.add(position_id)
 
             # Turn on LED to indicate occupied
-            if self.opc_client.write_value(position.led_node, True):
-                logger.info(f"📦 Stored {product_id} at position {position_id}")
-                return True
-            else:
-                # Rollback on LED write failure
+            try:
+                led_ok = self.opc_client.write_value(position.led_node, True)
+            except Exception as e:
+                logger.error(f"❌ LED write for position {position_id} failed: {e}")
+                led_ok = False
+
+            with self._lock:
+                self._storing.discard(position_id)
+                if led_ok:
+                    if position.reservation_id:
+                        self.reservations.pop(position.reservation_id, None)
+                        self._reservation_wheel.cancel(position.reservation_id)
+                        position.reservation_id = None
+                    self._publish_position(position)
+                    logger.info(f"📦 Stored {product_id} at position {position_id}")
+                    return True
+                else:
+                    # Rollback on LED write failure (a reservation stays held)
+                    position.occupied = False
+                    position.product_id = None
+                    position.stored_at = None
+                    position.expires_at = None
+                    position.status = PositionStatus.RESERVED if position.reservation_id else PositionStatus.EMPTY
+                    # Republish: the reservation may have expired during the write
+                    self._publish_position(position)
+                    return False
+
+    def retrieve_item(self, position_id: int) -> Optional[str]:
+        """Retrieve item from specified position
+
+        The slot stays occupied until the LED write is confirmed, so a
+        failed write needs no rollback and nobody can claim it meanwhile.
+        """
+        position_lock = self._position_locks.get(position_id)
+        if not position_lock:
+            logger.error(f"❌ Position {position_id} is empty")
+            return None
+
+        with position_lock:
+            position = self.positions[position_id]
+            if not position.occupied:
+                logger.error(f"❌ Position {position_id} is empty")
+                return None
+
+            # Turn off LED to indicate empty
+            if not self.opc_client.write_value(position.led_node, False):
+                return None
+
+            with self._lock:
+                product_id = position.product_id
+
+                # Update position data
                 position.occupied = False
                 position.product_id = None
                 position.stored_at = None
+                position.expires_at = None
                 position.status = PositionStatus.EMPTY
+                self._publish_position(position)
+
+            logger.info(f"📤 Retrieved {product_id} from position {position_id}")
+            return product_id
+
+    def store_items(self, items: List[tuple]) -> List[Dict[str, Any]]:
+        """Store several items with one state update and one bulk LED write
+
+        Items are (product_id, position_id or None[, expires_at]) tuples; a
+        None position is assigned the next available empty slot. Returns one
+        result per item, in order.
+        """
+        results = [{"product_id": item[0], "position_id": item[1], "success": False, "error": None}
+                   for item in items]
+        expiries = [item[2] if len(item) > 2 else None for item in items]
+
+        # Choose positions: explicit ones first so auto-assignment avoids them
+        with self._lock:
+            taken: Set[int] = set()
+            for result in results:
+                position_id = result["position_id"]
+                if position_id is None:
+                    continue
+                position = self.positions.get(position_id)
+                if not position:
+                    result["error"] = f"Position {position_id} does not exist"
+                elif position_id in taken:
+                    result["error"] = f"Position {position_id} used twice in batch"
+                elif position.occupied:
+                    result["error"] = f"Position {position_id} already occupied"
+                elif position.status == PositionStatus.RESERVED:
+                    result["error"] = f"Position {position_id} is reserved ({position.reservation_id})"
+                else:
+                    taken.add(position_id)
+
+            for result in results:
+                if result["position_id"] is not None:
+                    continue
+                position = next((p for p in self.positions.values()
+                                 if p.id not in taken and not p.occupied
+                                 and p.status != PositionStatus.RESERVED), None)
+                if not position:
+                    result["error"] = "No empty positions available"
+                    continue
+                result["position_id"] = position.id
+                taken.add(position.id)
+
+        def claim(position, result, index):
+            if position.occupied or position.status == PositionStatus.RESERVED:
+                result["error"] = f"Position {position.id} was taken meanwhile"
                 return False
+            position.occupied = True
+            position.product_id = result["product_id"]
+            position.stored_at = clock.now()
+            position.expires_at = expiries[index]
+            position.status = PositionStatus.OCCUPIED
+            return True
+
+        def rollback(position):
+            position.occupied = False
+            position.product_id = None
+            position.stored_at = None
+            position.expires_at = None
+            position.status = PositionStatus.EMPTY
+
+        return self._apply_batch(results, taken, True, claim, None, rollback, "📦 Stored")
+
+    def retrieve_items(self, items: List[tuple],
+                       policy: Optional[RetrievalPolicy] = None) -> List[Dict[str, Any]]:
+        """Retrieve several items with one state update and one bulk LED write
+
+        Items are (product_id or None, position_id or None) tuples: a
+        position empties that slot (checking the product if given), a bare
+        product picks a unit by the retrieval policy. Returns one result
+        per item, in order.
+        """
+        results = [{"product_id": item[0], "position_id": item[1], "success": False, "error": None}
+                   for item in items]
+        policy = policy or self.default_retrieval_policy
 
-    def retrieve_item(self, position_id: int) -> Optional[str]:
-        """Retrieve item from specified position"""
         with self._lock:
-            position = self.positions.get(position_id)
-            if not position or not position.occupied:
-                logger.error(f"❌ Position {position_id} is empty")
-                return None
+            taken: Set[int] = set()
+            for result in results:
+                position_id = result["position_id"]
+                if position_id is None:
+                    continue
+                position = self.positions.get(position_id)
+                if not position:
+                    result["error"] = f"Position {position_id} does not exist"
+                elif position_id in taken:
+                    result["error"] = f"Position {position_id} used twice in batch"
+                elif not position.occupied:
+                    result["error"] = f"Position {position_id} is empty"
+                elif result["product_id"] and position.product_id != result["product_id"]:
+                    result["error"] = f"Position {position_id} holds {position.product_id}"
+                else:
+                    result["product_id"] = position.product_id
+                    taken.add(position_id)
+
+            for result in results:
+                if result["position_id"] is not None or result["error"]:
+                    continue
+                if not result["product_id"]:
+                    result["error"] = "No product or position given"
+                    continue
+                position_id = self.product_index.pick(result["product_id"], policy, self.positions,
+                                                      self.retrieval_origin, exclude=taken)
+                if position_id is None:
+                    result["error"] = f"No more units of {result['product_id']} stored"
+                    continue
+                result["position_id"] = position_id
+                taken.add(position_id)
 
-            product_id = position.product_id
+        def claim(position, result, index):
+            if not position.occupied or position.product_id != result["product_id"]:
+                result["error"] = f"Position {position.id} changed meanwhile"
+                return False
+            return True
 
-            # Update position data
+        def release(position):
             position.occupied = False
             position.product_id = None
             position.stored_at = None
+            position.expires_at = None
             position.status = PositionStatus.EMPTY
 
-            # Turn off LED to indicate empty
-            if self.opc_client.write_value(position.led_node, False):
-                logger.info(f"📤 Retrieved {product_id} from position {position_id}")
-                return product_id
-            else:
-                # Rollback on LED write failure
-                position.occupied = True
-                position.product_id = product_id
-                position.status = PositionStatus.OCCUPIED
-                return None
+        return self._apply_batch(results, taken, False, claim, release, None, "📤 Retrieved")
+
+    def _apply_batch(self, results: List[Dict[str, Any]], position_ids: Set[int], led_state: bool,
+                     claim, on_written, on_failed, action: str) -> List[Dict[str, Any]]:
+        """Lock the chosen positions, write all their LEDs at once and commit
+
+        Stores are claimed before the write and rolled back if it fails;
+        retrievals stay occupied until the write is confirmed.
+        """
+        locks = [self._position_locks[pos_id] for pos_id in sorted(position_ids)]
+        for lock in locks:
+            lock.acquire()
+        try:
+            with self._lock:
+                claimed = []
+                for index, result in enumerate(results):
+                    if result["error"] or result["position_id"] is None:
+                        continue
+                    position = self.positions[result["position_id"]]
+                    if claim(position, result, index):
+                        claimed.append((position, result))
+
+            led_ok = self.opc_client.write_values({position.led_node: led_state
+                                                   for position, _ in claimed})
+
+            with self._lock:
+                for position, result in claimed:
+                    if led_ok:
+                        if on_written:
+                            on_written(position)
+                        self._publish_position(position)
+                        result["success"] = True
+                    else:
+                        if on_failed:
+                            on_failed(position)
+                        result["error"] = "LED write failed"
+        finally:
+            for lock in locks:
+                lock.release()
+
+        succeeded = sum(1 for result in results if result["success"])
+        logger.info(f"{action} {succeeded}/{len(results)} items in batch")
+        return results
 
     def update_all_leds(self):
-        """Update all LED states based on occupancy"""
+        """Update all LED states based on occupancy (one bulk write)"""
         with self._lock:
-            for position in self.positions.values():
-                led_state = position.occupied
-                self.opc_client.write_value(position.led_node, led_state)
+            led_states = {position.led_node: position.occupied for position in self.positions.values()}
+
+        self.opc_client.write_values(led_states)
 
     def monitor_pushbuttons(self) -> List[int]:
-        """Check which push buttons are currently pressed"""
-        pressed_buttons = []
-        for position in self.positions.values():
-            if self.opc_client.read_value(position.pushbutton_node):
-                pressed_buttons.append(position.id)
-        return pressed_buttons
+        """Check which push buttons are currently pressed (raw levels)"""
+        levels = self.opc_client.read_values([node for _, node in self._button_nodes]) or []
+        return [pos_id for (pos_id, _), level in zip(self._button_nodes, levels) if level]
+
+    def poll_button_events(self, now: Optional[float] = None) -> List[ButtonEvent]:
+        """Sample all push buttons once and return debounced press events"""
+        levels = self.opc_client.read_values([node for _, node in self._button_nodes])
+        if levels is None:
+            return []
+
+        now = clock.monotonic() if now is None else now
+        events = []
+        for (pos_id, _), level in zip(self._button_nodes, levels):
+            event = self.button_debouncer.update(pos_id, level, now)
+            if event:
+                events.append(event)
+        return events
 
     def get_occupancy_stats(self) -> Dict[str, Any]:
-        """Get occupancy statistics"""
-        with self._lock:
-            occupied_count = sum(1 for pos in self.positions.values() if pos.occupied)
-            total_count = len(self.positions)
+        """Get occupancy statistics (O(1), served from maintained counters)"""
+        occupied_count = len(self._occupied_ids)
+        reserved_count = len(self._reserved_ids)
+        total_count = len(self.positions)
 
-            return {
-                "total_positions": total_count,
-                "occupied_positions": occupied_count,
-                "empty_positions": total_count - occupied_count,
-                "occupancy_percent": int((occupied_count / total_count) * 100),
-                "grid_layout": f"{self.config['storage_rack']['layout']['rows']}×{self.config['storage_rack']['layout']['columns']}"
-            }
+        return {
+            "total_positions": total_count,
+            "occupied_positions": occupied_count,
+            "reserved_positions": reserved_count,
+            "empty_positions": total_count - occupied_count - reserved_count,
+            "occupancy_percent": int((occupied_count / total_count) * 100) if total_count else 0,
+            "grid_layout": self._grid_layout
+        }
+
+    @property
+    def grid_cells(self) -> Dict[int, Tuple[int, int]]:
+        """Position ID -> (row, column) index of the positions drawn on the grid"""
+        return dict(self._grid_cells)
+
+    @property
+    def grid_version(self) -> int:
+        """Version of the cached grid, incremented on every changed cell"""
+        return self._grid_version
 
     def get_grid_display(self) -> List[List[str]]:
         """Get visual grid representation of the rack"""
-        rows = self.config['storage_rack']['layout']['rows']
-        cols = self.config['storage_rack']['layout']['columns']
-
-        grid = []
-        for r in range(1, rows + 1):
-            row = []
-            for c in range(1, cols + 1):
-                # Find position at this grid location
-                pos_id = ((r - 1) * cols) + c
-                if pos_id <= 35:  # Valid position
-                    position = self.positions.get(pos_id)
-                    if position and position.occupied:
-                        row.append(f"[{pos_id:02d}]")  # Occupied
-                    else:
-                        row.append(f" {pos_id:02d} ")   # Empty
-                else:
-                    row.append("    ")  # No position
-            grid.append(row)
+        with self._lock:
+            return [row[:] for row in self._grid]
 
-        return grid
+    def get_grid_changes(self, since_version: int) -> Tuple[int, Optional[List[Tuple[int, int, str]]]]:
+        """Get grid cells changed since a version as (row_index, column_index, text)
 
-print("✅ OMRON AS/RS Core Classes Defined")
-print("   - OmronOPCClient for OPC UA communication")
-print("   - PositionManager for 35-position rack management")
-print("   - StoragePosition with LED and push button control")
-print("   - Visual grid display functionality")
+        Returns the current version and the changed cells, or None for the
+        changes if the caller is too far behind and must redraw in full.
+        """
+        with self._lock:
+            version = self._grid_version
+            if since_version >= version:
+                return version, []
+            if not self._grid_changes or self._grid_changes[0][0] > since_version + 1:
+                return version, None
+            return version, [(r, c, text) for v, r, c, text in self._grid_changes if v > since_version]
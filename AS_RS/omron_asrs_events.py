@@ -0,0 +1,153 @@
+"""
+OMRON AS/RS Event Bus
+In-process publish/subscribe for rack, task and safety state changes
+"""
+
+import itertools
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from omron_asrs_clock import clock
+
+
+class EventType(Enum):
+    POSITION_STORED = "position_stored"
+    POSITION_RETRIEVED = "position_retrieved"
+    POSITION_RESERVED = "position_reserved"
+    POSITION_RELEASED = "position_released"
+    TASK_STATE = "task_state"
+    BUTTON_PRESSED = "button_pressed"
+    EMERGENCY_STOP = "emergency_stop"
+    CONNECTION = "connection"
+
+
+class DropPolicy(Enum):
+    DROP_OLDEST = "drop_oldest"  # keep the latest events (default, good for UIs)
+    DROP_NEWEST = "drop_newest"  # keep the earliest events, refuse new ones
+
+
+@dataclass(frozen=True)
+class ASRSEvent:
+    """A single state change"""
+    event_type: EventType
+    sequence: int
+    data: Dict[str, Any] = field(default_factory=dict)
+    timestamp: datetime = field(default_factory=clock.now)  # virtual time during simulations
+
+
+class Subscription:
+    """Bounded event queue of one subscriber
+
+    When the queue is full the drop policy decides which event is lost;
+    lost events are counted in dropped so consumers can resynchronise
+    (e.g. redraw from a full snapshot).
+    """
+
+    def __init__(self, bus: "EventBus", event_types: Optional[Iterable[EventType]],
+                 maxsize: int, policy: DropPolicy):
+        self._bus = bus
+        self.event_types = frozenset(event_types) if event_types else None
+        self.maxsize = maxsize
+        self.policy = policy
+        self.dropped = 0
+        self.closed = False
+        self._events = deque()
+        self._cond = threading.Condition()
+
+    def wants(self, event_type: EventType) -> bool:
+        return self.event_types is None or event_type in self.event_types
+
+    def _offer(self, event: ASRSEvent):
+        with self._cond:
+            if len(self._events) >= self.maxsize:
+                self.dropped += 1
+                if self.policy == DropPolicy.DROP_NEWEST:
+                    return
+                self._events.popleft()
+            self._events.append(event)
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[ASRSEvent]:
+        """Next event, or None on timeout or when the subscription is closed"""
+        with self._cond:
+            if not self._events and not self.closed:
+                self._cond.wait(timeout)
+            return self._events.popleft() if self._events else None
+
+    def drain(self) -> List[ASRSEvent]:
+        """All queued events without waiting"""
+        with self._cond:
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def __iter__(self) -> Iterator[ASRSEvent]:
+        """Yield events until the subscription is closed"""
+        while True:
+            event = self.get()
+            if event is None and self.closed:
+                return
+            if event is not None:
+                yield event
+
+    def close(self):
+        """Unsubscribe and wake up a blocked get()"""
+        self._bus.unsubscribe(self)
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EventBus:
+    """Fan-out of typed events to bounded subscriber queues
+
+    Publishing never blocks on a slow consumer and costs next to nothing
+    when nobody is subscribed.
+    """
+
+    def __init__(self):
+        self._subscribers = ()
+        self._lock = threading.Lock()
+        self._sequence = itertools.count(1)
+        self.published = 0
+
+    def subscribe(self, event_types: Optional[Iterable[EventType]] = None, maxsize: int = 1000,
+                  policy: DropPolicy = DropPolicy.DROP_OLDEST) -> Subscription:
+        """Subscribe to some (default: all) event types"""
+        subscription = Subscription(self, event_types, maxsize, policy)
+        with self._lock:
+            self._subscribers = self._subscribers + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers if s is not subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event_type: EventType, **data) -> Optional[ASRSEvent]:
+        """Deliver an event to every interested subscriber"""
+        subscribers = [s for s in self._subscribers if s.wants(event_type)]
+        if not subscribers:
+            return None
+
+        event = ASRSEvent(event_type, next(self._sequence), data)
+        self.published += 1
+        for subscription in subscribers:
+            subscription._offer(event)
+        return event
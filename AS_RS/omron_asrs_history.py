@@ -0,0 +1,219 @@
+"""
+OMRON AS/RS Task History
+Fixed-size ring of recent tasks with write-behind archiving to SQLite
+"""
+
+import logging
+import queue
+import sqlite3
+import threading
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from omron_asrs_core import TaskType
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS task_history (
+    task_id      TEXT NOT NULL,
+    task_type    TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    position_id  INTEGER,
+    product_id   TEXT,
+    priority     INTEGER,
+    result       TEXT,
+    created_at   REAL,
+    started_at   REAL,
+    completed_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_task_history_completed ON task_history (completed_at);
+CREATE INDEX IF NOT EXISTS idx_task_history_product ON task_history (product_id, completed_at);
+CREATE INDEX IF NOT EXISTS idx_task_history_position ON task_history (position_id, completed_at);
+"""
+
+_COLUMNS = ("task_id", "task_type", "status", "position_id", "product_id", "priority",
+            "result", "created_at", "started_at", "completed_at")
+
+
+@dataclass(frozen=True)
+class TaskRecord:
+    """Finished task, detached from the live ASRSTask and StoragePosition"""
+    task_id: str
+    task_type: TaskType
+    status: str
+    position_id: Optional[int] = None
+    product_id: Optional[str] = None
+    priority: int = 1
+    result: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+    @classmethod
+    def from_task(cls, task) -> "TaskRecord":
+        return cls(task_id=task.task_id, task_type=task.task_type, status=task.status,
+                   position_id=task.position.id if task.position else None,
+                   product_id=task.product_id, priority=int(task.priority), result=task.result,
+                   created_at=task.created_at, started_at=task.started_at,
+                   completed_at=task.completed_at)
+
+    def to_row(self) -> tuple:
+        def ts(value):
+            return value.timestamp() if value else None
+        return (self.task_id, self.task_type.value, self.status, self.position_id, self.product_id,
+                self.priority, self.result, ts(self.created_at), ts(self.started_at),
+                ts(self.completed_at))
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "TaskRecord":
+        values = dict(zip(_COLUMNS, row))
+        for key in ("created_at", "started_at", "completed_at"):
+            values[key] = datetime.fromtimestamp(values[key]) if values[key] is not None else None
+        values["task_type"] = TaskType(values["task_type"])
+        return cls(**values)
+
+
+class TaskHistory:
+    """Recent-task ring buffer backed by an indexed SQLite archive
+
+    Memory is bounded by ring_size (plus at most max_pending records
+    waiting for the archive writer; beyond that records are dropped and
+    counted). Every record is handed to a background thread that inserts
+    it into SQLite in batches, so the task path never waits for disk I/O.
+    """
+
+    # Most records inserted per SQLite transaction
+    BATCH_SIZE = 500
+
+    def __init__(self, ring_size: int = 500, archive_path: Optional[str] = None,
+                 max_pending: int = 10000):
+        self._ring = deque(maxlen=ring_size)
+        self._lock = threading.Lock()
+        self.total = 0
+        self.status_counts: Dict[str, int] = {}
+        self.type_status_counts: Dict[Tuple[str, str], int] = {}
+
+        self.archive_path = archive_path
+        self.dropped = 0
+        self._pending: "queue.Queue[Optional[TaskRecord]]" = queue.Queue(maxsize=max_pending)
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+
+        if archive_path:
+            self._db = sqlite3.connect(archive_path, check_same_thread=False)
+            self._db.executescript(_SCHEMA)
+            self._writer = threading.Thread(target=self._writer_loop, name="task-history-writer",
+                                            daemon=True)
+            self._writer.start()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "TaskHistory":
+        history_config = config.get('history', {})
+        # Off unless enabled with a path: nothing is written to the working directory by default
+        archive_path = history_config.get('archive_path') if history_config.get('archive_enabled', False) else None
+        return cls(ring_size=history_config.get('ring_size', 500),
+                   archive_path=archive_path,
+                   max_pending=history_config.get('max_pending', 10000))
+
+    def add(self, task) -> TaskRecord:
+        """Record a finished task"""
+        record = TaskRecord.from_task(task)
+        with self._lock:
+            self._ring.append(record)
+            self.total += 1
+            self.status_counts[record.status] = self.status_counts.get(record.status, 0) + 1
+            key = (record.task_type.value, record.status)
+            self.type_status_counts[key] = self.type_status_counts.get(key, 0) + 1
+
+        if self._db is not None:
+            try:
+                self._pending.put_nowait(record)
+            except queue.Full:
+                self.dropped += 1
+        return record
+
+    def recent(self, limit: Optional[int] = None) -> List[TaskRecord]:
+        """Most recent records, oldest first"""
+        with self._lock:
+            records = list(self._ring)
+        return records[-limit:] if limit else records
+
+    def __len__(self) -> int:
+        return self.total
+
+    # Archive queries (fall back to the ring when no archive is configured)
+
+    def by_product(self, product_id: str, limit: int = 100) -> List[TaskRecord]:
+        """Latest tasks for a product, newest first"""
+        return self._query("product_id = ?", (product_id,), limit,
+                           lambda r: r.product_id == product_id)
+
+    def by_position(self, position_id: int, limit: int = 100) -> List[TaskRecord]:
+        """Latest tasks on a position, newest first"""
+        return self._query("position_id = ?", (position_id,), limit,
+                           lambda r: r.position_id == position_id)
+
+    def between(self, start: datetime, end: datetime, limit: int = 1000) -> List[TaskRecord]:
+        """Tasks completed in [start, end), newest first"""
+        return self._query("completed_at >= ? AND completed_at < ?", (start.timestamp(), end.timestamp()),
+                           limit, lambda r: r.completed_at is not None and start <= r.completed_at < end)
+
+    def _query(self, where: str, params: tuple, limit: int, matches) -> List[TaskRecord]:
+        if self._db is None:
+            return [record for record in reversed(self.recent()) if matches(record)][:limit]
+
+        self.flush()
+        sql = (f"SELECT {', '.join(_COLUMNS)} FROM task_history WHERE {where} "
+               f"ORDER BY completed_at DESC LIMIT ?")
+        with self._db_lock:
+            rows = self._db.execute(sql, params + (limit,)).fetchall()
+        return [TaskRecord.from_row(row) for row in rows]
+
+    # Write-behind archive
+
+    def flush(self):
+        """Block until every recorded task is in the archive"""
+        if self._db is not None:
+            self._pending.join()
+
+    def close(self):
+        """Flush the archive and stop the writer thread"""
+        if self._writer is None:
+            return
+        self._pending.put(None)
+        self._writer.join()
+        self._writer = None
+        with self._db_lock:
+            self._db.close()
+        self._db = None
+
+    def _writer_loop(self):
+        while True:
+            batch = [self._pending.get()]
+            # Whatever queued up meanwhile goes into the same transaction
+            while batch[-1] is not None and len(batch) < self.BATCH_SIZE:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = [record for record in batch if record is not None]
+            if records:
+                try:
+                    with self._db_lock:
+                        self._db.executemany(
+                            f"INSERT INTO task_history ({', '.join(_COLUMNS)}) "
+                            f"VALUES ({', '.join('?' * len(_COLUMNS))})",
+                            [record.to_row() for record in records])
+                        self._db.commit()
+                except sqlite3.Error as e:
+                    logger.error(f"❌ Error archiving {len(records)} tasks: {e}")
+
+            for _ in batch:
+                self._pending.task_done()
+            if batch[-1] is None:
+                return
@@ -0,0 +1,84 @@
+"""
+OMRON AS/RS Task Latency Tracking
+Rolling per-task-type breakdown of queue wait, execution, PLC I/O and end-to-end time
+"""
+
+import csv
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+# Phases recorded for every executed task, in seconds
+METRICS = ("queue_wait", "execution", "plc_io", "end_to_end")
+PERCENTILES = (50, 90, 99)
+
+_CSV_FIELDS = ("task_id", "task_type", "status", "completed_at") + tuple(f"{m}_ms" for m in METRICS)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class TaskLatencyTracker:
+    """Keeps the last window samples per task type
+
+    Recording is O(1); percentiles are computed on demand from the
+    window, so the task path never pays for the statistics.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, task, plc_io: float = 0.0):
+        """Record a finished task (needs created_at, started_at and completed_at)"""
+        if not (task.created_at and task.started_at and task.completed_at):
+            return
+        queue_wait = (task.started_at - task.created_at).total_seconds()
+        execution = (task.completed_at - task.started_at).total_seconds()
+        end_to_end = (task.completed_at - task.created_at).total_seconds()
+        sample = (task.task_id, task.status, task.completed_at, queue_wait, execution,
+                  min(plc_io, execution), end_to_end)
+
+        with self._lock:
+            samples = self._samples.get(task.task_type.value)
+            if samples is None:
+                samples = self._samples[task.task_type.value] = deque(maxlen=self.window)
+            samples.append(sample)
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """{task type: {metric: {count, mean_ms, p50_ms, p90_ms, p99_ms, max_ms}}}"""
+        with self._lock:
+            snapshot = {task_type: list(samples) for task_type, samples in self._samples.items()}
+
+        result = {}
+        for task_type, samples in snapshot.items():
+            result[task_type] = {}
+            for index, metric in enumerate(METRICS, start=3):
+                values = sorted(sample[index] * 1000 for sample in samples)
+                stats = {"count": len(values), "mean_ms": round(sum(values) / len(values), 2)}
+                for pct in PERCENTILES:
+                    stats[f"p{pct}_ms"] = round(percentile(values, pct), 2)
+                stats["max_ms"] = round(values[-1], 2)
+                result[task_type][metric] = stats
+        return result
+
+    def export_csv(self, path: str, task_type: Optional[str] = None) -> int:
+        """Write the samples in the window to a CSV file; returns the row count"""
+        with self._lock:
+            rows = [(name, sample) for name, samples in self._samples.items()
+                    if task_type is None or name == task_type for sample in samples]
+
+        rows.sort(key=lambda row: row[1][2])
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(_CSV_FIELDS)
+            for name, (task_id, status, completed_at, *durations) in rows:
+                writer.writerow([task_id, name, status, completed_at.isoformat()]
+                                + [f"{d * 1000:.3f}" for d in durations])
+        return len(rows)
@@ -0,0 +1,228 @@
+"""
+OMRON AS/RS Rack Layout
+Expands position templates into storage positions, validates the result
+and caches the compiled configuration keyed by the source file's hash
+"""
+
+import hashlib
+import json
+import logging
+import marshal
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Bump when expansion or validation changes, so old caches are rebuilt
+COMPILER_VERSION = 1
+CACHE_MAGIC = b"ASRSCFG1"
+_DIGEST_SIZE = 16
+
+DEFAULT_TEMPLATE = {
+    "name": "Position {position}",
+    "led_node": "ns=4;s=led{position}",
+    "pushbutton_node": "ns=4;s=pb{position}",
+}
+POSITION_FIELDS = ("id", "name", "led_node", "pushbutton_node", "row", "column")
+
+
+class ConfigError(ValueError):
+    """The configuration is malformed; problems lists every issue found"""
+
+    def __init__(self, problems: List[str]):
+        self.problems = problems
+        super().__init__("; ".join(problems[:10]) + (f" (+{len(problems) - 10} more)" if len(problems) > 10 else ""))
+
+
+def _span(value, name: str) -> Tuple[int, int]:
+    """[first, last] (inclusive) or a single number"""
+    if isinstance(value, int):
+        return value, value
+    if isinstance(value, (list, tuple)) and len(value) == 2 and all(isinstance(v, int) for v in value):
+        return value[0], value[1]
+    raise ConfigError([f"{name} must be a number or [first, last], got {value!r}"])
+
+
+def expand_positions(rack: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """storage_positions entries from storage_rack.positions ranges and overrides
+
+    Each range covers rows x columns (row-major) with consecutive IDs from
+    first_id (default: after the previous range); templates may use
+    {position}, {row}, {column}, {rack} and {index} (1-based within the
+    range). Positions of a named rack carry it as "rack", so several racks
+    can share the same row/column cells. overrides patch single positions
+    by ID, null removes one.
+    """
+    section = rack.get('positions', {})
+    base = {**DEFAULT_TEMPLATE, **section.get('position_template', {})}
+    positions: Dict[int, Dict[str, Any]] = {}
+    next_id = 1
+
+    for number, block in enumerate(section.get('ranges', []), start=1):
+        where = f"storage_rack.positions.ranges[{number - 1}]"
+        first_row, last_row = _span(block.get('rows'), f"{where}.rows")
+        first_column, last_column = _span(block.get('columns'), f"{where}.columns")
+        template = {**base, **block.get('template', {})}
+        rack_name = block.get('rack', "")
+        position = block.get('first_id', next_id)
+        index = 1
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                values = {"position": position, "row": row, "column": column, "rack": rack_name, "index": index}
+                try:
+                    entry = {key: template[key].format(**values) for key in ("name", "led_node", "pushbutton_node")}
+                except (KeyError, IndexError) as e:
+                    raise ConfigError([f"{where}: unknown template placeholder {e}"])
+                if position in positions:
+                    raise ConfigError([f"{where}: position {position} is already defined"])
+                positions[position] = {"id": position, **entry, "row": row, "column": column}
+                if rack_name:
+                    positions[position]["rack"] = rack_name
+                position += 1
+                index += 1
+        next_id = position
+
+    for key, override in section.get('overrides', {}).items():
+        try:
+            position_id = int(key)
+        except ValueError:
+            raise ConfigError([f"storage_rack.positions.overrides: '{key}' is not a position ID"])
+        if override is None:
+            positions.pop(position_id, None)
+        elif position_id in positions:
+            positions[position_id].update(override)
+        else:
+            positions[position_id] = {"id": position_id, **override}
+
+    return {f"position_{position_id:02d}": {**entry, "occupied": False, "product_id": None, "stored_at": None}
+            for position_id, entry in sorted(positions.items())}
+
+
+def validate_config(config: Dict[str, Any]) -> List[str]:
+    """Every schema problem in an expanded configuration (empty if valid)"""
+    problems = []
+
+    def section(path: str) -> Optional[Dict[str, Any]]:
+        node: Any = config
+        for part in path.split('.'):
+            if not isinstance(node, dict) or part not in node:
+                problems.append(f"missing {path}")
+                return None
+            node = node[part]
+        if not isinstance(node, dict):
+            problems.append(f"{path} must be an object")
+            return None
+        return node
+
+    for path, keys in (("system", ("name",)), ("communication", ("endpoint",)),
+                       ("control_nodes", ("emergency_kill",))):
+        node = section(path)
+        for key in keys if node is not None else ():
+            if not isinstance(node.get(key), str):
+                problems.append(f"{path}.{key} must be a string")
+
+    layout = section("storage_rack.layout")
+    rows = columns = None
+    if layout is not None:
+        rows, columns = layout.get('rows'), layout.get('columns')
+        if not (isinstance(rows, int) and isinstance(columns, int) and rows > 0 and columns > 0):
+            problems.append("storage_rack.layout rows and columns must be positive integers")
+            rows = columns = None
+
+    positions = section("storage_positions")
+    if positions is None:
+        return problems
+    if not positions:
+        problems.append("storage_positions is empty")
+    seen: Dict[str, Dict[Any, str]] = {"id": {}, "cell": {}, "led_node": {}, "pushbutton_node": {}}
+    for key, entry in positions.items():
+        missing = [name for name in POSITION_FIELDS if name not in entry]
+        if missing:
+            problems.append(f"{key}: missing {', '.join(missing)}")
+            continue
+        if not all(isinstance(entry[name], int) for name in ("id", "row", "column")):
+            problems.append(f"{key}: id, row and column must be integers")
+            continue
+        if rows and not (1 <= entry['row'] <= rows and 1 <= entry['column'] <= columns):
+            problems.append(f"{key}: row {entry['row']}, column {entry['column']} is outside the "
+                            f"{rows}x{columns} layout")
+        # Cells are unique within a rack; IDs and PLC nodes across the whole system
+        cell = (entry.get('rack', ""), entry['row'], entry['column'])
+        for field_name, value in (("id", entry['id']), ("cell", cell),
+                                  ("led_node", entry['led_node']), ("pushbutton_node", entry['pushbutton_node'])):
+            other = seen[field_name].setdefault(value, key)
+            if other != key:
+                if field_name == "cell":
+                    value = f"({cell[1]}, {cell[2]})" + (f" of rack {cell[0]}" if cell[0] else "")
+                problems.append(f"{key}: {field_name} {value} is also used by {other}")
+    return problems
+
+
+def compile_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Expand position ranges (if any) and validate; raises ConfigError
+
+    Without ranges, explicitly listed storage_positions are kept as they are.
+    """
+    rack = config.get('storage_rack', {})
+    if rack.get('positions', {}).get('ranges'):
+        config = dict(config)
+        config['storage_positions'] = expand_positions(rack)
+        config['storage_rack'] = dict(rack, total_positions=len(config['storage_positions']))
+    problems = validate_config(config)
+    if problems:
+        raise ConfigError(problems)
+    return config
+
+
+def load_config(path: str, use_cache: bool = True) -> Dict[str, Any]:
+    """Compiled configuration from a JSON file, from the binary cache when the file is unchanged
+
+    The cache (path + '.cache') holds the expanded, validated config as
+    marshal data behind a hash of the source, so start-up skips parsing,
+    expansion and validation regardless of rack size.
+    """
+    with open(path, 'rb') as f:
+        source = f.read()
+    digest = hashlib.blake2b(source, digest_size=_DIGEST_SIZE,
+                             person=f"asrs{COMPILER_VERSION}m{marshal.version}".encode()).digest()
+    cache_path = path + ".cache"
+
+    if use_cache:
+        config = _read_cache(cache_path, digest)
+        if config is not None:
+            return config
+
+    config = compile_config(json.loads(source))
+    if use_cache:
+        _write_cache(cache_path, digest, config)
+    return config
+
+
+def _read_cache(cache_path: str, digest: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        with open(cache_path, 'rb') as f:
+            header = f.read(len(CACHE_MAGIC) + _DIGEST_SIZE)
+            if header != CACHE_MAGIC + digest:
+                return None
+            return marshal.loads(f.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, EOFError, TypeError) as e:
+        logger.warning(f"⚠️ Ignoring unreadable config cache {cache_path}: {e}")
+        return None
+
+
+def _write_cache(cache_path: str, digest: bytes, config: Dict[str, Any]):
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(CACHE_MAGIC + digest)
+            f.write(marshal.dumps(config))
+        os.replace(temp_path, cache_path)
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ Could not write config cache {cache_path}: {e}")
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
@@ -0,0 +1,323 @@
+"""
+OMRON AS/RS Load Generator
+Drives a running controller with a configurable traffic mix and measures it
+"""
+
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from omron_asrs_latency import percentile
+
+logger = logging.getLogger(__name__)
+
+OPERATIONS = ("store", "retrieve", "display", "button")
+
+
+@dataclass
+class LoadMix:
+    """Relative weights of the operations a client issues"""
+    store: float = 4.0
+    retrieve: float = 4.0
+    display: float = 1.0
+    button: float = 1.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "LoadMix":
+        """'store=4,retrieve=4,display=1,button=1' (omitted operations get 0)"""
+        weights = dict.fromkeys(OPERATIONS, 0.0)
+        for part in filter(None, (item.strip() for item in spec.split(","))):
+            name, _, weight = part.partition("=")
+            if name not in weights:
+                raise ValueError(f"Unknown operation in mix: {name}")
+            weights[name] = float(weight or 1)
+        return cls(**weights)
+
+    def weights(self) -> List[float]:
+        return [getattr(self, operation) for operation in OPERATIONS]
+
+    def __str__(self) -> str:
+        return ",".join(f"{op}={getattr(self, op):g}" for op in OPERATIONS if getattr(self, op))
+
+
+class LockStats:
+    """Acquisitions, contended acquisitions and time spent waiting for one lock"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_seconds = 0.0
+        self.max_wait = 0.0
+
+
+class InstrumentedLock:
+    """Lock/RLock wrapper that counts contention (usable under a Condition)
+
+    Counters are updated while the lock is held, so they need no lock
+    of their own.
+    """
+
+    def __init__(self, lock, stats: LockStats):
+        self._lock = lock
+        self.stats = stats
+        # Let a Condition built on this wrapper save/restore an RLock's recursion
+        for name in ("_release_save", "_acquire_restore", "_is_owned"):
+            if hasattr(lock, name):
+                setattr(self, name, getattr(lock, name))
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        if self._lock.acquire(False):
+            self.stats.acquisitions += 1
+            return True
+        if not blocking:
+            return False
+        started = time.perf_counter()
+        if not self._lock.acquire(True, timeout):
+            return False
+        waited = time.perf_counter() - started
+        stats = self.stats
+        stats.acquisitions += 1
+        stats.contended += 1
+        stats.wait_seconds += waited
+        stats.max_wait = max(stats.max_wait, waited)
+        return True
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def instrument_locks(controller) -> Dict[str, List[LockStats]]:
+    """Swap the controller's locks for instrumented ones (call before start())"""
+    registry: Dict[str, List[LockStats]] = {}
+
+    def wrap(name, lock):
+        stats = LockStats(name)
+        registry.setdefault(name, []).append(stats)
+        return InstrumentedLock(lock, stats)
+
+    manager = controller.position_manager
+    manager._lock = wrap("position_manager", manager._lock)
+    manager._position_locks = {position_id: wrap("position_slots", lock)
+                               for position_id, lock in manager._position_locks.items()}
+    controller._dispatch_cond = threading.Condition(wrap("dispatch", controller._dispatch_cond._lock))
+    queue_ = controller.task_queue
+    queue_._cond = threading.Condition(wrap("task_queue", queue_._cond._lock))
+    controller.opc_client._lock = wrap("opc_node_cache", controller.opc_client._lock)
+    controller.history._lock = wrap("history", controller.history._lock)
+    controller.latency._lock = wrap("latency", controller.latency._lock)
+    controller.events._lock = wrap("event_bus", controller.events._lock)
+    return registry
+
+
+def contention_summary(registry: Dict[str, List[LockStats]]) -> Dict[str, Dict[str, Any]]:
+    """Per lock (summed over instances, e.g. all position slots)"""
+    result = {}
+    for name, instances in registry.items():
+        acquisitions = sum(stats.acquisitions for stats in instances)
+        contended = sum(stats.contended for stats in instances)
+        result[name] = {
+            "acquisitions": acquisitions,
+            "contended": contended,
+            "contention_ratio": round(contended / acquisitions, 4) if acquisitions else 0.0,
+            "wait_ms": round(sum(stats.wait_seconds for stats in instances) * 1000, 2),
+            "max_wait_ms": round(max(stats.max_wait for stats in instances) * 1000, 2),
+        }
+    return result
+
+
+@dataclass
+class LoadResult:
+    """Outcome of one load run"""
+    mix: str
+    clients: int
+    elapsed_s: float
+    tasks: int
+    tasks_per_sec: float
+    cpu_s: float
+    cpu_per_task_ms: float
+    operations: Dict[str, Dict[str, Any]]
+    controller_latency: Dict[str, Any]
+    locks: Dict[str, Dict[str, Any]]
+    label: str = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+
+@dataclass
+class _ClientStats:
+    latencies: Dict[str, List[float]] = field(default_factory=lambda: {op: [] for op in OPERATIONS})
+    outcomes: Dict[str, Dict[str, int]] = field(default_factory=lambda: {op: {} for op in OPERATIONS})
+
+    def count(self, operation: str, outcome: str, latency: Optional[float] = None):
+        counts = self.outcomes[operation]
+        counts[outcome] = counts.get(outcome, 0) + 1
+        if latency is not None:
+            self.latencies[operation].append(latency)
+
+
+class LoadGenerator:
+    """Closed-loop clients issuing a weighted mix of operations
+
+    Each client picks an operation, submits it through the controller's
+    public API and waits for it to finish (rate > 0 paces the clients to
+    that many operations per second in total). A button operation holds
+    the push button of an occupied position on the mock PLC until the
+    controller's auto-retrieval empties it, like an operator would.
+    """
+
+    def __init__(self, controller, mix: Optional[LoadMix] = None, clients: int = 4,
+                 duration: float = 5.0, rate: float = 0.0, products: int = 10,
+                 wait_timeout: float = 5.0, seed: int = 44):
+        self.controller = controller
+        self.mix = mix or LoadMix()
+        self.clients = clients
+        self.duration = duration
+        self.rate = rate
+        self.products = [f"LOAD-{index:03d}" for index in range(products)]
+        self.wait_timeout = wait_timeout
+        self.seed = seed
+        self._plc_values = getattr(controller.opc_client.client, "mock_values", None)
+        self._button_lock = threading.Lock()
+        self._pressed = set()
+
+    def run(self, locks: Optional[Dict[str, List[LockStats]]] = None, label: str = "") -> LoadResult:
+        """Run the clients for duration seconds (locks: from instrument_locks())"""
+        stats = [_ClientStats() for _ in range(self.clients)]
+        tasks_before = self.controller.history.total
+        deadline = time.perf_counter() + self.duration
+        threads = [threading.Thread(target=self._client, args=(index, stats[index], deadline),
+                                    name=f"load-client-{index}", daemon=True)
+                   for index in range(self.clients)]
+
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.controller.wait_until_idle(timeout=self.wait_timeout)
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+
+        tasks = self.controller.history.total - tasks_before
+        return LoadResult(
+            mix=str(self.mix),
+            clients=self.clients,
+            elapsed_s=round(elapsed, 3),
+            tasks=tasks,
+            tasks_per_sec=round(tasks / elapsed, 1) if elapsed else 0.0,
+            cpu_s=round(cpu, 3),
+            cpu_per_task_ms=round(cpu / tasks * 1000, 3) if tasks else 0.0,
+            operations=self._summarize(stats),
+            controller_latency=self.controller.latency.summary(),
+            locks=contention_summary(locks) if locks else {},
+            label=label
+        )
+
+    @staticmethod
+    def _summarize(stats: List[_ClientStats]) -> Dict[str, Dict[str, Any]]:
+        result = {}
+        for operation in OPERATIONS:
+            outcomes: Dict[str, int] = {}
+            for client in stats:
+                for outcome, count in client.outcomes[operation].items():
+                    outcomes[outcome] = outcomes.get(outcome, 0) + count
+            if not outcomes:
+                continue
+            latencies = sorted(value * 1000 for client in stats for value in client.latencies[operation])
+            summary: Dict[str, Any] = {"issued": sum(outcomes.values()), **outcomes}
+            if latencies:
+                summary.update(p50_ms=round(percentile(latencies, 50), 2),
+                               p90_ms=round(percentile(latencies, 90), 2),
+                               p99_ms=round(percentile(latencies, 99), 2),
+                               max_ms=round(latencies[-1], 2))
+            result[operation] = summary
+        return result
+
+    def _client(self, index: int, stats: _ClientStats, deadline: float):
+        rng = random.Random(self.seed + index)
+        weights = self.mix.weights()
+        interval = self.clients / self.rate if self.rate > 0 else 0.0
+        next_at = time.perf_counter() + rng.random() * interval
+        while True:
+            if interval:
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                next_at += interval
+            if time.perf_counter() >= deadline:
+                return
+            operation = rng.choices(OPERATIONS, weights)[0]
+            try:
+                getattr(self, f"_{operation}")(rng, stats)
+            except Exception as e:
+                logger.error(f"❌ Load client {index}: {operation} raised {e}")
+                stats.count(operation, "error")
+
+    def _wait(self, operation: str, handle, started: float, stats: _ClientStats):
+        if handle is None:
+            stats.count(operation, "rejected")
+        elif not handle.wait(self.wait_timeout):
+            stats.count(operation, "timeout")
+        else:
+            stats.count(operation, "completed" if handle.succeeded else "failed",
+                        time.perf_counter() - started)
+
+    def _store(self, rng: random.Random, stats: _ClientStats):
+        started = time.perf_counter()
+        handle = self.controller.store_item_auto_position(rng.choice(self.products))
+        self._wait("store", handle, started, stats)
+
+    def _retrieve(self, rng: random.Random, stats: _ClientStats):
+        started = time.perf_counter()
+        handle = self.controller.retrieve_item_by_product(rng.choice(self.products))
+        self._wait("retrieve", handle, started, stats)
+
+    def _display(self, rng: random.Random, stats: _ClientStats):
+        started = time.perf_counter()
+        self._wait("display", self.controller.update_display(), started, stats)
+
+    def _button(self, rng: random.Random, stats: _ClientStats):
+        if self._plc_values is None:
+            stats.count("button", "unsupported")
+            return
+        with self._button_lock:
+            candidates = [position for position in self.controller.position_manager.positions.values()
+                          if position.occupied and position.id not in self._pressed]
+            if not candidates:
+                stats.count("button", "rejected")
+                return
+            position = rng.choice(candidates)
+            self._pressed.add(position.id)
+            # The slot may be refilled right away; watch for this unit leaving it
+            unit = position.stored_at
+
+        started = time.perf_counter()
+        self._plc_values[position.pushbutton_node] = True
+        try:
+            timeout_at = started + self.wait_timeout
+            while position.stored_at == unit and time.perf_counter() < timeout_at:
+                time.sleep(0.001)
+            if position.stored_at == unit:
+                stats.count("button", "timeout")
+            else:
+                stats.count("button", "completed", time.perf_counter() - started)
+        finally:
+            self._plc_values[position.pushbutton_node] = False
+            # The release has to be sampled and debounced before the next press counts
+            time.sleep(self.controller.position_manager.button_debouncer.debounce +
+                       2 * self.controller.button_poll_interval)
+            with self._button_lock:
+                self._pressed.discard(position.id)
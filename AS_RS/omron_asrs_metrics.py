@@ -0,0 +1,221 @@
+"""
+OMRON AS/RS Metrics Exporter
+Prometheus text-format metrics over a stdlib HTTP server (own thread)
+
+Scrapes only read counters the controller already keeps in memory;
+they never trigger PLC reads.
+"""
+
+import bisect
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; suits PLC round-trips (ms) up to whole tasks (s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, Dict[str, Any], float]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class MetricFamily:
+    """One metric (all label combinations) as rendered at scrape time"""
+
+    def __init__(self, name: str, metric_type: str, help_text: str, samples: Iterable[Sample] = ()):
+        self.name = name
+        self.metric_type = metric_type
+        self.help_text = help_text
+        self.samples: List[Sample] = list(samples)
+
+    def add(self, value: float, suffix: str = "", **labels):
+        self.samples.append((self.name + suffix, labels, value))
+        return self
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        lines += [f"{name}{_format_labels(labels)} {_format_value(value)}"
+                  for name, labels, value in self.samples]
+        return "\n".join(lines)
+
+
+class Histogram:
+    """Cumulative histogram updated on the hot path (one lock, one bisect)"""
+
+    def __init__(self, name: str, help_text: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Labels, List[float]] = {}  # labels -> bucket counts + [sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self) -> List[MetricFamily]:
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+
+        family = MetricFamily(self.name, "histogram", self.help_text)
+        for key, series in sorted(snapshot.items()):
+            labels = dict(key)
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                family.add(cumulative, "_bucket", **labels, le=_format_value(bound))
+            family.add(series[-1], "_bucket", **labels, le="+Inf")
+            family.add(series[-2], "_sum", **labels)
+            family.add(series[-1], "_count", **labels)
+        return [family]
+
+
+class MetricsRegistry:
+    """Collects metric families from registered collector callables"""
+
+    def __init__(self):
+        self._collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+
+    def register(self, collector: Callable[[], Iterable[MetricFamily]]):
+        self._collectors.append(collector)
+        return collector
+
+    def render(self) -> str:
+        families = []
+        for collector in self._collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                logger.error(f"❌ Metrics collector failed: {e}")
+        return "\n".join(family.render() for family in families) + "\n"
+
+
+class MetricsExporter:
+    """Serves a registry at http://host:port/metrics from a daemon thread"""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None  # ThreadingHTTPServer while running
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> int:
+        """Start serving; returns the bound port (useful with port 0)"""
+        # Imported here: http.server is the heaviest import of the controller and rarely used
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-exporter",
+                                        daemon=True)
+        self._thread.start()
+        logger.info(f"📈 Metrics exporter listening on http://{self.host}:{self.port}/metrics")
+        return self.port
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join(timeout=2)
+            self._server = None
+
+
+def controller_registry(controller) -> MetricsRegistry:
+    """Registry exposing an OmronASRSController's in-memory state"""
+    registry = MetricsRegistry()
+    registry.register(controller.opc_client.io_histogram.collect)
+
+    def collect() -> List[MetricFamily]:
+        history = controller.history
+        tasks = MetricFamily("asrs_tasks_total", "counter", "Finished tasks by type and status")
+        for (task_type, status), count in sorted(history.type_status_counts.items()):
+            tasks.add(count, task_type=task_type, status=status)
+
+        depth = MetricFamily("asrs_task_queue_depth", "gauge", "Pending tasks by priority")
+        for priority, stats in controller.task_queue.stats().items():
+            depth.add(stats["depth"], priority=priority)
+
+        occupancy = controller.position_manager.get_occupancy_stats()
+        positions = MetricFamily("asrs_positions", "gauge", "Storage positions by state")
+        positions.add(occupancy["occupied_positions"], state="occupied")
+        positions.add(occupancy["reserved_positions"], state="reserved")
+        positions.add(occupancy["empty_positions"], state="empty")
+
+        families = [
+            tasks,
+            depth,
+            MetricFamily("asrs_tasks_active", "gauge", "Tasks currently executing").add(len(controller.active_tasks)),
+            positions,
+            MetricFamily("asrs_occupancy_ratio", "gauge", "Occupied share of all positions").add(
+                occupancy["occupied_positions"] / occupancy["total_positions"] if occupancy["total_positions"] else 0),
+            MetricFamily("asrs_plc_connected", "gauge", "1 if the OPC UA session is up").add(
+                1 if controller.opc_client.connected else 0),
+            MetricFamily("asrs_plc_connects_total", "counter", "OPC UA connection attempts that succeeded").add(
+                controller.opc_client.connect_count),
+            MetricFamily("asrs_emergency_stop", "gauge", "1 while the emergency stop is active").add(
+                1 if controller.status.value == "emergency_stop" else 0),
+            MetricFamily("asrs_events_published_total", "counter", "Events published on the bus").add(
+                controller.events.published),
+        ]
+
+        latency = MetricFamily("asrs_task_latency_seconds", "summary",
+                               "Rolling task latency by type and phase")
+        for task_type, phases in controller.latency.summary().items():
+            for phase, stats in phases.items():
+                for quantile in ("50", "90", "99"):
+                    latency.add(stats[f"p{quantile}_ms"] / 1000, task_type=task_type, phase=phase,
+                                quantile=f"0.{quantile}")
+                latency.add(stats["count"], "_count", task_type=task_type, phase=phase)
+        families.append(latency)
+        return families
+
+    registry.register(collect)
+    return registry
@@ -0,0 +1,191 @@
+"""
+OMRON AS/RS Safety Watcher
+Dedicated emergency-stop path: own PLC session, own thread, one-request shutdown
+"""
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from omron_asrs_clock import clock
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class EmergencyStopReport:
+    """Timing of one emergency stop
+
+    The *_at fields are time.perf_counter() seconds, used only for the
+    reaction deltas: those measure real PLC round trips, even under the
+    simulator. timestamp comes from the controller's clock, so the report
+    sits on the same (possibly virtual) timeline as tasks and events.
+    """
+    detected_at: float
+    written_at: float
+    confirmed_at: float
+    outputs_written: bool
+    outputs_confirmed: bool
+    outputs: int
+    timestamp: datetime
+
+    @property
+    def write_ms(self) -> float:
+        """Kill detected -> emergency write set acknowledged"""
+        return (self.written_at - self.detected_at) * 1000
+
+    @property
+    def reaction_ms(self) -> float:
+        """Kill detected -> outputs read back in their safe state"""
+        return (self.confirmed_at - self.detected_at) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "timestamp": self.timestamp.isoformat(),
+            "outputs": self.outputs,
+            "outputs_written": self.outputs_written,
+            "outputs_confirmed": self.outputs_confirmed,
+            "write_ms": round(self.write_ms, 2),
+            "reaction_ms": round(self.reaction_ms, 2),
+        }
+
+
+def _raise_thread_priority(niceness: int):
+    """Best effort: renice the calling thread (Linux threads have their own nice value)"""
+    if not niceness or not hasattr(os, "setpriority"):
+        return
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), niceness)
+        logger.info(f"🛡️ Safety watcher running at nice {niceness}")
+    except (OSError, AttributeError) as e:
+        logger.debug(f"Could not change safety watcher priority: {e}")
+
+
+class EmergencyStopWatcher:
+    """Polls the kill switch on a private PLC session and trips the emergency write set
+
+    Nothing on this path shares a lock or a connection with task
+    execution, so in-flight task I/O cannot delay it. On a trip the
+    interlocked clients (the controller's session) stop accepting writes,
+    then the write set (every output and its safe value, built once) is
+    sent in a single request and read back; a write that was already on
+    the wire can land late, so the set is re-sent until it reads back
+    safe. The watcher latches after a trip; the system has to be
+    restarted once the kill switch is reset.
+    """
+
+    # Write + read-back rounds before giving up on confirmation
+    CONFIRM_ATTEMPTS = 3
+
+    def __init__(self, session, kill_node: str, emergency_outputs: Dict[str, Any],
+                 on_trip: Optional[Callable[[EmergencyStopReport], None]] = None,
+                 poll_interval: float = 0.01, reaction_slo_ms: float = 100.0,
+                 confirm_outputs: bool = True, niceness: int = -5, interlocked: Iterable = ()):
+        self.session = session
+        self.kill_node = kill_node
+        self.emergency_outputs = dict(emergency_outputs)
+        self.on_trip = on_trip
+        self.interlocked = list(interlocked)
+        self.poll_interval = poll_interval
+        self.reaction_slo_ms = reaction_slo_ms
+        self.confirm_outputs = confirm_outputs
+        self.niceness = niceness
+
+        self.tripped = threading.Event()  # set once the write set has been sent and checked
+        self.reports: List[EmergencyStopReport] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_controller(cls, controller, on_trip=None) -> "EmergencyStopWatcher":
+        """Watcher with its own session and the rack's LEDs (plus safety.extra_outputs) as write set"""
+        safety_config = controller.config.get('safety', {})
+        outputs = {position.led_node: False for position in controller.position_manager.positions.values()}
+        outputs.update(safety_config.get('extra_outputs', {}))
+        return cls(controller.opc_client.new_session(),
+                   controller.config['control_nodes']['emergency_kill'],
+                   outputs, on_trip,
+                   poll_interval=safety_config.get('poll_interval_seconds', 0.01),
+                   reaction_slo_ms=safety_config.get('reaction_slo_ms', 100.0),
+                   confirm_outputs=safety_config.get('confirm_outputs', True),
+                   niceness=safety_config.get('thread_niceness', -5),
+                   interlocked=[controller.opc_client])
+
+    @property
+    def last_report(self) -> Optional[EmergencyStopReport]:
+        return self.reports[-1] if self.reports else None
+
+    def start(self) -> bool:
+        if not self.session.connected and not self.session.connect():
+            logger.error("❌ Safety watcher could not open its PLC session")
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch_loop, name="emergency-stop-watcher", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+        self.session.disconnect()
+
+    def _watch_loop(self):
+        _raise_thread_priority(self.niceness)
+        logger.info(f"🛡️ Safety watcher polling {self.kill_node} every {self.poll_interval * 1000:.0f} ms")
+        while not self._stop.is_set():
+            if self.session.read_value(self.kill_node):
+                self.trip(time.perf_counter())
+                return
+            self._stop.wait(self.poll_interval)
+
+    def trip(self, detected_at: Optional[float] = None) -> EmergencyStopReport:
+        """Send the emergency write set, confirm it and notify the controller"""
+        detected_at = detected_at or time.perf_counter()
+        timestamp = clock.now()
+        logger.error("🚨 EMERGENCY KILL ACTIVATED!")
+
+        for client in self.interlocked:
+            client.write_inhibited = True
+
+        written = self.session.write_values(self.emergency_outputs)
+        written_at = time.perf_counter()
+        confirmed = written and (not self.confirm_outputs or self.outputs_safe())
+        for _ in range(self.CONFIRM_ATTEMPTS - 1):
+            if confirmed or not self.confirm_outputs:
+                break
+            confirmed = self.reassert()
+        report = EmergencyStopReport(detected_at, written_at, time.perf_counter(), written, confirmed,
+                                     len(self.emergency_outputs), timestamp)
+        self.reports.append(report)
+        self.tripped.set()
+
+        if not confirmed:
+            logger.critical(f"🚨 Emergency outputs NOT confirmed safe ({len(self.emergency_outputs)} outputs)")
+        elif report.reaction_ms > self.reaction_slo_ms:
+            logger.warning(f"⚠️ Emergency reaction {report.reaction_ms:.1f} ms exceeds "
+                           f"SLO of {self.reaction_slo_ms:.0f} ms")
+        else:
+            logger.info(f"🛡️ Emergency outputs safe in {report.reaction_ms:.1f} ms")
+
+        if self.on_trip:
+            try:
+                self.on_trip(report)
+            except Exception as e:
+                logger.error(f"❌ Error in emergency stop handler: {e}")
+        return report
+
+    def outputs_safe(self) -> bool:
+        """Read every emergency output back and compare with its safe value"""
+        values = self.session.read_values(list(self.emergency_outputs))
+        return values is not None and all(
+            value == safe for value, safe in zip(values, self.emergency_outputs.values()))
+
+    def reassert(self) -> bool:
+        """Send the write set again; True once it reads back safe"""
+        return self.session.write_values(self.emergency_outputs) and self.outputs_safe()
@@ -0,0 +1,232 @@
+"""
+OMRON AS/RS Command Scripts
+Non-interactive command runner with JSONL results
+"""
+
+import csv
+import json
+import logging
+import queue
+import shlex
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, IO, Iterable, List, Optional, Tuple
+
+from omron_asrs_core import RetrievalPolicy, TaskPriority
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = {"normal": TaskPriority.NORMAL, "high": TaskPriority.HIGH, "urgent": TaskPriority.URGENT}
+
+USAGE = """\
+store PRODUCT [POSITION] [expires=YYYY-MM-DD] [priority=normal|high|urgent]
+retrieve PRODUCT|#POSITION [policy=fifo|lifo|fefo|nearest] [priority=...]
+display                     update all LEDs
+cancel TASK_ID              cancel a queued task
+batch store|retrieve FILE   CSV batch (product_id[, position][, expires_at])
+status                      system status
+wait [SECONDS]              wait for everything submitted so far"""
+
+
+def read_batch_csv(path: str, action: str) -> List[tuple]:
+    """Items for store_items_batch ('S') or retrieve_items_batch ('R') from a CSV file
+
+    The file needs a header row with product_id and optionally position
+    and expires_at (YYYY-MM-DD) columns; a blank position means
+    auto-assign (store) or pick by retrieval policy (retrieve).
+    """
+    items = []
+    with open(path, newline='') as f:
+        for line_number, row in enumerate(csv.DictReader(f), start=2):
+            product_id = (row.get("product_id") or "").strip() or None
+            position = (row.get("position") or "").strip()
+            expiry = (row.get("expires_at") or "").strip()
+            position_id = int(position) if position else None
+            if action == "S":
+                if not product_id:
+                    raise ValueError(f"line {line_number}: product_id is required")
+                expires_at = datetime.strptime(expiry, "%Y-%m-%d") if expiry else None
+                items.append((product_id, position_id, expires_at))
+            else:
+                items.append((product_id, position_id))
+    return items
+
+
+class CommandScript:
+    """Runs text commands against a controller and writes one JSON object per result
+
+    Tasks are submitted as fast as the commands are read; their results
+    are written as they finish (in completion order, each tagged with the
+    command's line number). 'wait' is a barrier, and sync=True waits for
+    every command before reading the next. The script always waits for
+    outstanding tasks at the end and closes with a summary line.
+    """
+
+    def __init__(self, controller, output: IO[str] = None, sync: bool = False,
+                 wait_timeout: float = 60.0):
+        self.controller = controller
+        self.output = output or sys.stdout
+        self.sync = sync
+        self.wait_timeout = wait_timeout
+        self._outstanding: Dict[str, Tuple[int, str, Optional[str], float]] = {}  # task_id -> line, command, product, submitted
+        self._finished: "queue.SimpleQueue" = queue.SimpleQueue()
+        self.counts = {"ok": 0, "failed": 0, "rejected": 0, "error": 0}
+
+    def run(self, lines: Iterable[str]) -> Dict[str, Any]:
+        """Execute every command; returns the summary that is also written last"""
+        started = time.perf_counter()
+        commands = 0
+        for line_number, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            commands += 1
+            try:
+                self.execute(line_number, line)
+            except (ValueError, OSError) as e:
+                self._emit({"line": line_number, "command": line.split()[0].lower(),
+                            "status": "error", "error": str(e)}, "error")
+            if self.sync:
+                self.wait()
+            else:
+                self._flush()
+        timed_out = not self.wait(self.wait_timeout)
+
+        elapsed = time.perf_counter() - started
+        summary = {"summary": {"commands": commands, **self.counts, "timed_out": timed_out,
+                               "elapsed_s": round(elapsed, 3)}}
+        self._write(summary)
+        self.output.flush()
+        return summary["summary"]
+
+    def execute(self, line_number: int, line: str):
+        """Run one command line (ValueError for bad input)"""
+        words = shlex.split(line)
+        command, args = words[0].lower(), [word for word in words[1:] if "=" not in word]
+        options = dict(word.split("=", 1) for word in words[1:] if "=" in word)
+        handler = getattr(self, f"_cmd_{command}", None)
+        if handler is None:
+            raise ValueError(f"unknown command '{command}'")
+        handler(line_number, args, options)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Write results until every submitted task has finished; False on timeout"""
+        deadline = time.monotonic() + (self.wait_timeout if timeout is None else timeout)
+        while self._outstanding:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                for task_id, (line_number, command, product_id, _) in list(self._outstanding.items()):
+                    self._emit({"line": line_number, "command": command, "task_id": task_id,
+                                "product_id": product_id, "status": "timeout"}, "error")
+                self._outstanding.clear()
+                return False
+            try:
+                self._report(self._finished.get(timeout=remaining))
+            except queue.Empty:
+                pass
+        return True
+
+    # Commands
+
+    def _cmd_store(self, line_number: int, args: List[str], options: Dict[str, str]):
+        if not args:
+            raise ValueError("store needs a product ID")
+        expiry = options.get("expires")
+        expires_at = datetime.strptime(expiry, "%Y-%m-%d") if expiry else None
+        priority = self._priority(options)
+        if len(args) > 1:
+            handle = self.controller.store_item_at_position(int(args[1]), args[0], expires_at, priority)
+        else:
+            handle = self.controller.store_item_auto_position(args[0], expires_at, priority)
+        self._track(line_number, "store", handle, args[0])
+
+    def _cmd_retrieve(self, line_number: int, args: List[str], options: Dict[str, str]):
+        if not args:
+            raise ValueError("retrieve needs a product ID or #position")
+        priority = self._priority(options)
+        if args[0].startswith("#"):
+            handle = self.controller.retrieve_item_from_position(int(args[0][1:]), priority)
+        else:
+            policy = RetrievalPolicy(options["policy"].lower()) if "policy" in options else None
+            handle = self.controller.retrieve_item_by_product(args[0], policy, priority)
+        self._track(line_number, "retrieve", handle, None if args[0].startswith("#") else args[0])
+
+    def _cmd_display(self, line_number: int, args: List[str], options: Dict[str, str]):
+        self._track(line_number, "display", self.controller.update_display())
+
+    def _cmd_cancel(self, line_number: int, args: List[str], options: Dict[str, str]):
+        if not args:
+            raise ValueError("cancel needs a task ID")
+        cancelled = self.controller.cancel_task(args[0])
+        self._emit({"line": line_number, "command": "cancel", "task_id": args[0],
+                    "status": "cancelled" if cancelled else "rejected"}, "ok" if cancelled else "rejected")
+
+    def _cmd_batch(self, line_number: int, args: List[str], options: Dict[str, str]):
+        if len(args) != 2 or args[0].lower() not in ("store", "retrieve"):
+            raise ValueError("usage: batch store|retrieve FILE")
+        action = args[0][0].upper()
+        items = read_batch_csv(args[1], action)
+        if action == "S":
+            results = self.controller.store_items_batch(items)
+        else:
+            policy = RetrievalPolicy(options["policy"].lower()) if "policy" in options else None
+            results = self.controller.retrieve_items_batch(items, policy)
+        for result in results:
+            self._emit({"line": line_number, "command": f"batch {args[0].lower()}",
+                        "status": "completed" if result["success"] else "failed", **result},
+                       "ok" if result["success"] else "failed")
+
+    def _cmd_status(self, line_number: int, args: List[str], options: Dict[str, str]):
+        self._flush()
+        self._write({"line": line_number, "command": "status", "status": "ok",
+                     "system": self.controller.get_system_status()})
+
+    def _cmd_wait(self, line_number: int, args: List[str], options: Dict[str, str]):
+        self.wait(float(args[0]) if args else None)
+
+    # Results
+
+    @staticmethod
+    def _priority(options: Dict[str, str]) -> int:
+        name = options.get("priority", "normal").lower()
+        if name not in PRIORITIES:
+            raise ValueError(f"unknown priority '{name}'")
+        return PRIORITIES[name]
+
+    def _track(self, line_number: int, command: str, handle, product_id: Optional[str] = None):
+        if handle is None:
+            self._emit({"line": line_number, "command": command, "status": "rejected",
+                        "product_id": product_id}, "rejected")
+            return
+        self._outstanding[handle.task_id] = (line_number, command, product_id, time.perf_counter())
+        # Runs in the worker thread: only hand the result over, the script thread writes it
+        handle.add_done_callback(lambda done: self._finished.put((done, time.perf_counter())))
+
+    def _flush(self):
+        while True:
+            try:
+                self._report(self._finished.get_nowait())
+            except queue.Empty:
+                return
+
+    def _report(self, finished):
+        handle, finished_at = finished
+        tracked = self._outstanding.pop(handle.task_id, None)
+        if tracked is None:
+            return  # already reported as timed out
+        line_number, command, product_id, submitted = tracked
+        task = handle.task
+        self._emit({"line": line_number, "command": command, "task_id": handle.task_id,
+                    "status": handle.status,
+                    "position_id": task.position.id if task.position else None,
+                    "product_id": task.product_id or product_id, "result": handle.result,
+                    "latency_ms": round((finished_at - submitted) * 1000, 2)},
+                   "ok" if handle.succeeded else "failed")
+
+    def _emit(self, record: Dict[str, Any], outcome: str):
+        self.counts[outcome] += 1
+        self._write(record)
+
+    def _write(self, record: Dict[str, Any]):
+        self.output.write(json.dumps(record, default=str) + "\n")
@@ -0,0 +1,250 @@
+"""
+OMRON AS/RS Shared Occupancy Table
+Memory-mapped, fixed-layout mirror of rack state for read-only consumers
+(dashboards, reporting scripts, inventory GUI) running in other processes
+"""
+
+import mmap
+import os
+import struct
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+# File layout (little-endian):
+#   [0:64)            header
+#   [64:64+B)         occupancy bitmap, one bit per slot, padded to 8 bytes
+#   [64+B:...)        slot table, one fixed-size record per position
+MAGIC = b"ASRS"
+LAYOUT_VERSION = 1
+HEADER_SIZE = 64
+
+# magic, layout version, header size, capacity, rows, columns,
+# product id length, slot size, bitmap offset, slots offset
+_HEADER_FMT = "<4sHHIHHHHII"
+_SEQ_OFFSET = 32
+_SEQ_FMT = "<Q"
+# updated_at (epoch seconds), occupied count
+_COUNTERS_OFFSET = 40
+_COUNTERS_FMT = "<dI"
+
+# position id, row, column, status code, stored_at (epoch, 0 = unset), product id
+_SLOT_FMT = "<IHHB7xd{}s"
+
+DEFAULT_PRODUCT_ID_LENGTH = 32
+
+STATUS_CODES = {"empty": 0, "occupied": 1, "reserved": 2, "error": 3}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+
+def _bitmap_size(capacity: int) -> int:
+    return ((capacity + 63) // 64) * 8
+
+
+class SharedOccupancyTable:
+    """Writer side of the shared occupancy table (owned by PositionManager)
+
+    Every update is wrapped in a seqlock: the sequence counter is odd while
+    a write is in progress and even when the table is consistent.
+    """
+
+    def __init__(self, path: str, positions: Iterable[Any], rows: int, columns: int,
+                 product_id_length: int = DEFAULT_PRODUCT_ID_LENGTH):
+        self.path = path
+        self.product_id_length = product_id_length
+        self._slot_struct = struct.Struct(_SLOT_FMT.format(product_id_length))
+
+        position_ids = sorted(p.id for p in positions)
+        self.capacity = len(position_ids)
+        self._slot_index = {pos_id: index for index, pos_id in enumerate(position_ids)}
+
+        self._bitmap_offset = HEADER_SIZE
+        self._slots_offset = HEADER_SIZE + _bitmap_size(self.capacity)
+        self.size = self._slots_offset + self.capacity * self._slot_struct.size
+
+        self._seq = 0
+        self._occupied = set()
+
+        # Create or grow the backing file without truncating it: readers (or a
+        # previous controller) may still have it mapped, and shrinking a mapped
+        # file makes their accesses fault
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(self._fd).st_size < self.size:
+                os.ftruncate(self._fd, self.size)
+            self._mm = mmap.mmap(self._fd, self.size)
+        except OSError:
+            os.close(self._fd)
+            raise
+
+        # Carry on from an existing table's version so readers never see it go backwards
+        if self._mm[:len(MAGIC)] == MAGIC:
+            self._seq = (struct.unpack_from(_SEQ_FMT, self._mm, _SEQ_OFFSET)[0] + 1) & ~1
+
+        struct.pack_into(_HEADER_FMT, self._mm, 0, MAGIC, LAYOUT_VERSION, HEADER_SIZE,
+                         self.capacity, rows, columns, product_id_length,
+                         self._slot_struct.size, self._bitmap_offset, self._slots_offset)
+
+    def sync(self, positions: Iterable[Any]):
+        """Mirror a set of positions in a single seqlock write section"""
+        self._begin_write()
+        try:
+            for position in positions:
+                self._write_slot(position)
+        finally:
+            self._end_write()
+
+    def update_position(self, position: Any):
+        """Mirror a single position"""
+        self.sync((position,))
+
+    def close(self):
+        """Unmap and close the table (the file stays for late readers)"""
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm.close()
+            os.close(self._fd)
+            self._mm = None
+
+    def _begin_write(self):
+        self._seq += 1
+        struct.pack_into(_SEQ_FMT, self._mm, _SEQ_OFFSET, self._seq)
+
+    def _end_write(self):
+        struct.pack_into(_COUNTERS_FMT, self._mm, _COUNTERS_OFFSET, time.time(), len(self._occupied))
+        self._seq += 1
+        struct.pack_into(_SEQ_FMT, self._mm, _SEQ_OFFSET, self._seq)
+
+    def _write_slot(self, position: Any):
+        index = self._slot_index.get(position.id)
+        if index is None:
+            return
+
+        # Occupancy bitmap
+        byte_offset = self._bitmap_offset + index // 8
+        mask = 1 << (index % 8)
+        if position.occupied:
+            self._mm[byte_offset] |= mask
+            self._occupied.add(position.id)
+        else:
+            self._mm[byte_offset] &= ~mask & 0xFF
+            self._occupied.discard(position.id)
+
+        # Slot record
+        product = (position.product_id or "").encode("utf-8")[:self.product_id_length]
+        stored_at = position.stored_at.timestamp() if position.stored_at else 0.0
+        self._slot_struct.pack_into(self._mm, self._slots_offset + index * self._slot_struct.size,
+                                    position.id, position.row, position.column,
+                                    STATUS_CODES.get(position.status.value, STATUS_CODES["error"]),
+                                    stored_at, product)
+
+
+class SharedOccupancyReader:
+    """Read-only view of a shared occupancy table
+
+    The file is mapped once; each read is a plain memory copy validated by
+    the seqlock counter, so reads never hit the controller or the PLC.
+    """
+
+    def __init__(self, path: str, max_retries: int = 1000):
+        self.path = path
+        self.max_retries = max_retries
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, layout_version, header_size, self.capacity, self.rows, self.columns,
+         self.product_id_length, slot_size, self._bitmap_offset,
+         self._slots_offset) = struct.unpack_from(_HEADER_FMT, self._mm, 0)
+
+        if magic != MAGIC or layout_version != LAYOUT_VERSION:
+            self._mm.close()
+            raise ValueError(f"Not a supported AS/RS occupancy table: {path}")
+
+        self._slot_struct = struct.Struct(_SLOT_FMT.format(self.product_id_length))
+        if self._slot_struct.size != slot_size:
+            self._mm.close()
+            raise ValueError(f"Unexpected slot size {slot_size} in {path}")
+
+        self._data_end = self._slots_offset + self.capacity * slot_size
+
+        # Position ids never move once the writer has laid out the table
+        self._slot_index = {}
+        for index in range(self.capacity):
+            pos_id = struct.unpack_from("<I", self._mm, self._slots_offset + index * slot_size)[0]
+            self._slot_index[pos_id] = index
+
+    @property
+    def version(self) -> int:
+        """Current seqlock counter (increments by 2 per committed write)"""
+        return struct.unpack_from(_SEQ_FMT, self._mm, _SEQ_OFFSET)[0]
+
+    def _read_consistent(self, start: int, end: int) -> Optional[tuple]:
+        """Copy [start:end) plus the counters under the seqlock"""
+        for _ in range(self.max_retries):
+            seq_before = struct.unpack_from(_SEQ_FMT, self._mm, _SEQ_OFFSET)[0]
+            if seq_before & 1:
+                continue
+            counters = struct.unpack_from(_COUNTERS_FMT, self._mm, _COUNTERS_OFFSET)
+            data = self._mm[start:end]
+            if struct.unpack_from(_SEQ_FMT, self._mm, _SEQ_OFFSET)[0] == seq_before:
+                return seq_before, counters, data
+        return None
+
+    def is_occupied(self, position_id: int) -> Optional[bool]:
+        """Check a single position; None if the position is unknown"""
+        index = self._slot_index.get(position_id)
+        if index is None:
+            return None
+        byte_offset = self._bitmap_offset + index // 8
+        result = self._read_consistent(byte_offset, byte_offset + 1)
+        if result is None:
+            return None
+        return bool(result[2][0] & (1 << (index % 8)))
+
+    def occupancy_bitmap(self) -> Optional[bytes]:
+        """Consistent copy of the raw occupancy bitmap"""
+        result = self._read_consistent(self._bitmap_offset, self._slots_offset)
+        return result[2] if result else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Consistent snapshot of the whole table"""
+        result = self._read_consistent(self._bitmap_offset, self._data_end)
+        if result is None:
+            raise RuntimeError("Could not obtain a consistent snapshot (writer too busy)")
+
+        seq, (updated_at, occupied_count), data = result
+        slots_start = self._slots_offset - self._bitmap_offset
+
+        positions: List[Dict[str, Any]] = []
+        for index in range(self.capacity):
+            pos_id, row, column, status_code, stored_at, product = self._slot_struct.unpack_from(
+                data, slots_start + index * self._slot_struct.size)
+            occupied = bool(data[index // 8] & (1 << (index % 8)))
+            positions.append({
+                "id": pos_id,
+                "row": row,
+                "column": column,
+                "status": STATUS_NAMES.get(status_code, "error"),
+                "occupied": occupied,
+                "product_id": product.rstrip(b"\x00").decode("utf-8", "replace") or None,
+                "stored_at": stored_at or None,
+            })
+
+        return {
+            "version": seq,
+            "updated_at": updated_at,
+            "total_positions": self.capacity,
+            "occupied_positions": occupied_count,
+            "rows": self.rows,
+            "columns": self.columns,
+            "positions": positions,
+        }
+
+    def close(self):
+        self._mm.close()
+
+
+def open_reader(path: str) -> Optional[SharedOccupancyReader]:
+    """Open a reader if the table exists, otherwise return None"""
+    if not os.path.exists(path):
+        return None
+    return SharedOccupancyReader(path)
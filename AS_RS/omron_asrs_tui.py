@@ -0,0 +1,439 @@
+"""
+OMRON AS/RS Terminal UI
+Full-screen live rack view that redraws only what changed
+"""
+
+import logging
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from omron_asrs_events import DropPolicy, EventType
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATES = ("completed", "failed", "cancelled")
+_STATUS_MARK = {"pending": "..", "in_progress": ">>", "completed": "ok", "failed": "!!", "cancelled": "--"}
+
+
+@dataclass
+class Frame:
+    """What changed since the last frame, in screen-independent coordinates"""
+    cells: List[Tuple[int, int, str, str]] = field(default_factory=list)   # row, column, text, style
+    header: Optional[Tuple[str, str]] = None                               # text, style
+    task_lines: List[Tuple[int, str, str]] = field(default_factory=list)   # index, text, style
+    full: bool = False
+
+    def __bool__(self) -> bool:
+        return bool(self.cells or self.header or self.task_lines or self.full)
+
+
+class RackView:
+    """Screen model of the rack and its tasks
+
+    Keeps what is on screen and turns controller events into the
+    smallest set of changes: grid text comes from the position
+    manager's incremental grid cache, cell styles from task state
+    events, so a stored item costs one cell, not a redraw.
+    """
+
+    def __init__(self, controller, task_rows: int = 8, linger: float = 10.0):
+        self.controller = controller
+        self.manager = controller.position_manager
+        self.task_rows = task_rows
+        self.linger = linger
+
+        layout = controller.config['storage_rack']['layout']
+        self.rows, self.columns = layout['rows'], layout['columns']
+        widest = max((len(f"[{pos_id:02d}]") for pos_id in self.manager.positions), default=4)
+        self.cell_width = widest + 1
+        self.cell_of = self.manager.grid_cells
+        self._position_at = {cell: pos_id for pos_id, cell in self.cell_of.items()}
+
+        self._version = -1
+        self._texts: Dict[Tuple[int, int], str] = {}
+        self._drawn: Dict[Tuple[int, int], Tuple[str, str]] = {}
+        self._position_tasks: Dict[int, Dict[str, str]] = {}  # position -> {task_id: status}
+        self.tasks: "OrderedDict[str, dict]" = OrderedDict()
+        self._drawn_lines: List[Tuple[str, str]] = []
+        self._header: Optional[Tuple[str, str]] = None
+
+    def full(self) -> Frame:
+        """Everything, from the current state (start-up, resize, dropped events)"""
+        self._version = self.manager.grid_version
+        grid = self.manager.get_grid_display()
+        self._texts = {(r, c): text for r, row in enumerate(grid) for c, text in enumerate(row)}
+        self._drawn.clear()
+        self._drawn_lines = []
+        self._header = None
+        frame = self._frame(set(self._texts))
+        frame.full = True
+        return frame
+
+    def update(self, events=(), now: Optional[float] = None) -> Frame:
+        """Apply events and return only what differs from the screen"""
+        now = time.monotonic() if now is None else now
+        dirty = set()
+        for event in events:
+            if event.event_type == EventType.TASK_STATE:
+                dirty |= self._task_event(event.data, now)
+
+        version, changes = self.manager.get_grid_changes(self._version)
+        if changes is None:
+            return self.full()
+        self._version = version
+        for r, c, text in changes:
+            self._texts[(r, c)] = text
+            dirty.add((r, c))
+        return self._frame(dirty, now)
+
+    def _task_event(self, data: dict, now: float) -> set:
+        task_id, status = data["task_id"], data["status"]
+        info = self.tasks.get(task_id)
+        if info is None:
+            info = self.tasks[task_id] = {"type": data["task_type"], "position_id": data.get("position_id"),
+                                          "product_id": data.get("product_id"), "since": now}
+        if status == "in_progress" and info.get("status") != "in_progress":
+            info["since"] = now
+        info.update(status=status, result=data.get("result"),
+                    finished=now if status in FINAL_STATES else None)
+        self.tasks.move_to_end(task_id)
+
+        position_id = info["position_id"]
+        if position_id is None:
+            return set()
+        on_position = self._position_tasks.setdefault(position_id, {})
+        if status in FINAL_STATES:
+            on_position.pop(task_id, None)
+        else:
+            on_position[task_id] = status
+        cell = self.cell_of.get(position_id)
+        return {cell} if cell else set()
+
+    def cell_style(self, cell: Tuple[int, int], text: str) -> str:
+        position_id = self._position_at.get(cell)
+        statuses = self._position_tasks.get(position_id, {}).values() if position_id else ()
+        if "in_progress" in statuses:
+            return "active"
+        if statuses:
+            return "pending"
+        if text.startswith("["):
+            return "occupied"
+        if text.startswith("<"):
+            return "reserved"
+        return "empty"
+
+    def _frame(self, dirty, now: Optional[float] = None) -> Frame:
+        now = time.monotonic() if now is None else now
+        frame = Frame()
+        for cell in sorted(dirty):
+            text = self._texts.get(cell)
+            if text is None:
+                continue
+            drawn = (text, self.cell_style(cell, text))
+            if self._drawn.get(cell) != drawn:
+                self._drawn[cell] = drawn
+                frame.cells.append((cell[0], cell[1]) + drawn)
+
+        header = self.header_line()
+        if header != self._header:
+            self._header = frame.header = header
+
+        lines = self.task_lines(now)
+        for index, line in enumerate(lines):
+            if index >= len(self._drawn_lines) or self._drawn_lines[index] != line:
+                frame.task_lines.append((index,) + line)
+        self._drawn_lines = lines
+        return frame
+
+    def header_line(self) -> Tuple[str, str]:
+        controller = self.controller
+        stats = self.manager.get_occupancy_stats()
+        status = controller.status.value.upper()
+        text = (f"{controller.config['system']['name']}  |  {status}  |  "
+                f"occupied {stats['occupied_positions']}/{stats['total_positions']}  "
+                f"reserved {stats['reserved_positions']}  |  queued {controller.task_queue.qsize()}  "
+                f"running {len(controller.active_tasks)}")
+        return text, "alert" if status == "EMERGENCY_STOP" else "header"
+
+    def task_lines(self, now: float) -> List[Tuple[str, str]]:
+        """Newest tasks first; finished ones stay for linger seconds"""
+        for task_id in [task_id for task_id, info in self.tasks.items()
+                        if info["finished"] is not None and now - info["finished"] > self.linger]:
+            del self.tasks[task_id]
+
+        lines = []
+        for task_id, info in reversed(self.tasks.items()):
+            if len(lines) == self.task_rows:
+                break
+            status = info["status"]
+            if status in FINAL_STATES:
+                detail = info["result"] or status
+                style = "failed" if status == "failed" else "done"
+            else:
+                detail = f"{status.replace('_', ' ')} {now - info['since']:5.1f}s"
+                style = "active" if status == "in_progress" else "pending"
+            lines.append((f"{_STATUS_MARK.get(status, '  ')} {task_id:<30} {detail}", style))
+        while len(lines) < self.task_rows:
+            lines.append(("", "done"))
+        return lines
+
+
+class _MessageHandler(logging.Handler):
+    """Keeps log messages for the status line instead of writing over the screen"""
+
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.messages = deque(maxlen=50)
+
+    def emit(self, record):
+        self.messages.append((record.levelno, record.getMessage()))
+
+
+class RackTUI:
+    """curses front end for a RackView
+
+    Events are read with a short timeout and coalesced, so a burst of
+    changes costs one screen update per frame; curses then sends only
+    the changed characters to the terminal. The keyboard is polled, so
+    commands never stall the display. Grids larger than the window
+    scroll (arrow keys / PgUp / PgDn).
+    """
+
+    FRAME_INTERVAL = 0.05  # at most 20 screen updates per second
+    HELP = "[S]tore  [R]etrieve  [C]ancel  [U]pdate LEDs  arrows scroll  [Q]uit"
+
+    def __init__(self, controller, task_rows: int = 8, frame_interval: float = FRAME_INTERVAL):
+        self.controller = controller
+        self.view = RackView(controller, task_rows)
+        self.frame_interval = frame_interval
+        self.prompt: Optional[Tuple[str, str]] = None   # (command, typed text)
+        self.message = ""
+        self.scroll = [0, 0]
+        self._running = False
+        self._status_drawn = None
+
+    def run(self) -> bool:
+        """Take over the terminal until the user quits; False if curses is unavailable"""
+        try:
+            import curses
+        except ImportError:
+            logger.error("❌ curses is not available (on Windows: pip install windows-curses)")
+            return False
+
+        self.curses = curses
+        root = logging.getLogger()
+        handlers, root.handlers = root.handlers, []
+        self._log = _MessageHandler()
+        root.addHandler(self._log)
+        try:
+            curses.wrapper(self._main)
+        finally:
+            root.removeHandler(self._log)
+            root.handlers = handlers
+        return True
+
+    # Screen setup
+
+    def _main(self, stdscr):
+        curses = self.curses
+        self.stdscr = stdscr
+        curses.curs_set(0)
+        stdscr.nodelay(True)
+        stdscr.keypad(True)
+        self._init_styles()
+
+        subscription = self.controller.subscribe(maxsize=5000, policy=DropPolicy.DROP_OLDEST)
+        dropped = 0
+        self._layout()
+        self._apply(self.view.full())
+        self._running = True
+        try:
+            while self._running:
+                event = subscription.get(timeout=self.frame_interval)
+                events = ([event] if event else []) + subscription.drain()
+                if subscription.dropped != dropped:
+                    # Missed events: the screen model can't be trusted, start over
+                    dropped = subscription.dropped
+                    self._apply(self.view.full())
+                else:
+                    self._apply(self.view.update(events))
+                self._handle_keys()
+                self._show_log()
+                curses.doupdate()
+        finally:
+            subscription.close()
+
+    def _init_styles(self):
+        curses = self.curses
+        self.styles = {"empty": curses.A_NORMAL, "occupied": curses.A_BOLD, "reserved": curses.A_DIM,
+                       "active": curses.A_REVERSE, "pending": curses.A_UNDERLINE,
+                       "header": curses.A_BOLD, "alert": curses.A_REVERSE | curses.A_BOLD,
+                       "done": curses.A_NORMAL, "failed": curses.A_BOLD}
+        if not curses.has_colors():
+            return
+        curses.start_color()
+        curses.use_default_colors()
+        for pair, (style, foreground, background) in enumerate((
+                ("occupied", curses.COLOR_GREEN, -1),
+                ("reserved", curses.COLOR_YELLOW, -1),
+                ("active", curses.COLOR_BLACK, curses.COLOR_CYAN),
+                ("pending", curses.COLOR_CYAN, -1),
+                ("alert", curses.COLOR_WHITE, curses.COLOR_RED),
+                ("failed", curses.COLOR_RED, -1)), start=1):
+            curses.init_pair(pair, foreground, background)
+            self.styles[style] |= curses.color_pair(pair)
+
+    def _layout(self):
+        """Split the window: header, scrollable grid, task panel, message and prompt lines"""
+        curses = self.curses
+        height, width = self.stdscr.getmaxyx()
+        view = self.view
+        self.height, self.width = height, width
+        self.label_width = len(f"R{view.rows}") + 2
+        self.grid_top = 1
+        self.task_top = max(self.grid_top + 2, height - view.task_rows - 3)
+        self.grid_height = self.task_top - self.grid_top - 1
+
+        self.pad = curses.newpad(view.rows + 2, self.label_width + view.columns * view.cell_width + 1)
+        for column in range(view.columns):
+            self._put(self.pad, 0, self.label_width + column * view.cell_width, f"C{column + 1}", "header")
+        for row in range(view.rows):
+            self._put(self.pad, row + 1, 0, f"R{row + 1}", "header")
+
+        self.stdscr.erase()
+        self._status_drawn = None
+        self._put(self.stdscr, self.task_top, 0, "Tasks".ljust(width - 1, "-"), "header")
+        self.stdscr.noutrefresh()
+
+    def _put(self, window, y: int, x: int, text: str, style: str):
+        try:
+            window.addstr(y, x, text, self.styles.get(style, 0))
+        except self.curses.error:
+            pass  # off the edge (e.g. a very small window)
+
+    # Drawing
+
+    def _apply(self, frame: Frame):
+        if frame.full:
+            self._layout()
+        view = self.view
+        width = self.width
+        for row, column, text, style in frame.cells:
+            self._put(self.pad, row + 1, self.label_width + column * view.cell_width, text, style)
+        if frame.header:
+            text, style = frame.header
+            self._put(self.stdscr, 0, 0, text[:width - 1].ljust(width - 1), style)
+        for index, text, style in frame.task_lines:
+            self._put(self.stdscr, self.task_top + 1 + index, 0, text[:width - 1].ljust(width - 1), style)
+        if frame.header or frame.task_lines:
+            self.stdscr.noutrefresh()
+        if frame.cells or frame.full:
+            self._refresh_grid()
+
+    def _refresh_grid(self):
+        pad_height, pad_width = self.pad.getmaxyx()
+        self.scroll[0] = max(0, min(self.scroll[0], pad_height - self.grid_height))
+        self.scroll[1] = max(0, min(self.scroll[1], pad_width - self.width))
+        bottom = self.grid_top + max(0, self.grid_height - 1)
+        try:
+            self.pad.noutrefresh(self.scroll[0], self.scroll[1], self.grid_top, 0, bottom, self.width - 1)
+        except self.curses.error:
+            pass
+
+    def _show_log(self):
+        while self._log.messages:
+            level, text = self._log.messages.popleft()
+            if level >= logging.WARNING or not self.message:
+                self.message = text
+        self._draw_status_lines()
+
+    def _draw_status_lines(self):
+        width = self.width
+        if self.prompt:
+            bottom = f"{self.prompt[0]}: {self.prompt[1]}_"
+        else:
+            bottom = self.HELP
+        lines = ((self.height - 2, self.message), (self.height - 1, bottom))
+        if self._status_drawn == lines:
+            return
+        self._status_drawn = lines
+        for y, text in lines:
+            self._put(self.stdscr, y, 0, text[:width - 1].ljust(width - 1), "done")
+        self.stdscr.noutrefresh()
+
+    # Keyboard
+
+    def _handle_keys(self):
+        curses = self.curses
+        while True:
+            key = self.stdscr.getch()
+            if key == -1:
+                return
+            if key == curses.KEY_RESIZE:
+                self._apply(self.view.full())
+            elif self.prompt:
+                self._edit_prompt(key)
+            elif key in (ord('q'), ord('Q')):
+                self._running = False
+            elif key in (ord('s'), ord('S')):
+                self.prompt = ("Store product [position]", "")
+            elif key in (ord('r'), ord('R')):
+                self.prompt = ("Retrieve product or #position", "")
+            elif key in (ord('c'), ord('C')):
+                self.prompt = ("Cancel task ID", "")
+            elif key in (ord('u'), ord('U')):
+                self._submitted(self.controller.update_display(), "Display update")
+            elif key in (curses.KEY_UP, curses.KEY_DOWN, curses.KEY_LEFT, curses.KEY_RIGHT,
+                         curses.KEY_PPAGE, curses.KEY_NPAGE):
+                self._scroll(key)
+
+    def _scroll(self, key):
+        curses = self.curses
+        step = {curses.KEY_UP: (-1, 0), curses.KEY_DOWN: (1, 0),
+                curses.KEY_LEFT: (0, -self.view.cell_width), curses.KEY_RIGHT: (0, self.view.cell_width),
+                curses.KEY_PPAGE: (-self.grid_height, 0), curses.KEY_NPAGE: (self.grid_height, 0)}[key]
+        self.scroll[0] += step[0]
+        self.scroll[1] += step[1]
+        self._refresh_grid()
+
+    def _edit_prompt(self, key: int):
+        curses = self.curses
+        label, text = self.prompt
+        if key == 27:  # Esc
+            self.prompt = None
+        elif key in (curses.KEY_ENTER, 10, 13):
+            self.prompt = None
+            self._run_command(label, text.strip())
+        elif key in (curses.KEY_BACKSPACE, 127, 8):
+            self.prompt = (label, text[:-1])
+        elif 32 <= key < 127:
+            self.prompt = (label, text + chr(key))
+
+    def _run_command(self, label: str, text: str):
+        """Submit without waiting; progress shows up in the task panel"""
+        if not text:
+            return
+        controller = self.controller
+        try:
+            if label.startswith("Store"):
+                parts = text.split()
+                if len(parts) > 1 and parts[-1].isdigit():
+                    handle = controller.store_item_at_position(int(parts[-1]), " ".join(parts[:-1]))
+                else:
+                    handle = controller.store_item_auto_position(text)
+                self._submitted(handle, f"Store {text}")
+            elif label.startswith("Retrieve"):
+                if text.lstrip("#").isdigit():
+                    handle = controller.retrieve_item_from_position(int(text.lstrip("#")))
+                else:
+                    handle = controller.retrieve_item_by_product(text)
+                self._submitted(handle, f"Retrieve {text}")
+            elif label.startswith("Cancel"):
+                self.message = f"Cancelled {text}" if controller.cancel_task(text) else f"{text} is not pending"
+        except ValueError as e:
+            self.message = str(e)
+
+    def _submitted(self, handle, what: str):
+        self.message = f"{what}: queued as {handle.task_id}" if handle else f"{what}: rejected"
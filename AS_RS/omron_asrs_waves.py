@@ -0,0 +1,185 @@
+"""
+OMRON AS/RS Wave Picking
+Plans multi-line orders into one pick sequence with minimal travel over the rack grid
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from omron_asrs_core import PositionManager, RetrievalPolicy
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OrderLine:
+    """One order line: a product and how many units to pick"""
+    product_id: str
+    quantity: int = 1
+
+
+@dataclass
+class WavePlan:
+    """Pick sequence for an order
+
+    picks are (position_id, product_id) in travel order; shortages maps
+    products to the units that could not be found.
+    """
+    picks: List[Tuple[int, str]] = field(default_factory=list)
+    shortages: Dict[str, int] = field(default_factory=dict)
+    distance: int = 0              # grid steps along the planned route
+    unplanned_distance: int = 0    # grid steps in order-line order
+    planning_ms: float = 0.0
+
+    @property
+    def complete(self) -> bool:
+        return not self.shortages
+
+
+class _LazyRows:
+    """Distance rows computed on first use (a full matrix is n^2 for n positions)"""
+
+    def __init__(self, coords: List[Tuple[int, int]]):
+        self._coords = coords
+        self._rows: Dict[int, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._coords)
+
+    def __getitem__(self, node: int) -> List[int]:
+        row = self._rows.get(node)
+        if row is None:
+            r1, c1 = self._coords[node]
+            row = self._rows[node] = [abs(r1 - r2) + abs(c1 - c2) for r2, c2 in self._coords]
+        return row
+
+
+class DistanceMatrix:
+    """Manhattan distances between the origin (node 0) and grid cells (nodes 1..n)
+
+    Nothing is computed up front, so racks of thousands of positions
+    start instantly; routes are planned on the stops' sub-matrix.
+    """
+
+    def __init__(self, cells: Dict[int, Tuple[int, int]], origin: Tuple[int, int] = (1, 1)):
+        self.node_of = {key: index for index, key in enumerate(cells, start=1)}
+        self.coords = [origin] + list(cells.values())
+        self.rows = _LazyRows(self.coords)
+
+    @classmethod
+    def for_rack(cls, position_manager: PositionManager) -> "DistanceMatrix":
+        return cls({position.id: (position.row, position.column)
+                    for position in position_manager.positions.values()},
+                   position_manager.retrieval_origin)
+
+    def distance(self, a: int, b: int) -> int:
+        (r1, c1), (r2, c2) = self.coords[a], self.coords[b]
+        return abs(r1 - r2) + abs(c1 - c2)
+
+    def sub_matrix(self, nodes: Sequence[int]) -> List[List[int]]:
+        """Distances between the given nodes, indexed by their position in nodes"""
+        coords = [self.coords[node] for node in nodes]
+        return [[abs(r1 - r2) + abs(c1 - c2) for r2, c2 in coords] for r1, c1 in coords]
+
+    def route_length(self, route: Sequence[int]) -> int:
+        distance = self.distance
+        return sum(distance(a, b) for a, b in zip(route, route[1:]))
+
+
+def nearest_neighbour(rows: List[List[int]], stops: Sequence[int], start: int = 0) -> List[int]:
+    """Greedy route from start through every stop (ties go to the lower node)"""
+    remaining = set(stops)
+    route = [start]
+    current = start
+    while remaining:
+        distances = rows[current]
+        current = min(remaining, key=lambda node: (distances[node], node))
+        remaining.remove(current)
+        route.append(current)
+    return route
+
+
+def two_opt(rows: List[List[int]], route: List[int], closed: bool = True, max_passes: int = 50) -> List[int]:
+    """Reverse route segments while that shortens it; route[0] (and a closing end) stay fixed"""
+    route = list(route)
+    last = len(route) - 1 if closed else len(route)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, last - 1):
+            a, b = route[i - 1], route[i]
+            row_a, row_b = rows[a], rows[b]
+            for j in range(i + 1, last):
+                c = route[j]
+                d = route[j + 1] if j + 1 < len(route) else None
+                if d is None:
+                    delta = row_a[c] - row_a[b]
+                else:
+                    delta = row_a[c] + row_b[d] - row_a[b] - rows[c][d]
+                if delta < 0:
+                    route[i:j + 1] = route[i:j + 1][::-1]
+                    b = route[i]
+                    row_b = rows[b]
+                    improved = True
+        if not improved:
+            break
+    return route
+
+
+def plan_route(matrix: DistanceMatrix, stops: Sequence[int], return_to_origin: bool = True) -> List[int]:
+    """Order grid cells (matrix keys) for minimal travel from the origin"""
+    if len(stops) < 2:
+        return list(stops)
+    # Local node i + 1 is the i-th stop by matrix node, so ties break as on the full matrix
+    stops = sorted(stops, key=matrix.node_of.__getitem__)
+    rows = matrix.sub_matrix([0] + [matrix.node_of[stop] for stop in stops])
+    route = nearest_neighbour(rows, range(1, len(rows)))
+    if return_to_origin:
+        route.append(0)
+    route = two_opt(rows, route, closed=return_to_origin)
+    return [stops[node - 1] for node in route if node != 0]
+
+
+class WavePlanner:
+    """Resolves order lines to stored units and sequences the picks"""
+
+    def __init__(self, position_manager: PositionManager, return_to_origin: bool = True):
+        self.position_manager = position_manager
+        self.return_to_origin = return_to_origin
+        # Positions never move, so the distance matrix is built once
+        self.matrix = DistanceMatrix.for_rack(position_manager)
+
+    def plan(self, lines: Sequence[OrderLine], policy: Optional[RetrievalPolicy] = None) -> WavePlan:
+        """Pick the units for every line (by retrieval policy) and order them by travel"""
+        started = time.perf_counter()
+        manager = self.position_manager
+        policy = policy or manager.default_retrieval_policy
+        plan = WavePlan()
+        product_of: Dict[int, str] = {}  # insertion order = order-line order
+        taken = set()
+
+        with manager._lock:
+            for line in lines:
+                for _ in range(line.quantity):
+                    position_id = manager.product_index.pick(line.product_id, policy, manager.positions,
+                                                             manager.retrieval_origin, exclude=taken)
+                    if position_id is None:
+                        plan.shortages[line.product_id] = plan.shortages.get(line.product_id, 0) + 1
+                        continue
+                    product_of[position_id] = line.product_id
+                    taken.add(position_id)
+
+        unplanned = list(product_of)
+        route = plan_route(self.matrix, unplanned, self.return_to_origin)
+        plan.picks = [(position_id, product_of[position_id]) for position_id in route]
+        plan.distance = self._length(route)
+        plan.unplanned_distance = self._length(unplanned)
+        plan.planning_ms = (time.perf_counter() - started) * 1000
+        return plan
+
+    def _length(self, position_ids: Sequence[int]) -> int:
+        nodes = [0] + [self.matrix.node_of[position_id] for position_id in position_ids]
+        if self.return_to_origin and position_ids:
+            nodes.append(0)
+        return self.matrix.route_length(nodes)
@@ -31,25 +31,22 @@ def setup_configuration():
         },
         "storage_rack": {
             "total_positions": 35,
-            "layout": {"rows": 7, "columns": 5}
+            "layout": {"rows": 7, "columns": 5},
+            # Positions are generated from the template (see omron_asrs_layout)
+            "positions": {
+                "position_template": {
+                    "name": "Position {position}",
+                    "led_node": "ns=4;s=led{position}",
+                    "pushbutton_node": "ns=4;s=pb{position}"
+                },
+                "ranges": [{"rows": [1, 7], "columns": [1, 5]}],
+                "overrides": {}
+            }
         },
         "control_nodes": {
             "emergency_kill": "ns=4;s=kill"
-        },
-        "storage_positions": {}
-    }
-
-    # Generate positions
-    for i in range(1, 36):
-        config["storage_positions"][f"position_{i:02d}"] = {
-            "id": i,
-            "name": f"Position {i}",
-            "led_node": f"ns=4;s=led{i}",
-            "pushbutton_node": f"ns=4;s=pb{i}",
-            "row": ((i - 1) // 5) + 1,
-            "column": ((i - 1) % 5) + 1,
-            "occupied": False
         }
+    }
 
     # Save configuration
     with open("omron_asrs_config.json", 'w') as f:
@@ -54,5 +54,961 @@ def test_omron_system():
         print(f"❌ Test failed: {e}")
         return False
 
+def _make_position_manager(**overrides):
+    """Position manager on the mock PLC with config overrides applied"""
+    import json
+    from omron_asrs_core import OmronOPCClient, PositionManager
+
+    with open('omron_asrs_config.json', 'r') as f:
+        config = json.load(f)
+    config['shared_occupancy'] = {"enabled": False}
+    config.update(overrides)
+
+    opc_client = OmronOPCClient(config['communication'])
+    opc_client.connect()
+    return PositionManager(config, opc_client)
+
+
+def _make_controller(mock_latency=0.0, data_dir=None, **scheduling):
+    """Running controller on the mock PLC, persisting only into data_dir (e.g. tmp_path)"""
+    import copy
+    import json
+    from omron_asrs_controller import OmronASRSController
+
+    with open('omron_asrs_config.json', 'r') as f:
+        config = json.load(f)
+    config = copy.deepcopy(config)
+    config['shared_occupancy'] = {"enabled": False}
+    config['history'] = {"archive_enabled": data_dir is not None,
+                         "archive_path": str(data_dir / "history.db") if data_dir else None}
+    config['communication'].update(use_mock=True, mock_latency=mock_latency)
+    config['operations']['scheduling'].update(scheduling)
+
+    controller = OmronASRSController(config=config)
+    assert controller.initialize()
+    controller.start()
+    return controller
+
+
+def test_shared_occupancy_table(tmp_path):
+    """Shared occupancy table mirrors stores and retrievals"""
+    import json
+    import os
+    from omron_asrs_shared import SharedOccupancyReader
+
+    path = str(tmp_path / "occupancy.bin")
+    manager = _make_position_manager(shared_occupancy={"enabled": True, "path": path})
+    reader = SharedOccupancyReader(path)
+
+    assert reader.capacity == 35
+    assert reader.is_occupied(7) is False
+
+    version = reader.version
+    assert manager.store_item(7, "WIDGET-7")
+    assert reader.version > version
+    assert reader.is_occupied(7) is True
+
+    snapshot = reader.snapshot()
+    slot = next(p for p in snapshot["positions"] if p["id"] == 7)
+    assert snapshot["occupied_positions"] == 1
+    assert slot["product_id"] == "WIDGET-7"
+    assert slot["status"] == "occupied"
+    assert (slot["row"], slot["column"]) == (2, 2)
+
+    assert manager.retrieve_item(7) == "WIDGET-7"
+    assert reader.is_occupied(7) is False
+    assert reader.snapshot()["occupied_positions"] == 0
+
+    # A restarted controller reuses the mapped file in place: no truncation,
+    # and the version keeps counting up for readers that are still attached
+    manager.close()
+    version, size = reader.version, os.path.getsize(path)
+    restarted = _make_position_manager(shared_occupancy={"enabled": True, "path": path})
+    assert os.path.getsize(path) == size
+    assert reader.version > version
+    assert restarted.store_item(3, "WIDGET-3")
+    assert reader.is_occupied(3) is True
+    assert reader.snapshot()["occupied_positions"] == 1
+
+    # Off by default, and never without an explicit path
+    with open('omron_asrs_config.json', 'r') as f:
+        defaults = json.load(f)['shared_occupancy']
+    assert _make_position_manager(shared_occupancy=defaults).shared_table is None
+    assert _make_position_manager(shared_occupancy={"enabled": True}).shared_table is None
+
+    reader.close()
+    restarted.close()
+
+
+def test_incremental_grid_and_stats():
+    """Grid cache and occupancy counters follow state changes"""
+    manager = _make_position_manager()
+
+    version = manager.grid_version
+    assert manager.get_occupancy_stats()["occupied_positions"] == 0
+    assert manager.store_item(12, "BOLT-M6")
+
+    stats = manager.get_occupancy_stats()
+    assert stats["occupied_positions"] == 1
+    assert stats["empty_positions"] == 34
+    assert manager.get_grid_display()[2][1] == "[12]"
+
+    new_version, changes = manager.get_grid_changes(version)
+    assert new_version == version + 1
+    assert changes == [(2, 1, "[12]")]
+    assert manager.get_grid_changes(new_version) == (new_version, [])
+
+    assert manager.retrieve_item(12) == "BOLT-M6"
+    assert manager.get_grid_display()[2][1] == " 12 "
+    assert manager.get_occupancy_stats()["occupied_positions"] == 0
+
+
+def test_retrieval_policies():
+    """FIFO/LIFO/FEFO/NEAREST pick the expected unit of a product"""
+    from datetime import datetime, timedelta
+    from omron_asrs_core import ProductIndex, RetrievalPolicy
+
+    manager = _make_position_manager()
+    positions = manager.positions
+    index = ProductIndex()
+    base = datetime(2025, 1, 1)
+
+    # P30 is oldest, P02 newest, P18 expires first
+    for pos_id, age_days, expiry_days in [(30, 3, 90), (18, 2, 10), (2, 1, None)]:
+        position = positions[pos_id]
+        position.occupied = True
+        position.product_id = "MILK"
+        position.stored_at = base - timedelta(days=age_days)
+        position.expires_at = base + timedelta(days=expiry_days) if expiry_days else None
+        index.update(position)
+
+    assert index.quantity("MILK") == 3
+    assert index.pick("MILK", RetrievalPolicy.FIFO, positions) == 30
+    assert index.pick("MILK", RetrievalPolicy.LIFO, positions) == 2
+    assert index.pick("MILK", RetrievalPolicy.FEFO, positions) == 18
+    assert index.pick("MILK", RetrievalPolicy.NEAREST, positions, origin=(7, 5)) == 30
+
+    # Removing the FIFO head promotes the next oldest unit
+    positions[30].occupied = False
+    positions[30].product_id = None
+    index.update(positions[30])
+    assert index.pick("MILK", RetrievalPolicy.FIFO, positions) == 18
+    assert index.pick("UNKNOWN", RetrievalPolicy.FIFO, positions) is None
+
+    # PositionManager keeps its own index in sync with stores/retrievals
+    assert manager.store_item(5, "BOLT", base + timedelta(days=1))
+    assert manager.find_product("BOLT").id == 5
+    assert manager.retrieve_item(5) == "BOLT"
+    assert manager.find_product("BOLT") is None
+
+
+def test_position_reservations():
+    """Reserved positions are skipped, committed or expired by the timer wheel"""
+    import time
+    from omron_asrs_core import PositionStatus, TimerWheel
+
+    manager = _make_position_manager()
+
+    first = manager.reserve_position(product_id="A", ttl=5)
+    second = manager.reserve_position(product_id="B", ttl=0.2)
+    assert (first.position_id, second.position_id) == (1, 2)
+    assert manager.find_empty_position().id == 3
+    assert manager.get_occupancy_stats()["reserved_positions"] == 2
+
+    # Nobody else can store into a reserved slot
+    assert not manager.store_item(1, "INTRUDER")
+    assert manager.reserve_position(1) is None
+
+    assert manager.commit_reservation(first.reservation_id)
+    assert manager.positions[1].product_id == "A"
+    assert first.reservation_id not in manager.reservations
+
+    # The short reservation lapses once the wheel passes its deadline
+    assert manager.expire_reservations(time.monotonic()) == []
+    assert manager.expire_reservations(time.monotonic() + 1) == [second.reservation_id]
+    assert manager.positions[2].status == PositionStatus.EMPTY
+    assert manager.get_occupancy_stats()["reserved_positions"] == 0
+
+    third = manager.reserve_position(5)
+    assert manager.release_reservation(third.reservation_id)
+    assert manager.find_empty_position().id == 2
+
+    # A deadline in the middle of a tick expires within one tick, not one revolution later
+    wheel = TimerWheel(0.1, 512, now=0)
+    wheel.schedule("a", 10.05)
+    assert wheel.advance(10.01) == []
+    now = 10.01
+    while not wheel.advance(now):
+        now = round(now + 0.01, 2)
+    assert 10.05 <= now <= 10.05 + 0.1 and len(wheel) == 0
+
+    # The reservation lapses while the LED write is in flight and the write fails:
+    # nothing may ever be published as occupied
+    fourth = manager.reserve_position(product_id="C", ttl=0.1)
+    grid_version = manager.grid_version
+    write_value = manager.opc_client.write_value
+
+    def failing_write(node, value):
+        assert manager.expire_reservations(time.monotonic() + 5) == [fourth.reservation_id]
+        assert manager.get_occupancy_stats()["occupied_positions"] == 1
+        return False
+
+    manager.opc_client.write_value = failing_write
+    assert not manager.commit_reservation(fourth.reservation_id)
+    manager.opc_client.write_value = write_value
+
+    position = manager.positions[fourth.position_id]
+    assert not position.occupied and position.status == PositionStatus.EMPTY
+    stats = manager.get_occupancy_stats()
+    assert (stats["occupied_positions"], stats["reserved_positions"]) == (1, 0)
+    assert manager.find_product("C") is None
+    _, changes = manager.get_grid_changes(grid_version)
+    assert changes[-1][2] == manager._format_cell(position)
+
+
+def test_priority_scheduler():
+    """Urgent lane first, then priority with aging; cancel by ID"""
+    import queue
+    import threading
+    from omron_asrs_core import ASRSTask, TaskPriority, TaskScheduler, TaskType
+
+    def task(task_id, priority=TaskPriority.NORMAL):
+        return ASRSTask(task_id=task_id, task_type=TaskType.UPDATE_DISPLAY, priority=priority)
+
+    scheduler = TaskScheduler(aging_interval=10.0)
+    # An old normal task has aged past a fresh high-priority one
+    assert scheduler.put(task("old-normal"), enqueued_at=0.0)
+    assert scheduler.put(task("high", TaskPriority.HIGH), enqueued_at=15.0)
+    assert scheduler.put(task("low", TaskPriority.LOW), enqueued_at=1.0)
+    assert scheduler.put(task("urgent", TaskPriority.URGENT), enqueued_at=20.0)
+    assert scheduler.put(task("cancel-me"), enqueued_at=2.0)
+    assert not scheduler.put(task("high"))  # duplicate pending ID
+
+    assert scheduler.cancel("cancel-me").task_id == "cancel-me"
+    assert scheduler.cancel("cancel-me") is None
+    assert scheduler.qsize() == 4
+
+    order = [scheduler.get_nowait().task_id for _ in range(4)]
+    assert order == ["urgent", "old-normal", "high", "low"]
+    assert scheduler.empty()
+    try:
+        scheduler.get(timeout=0.01)
+        assert False, "expected queue.Empty"
+    except queue.Empty:
+        pass
+
+    stats = scheduler.stats()
+    assert stats["urgent"]["dequeued"] == 1
+    assert stats["normal"]["depth"] == 0
+
+    # urgent_pending() is safe against a dispatcher pushing and popping concurrently
+    def churn():
+        for index in range(3000):
+            scheduler.put(task(f"U-{index}", TaskPriority.URGENT))
+            scheduler.get_nowait()
+
+    worker = threading.Thread(target=churn)
+    worker.start()
+    while worker.is_alive():
+        scheduler.urgent_pending()
+    worker.join()
+    assert not scheduler.urgent_pending()
+
+
+def test_batch_store_and_retrieve():
+    """Batches allocate positions, report per item and write LEDs once"""
+    manager = _make_position_manager()
+    client = manager.opc_client.client
+    bulk_writes = []
+    original = client.set_values
+    client.set_values = lambda nodes, values: (bulk_writes.append(len(nodes)), original(nodes, values))
+
+    reservation = manager.reserve_position(4, "HELD")
+    results = manager.store_items([("A", 2), ("B", None), ("A", None), ("C", 2), ("D", 4)])
+    assert [r["success"] for r in results] == [True, True, True, False, False]
+    assert [r["position_id"] for r in results] == [2, 1, 3, 2, 4]
+    assert "twice" in results[3]["error"] and "reserved" in results[4]["error"]
+    assert bulk_writes == [3]
+    assert client.mock_values["ns=4;s=led3"] is True
+    assert manager.get_product_quantity("A") == 2
+    manager.release_reservation(reservation.reservation_id)
+
+    results = manager.retrieve_items([("A", None), ("A", None), ("A", None), (None, 1), ("X", 2)])
+    assert [r["success"] for r in results] == [True, True, False, True, False]
+    assert sorted(r["position_id"] for r in results[:2]) == [2, 3]
+    assert results[3]["product_id"] == "B"
+    assert bulk_writes == [3, 3]
+    assert manager.get_occupancy_stats()["occupied_positions"] == 0
+    assert client.mock_values["ns=4;s=led1"] is False
+
+
+def test_button_debounce_and_edges():
+    """Held or bouncing buttons yield one press event per press"""
+    from omron_asrs_core import ButtonDebouncer
+
+    debouncer = ButtonDebouncer(debounce=0.05, hold_time=0.2)
+    samples = [(0.0, False), (1.0, True), (1.02, False), (1.04, True),  # bounce
+               (1.1, True), (1.2, True), (1.3, True), (3.0, True),      # held
+               (3.1, False), (3.2, False), (4.0, True), (4.1, True)]    # released, short press
+    events = [(t, debouncer.update(1, level, now=t)) for t, level in samples]
+    fired = [(t, e) for t, e in events if e]
+    assert len(fired) == 1
+    assert fired[0][0] == 1.3 and fired[0][1].timestamp == 1.04
+    assert abs(fired[0][1].held_for - 0.26) < 1e-9
+    assert debouncer.update(1, True, now=4.3) is not None
+
+    # A button already down at startup is not a press
+    assert ButtonDebouncer().update(2, True, now=0.0) is None
+
+
+def test_held_button_emits_one_event():
+    """Polling a held button reports a single press"""
+    manager = _make_position_manager(operations={"pushbuttons": {"debounce_seconds": 0.0}})
+    assert manager.store_item(5, "HELD-ITEM")
+    client = manager.opc_client.client
+
+    assert manager.poll_button_events(now=0.0) == []
+    client.mock_values["ns=4;s=pb5"] = True
+    events = [e for t in (0.1, 0.2, 0.3, 0.4) for e in manager.poll_button_events(now=t)]
+    assert [e.position_id for e in events] == [5]
+
+
+def test_task_history_ring_and_archive(tmp_path):
+    """Ring stays bounded while the archive keeps everything queryable"""
+    from datetime import datetime, timedelta
+    from omron_asrs_core import ASRSTask, StoragePosition, TaskType
+    from omron_asrs_history import TaskHistory
+
+    history = TaskHistory(ring_size=5, archive_path=str(tmp_path / "history.db"))
+    positions = [StoragePosition(i, f"P{i}", 1, i, f"led{i}", f"pb{i}") for i in (1, 2)]
+    base = datetime(2025, 1, 1, 8, 0, 0)
+    for i in range(50):
+        task = ASRSTask(f"T-{i}", TaskType.STORE_ITEM, positions[i % 2], f"SKU-{i % 3}")
+        task.status = "completed" if i % 10 else "failed"
+        task.completed_at = base + timedelta(minutes=i)
+        history.add(task)
+
+    assert len(history.recent()) == 5 and history.recent()[-1].task_id == "T-49"
+    assert history.total == 50 and history.status_counts == {"failed": 5, "completed": 45}
+
+    sku = history.by_product("SKU-1", limit=3)
+    assert [r.task_id for r in sku] == ["T-49", "T-46", "T-43"]
+    assert sku[0].task_type == TaskType.STORE_ITEM and sku[0].position_id == 2
+    assert len(history.by_position(1, limit=100)) == 25
+    window = history.between(base + timedelta(minutes=10), base + timedelta(minutes=13))
+    assert [r.task_id for r in window] == ["T-12", "T-11", "T-10"]
+    assert window[-1].status == "failed"
+    history.close()
+
+    # The archive outlives the process
+    reopened = TaskHistory(ring_size=5, archive_path=str(tmp_path / "history.db"))
+    assert len(reopened.by_product("SKU-0", limit=100)) == 17
+    reopened.close()
+
+
+def test_parallel_task_execution():
+    """Tasks on different positions overlap; same-position tasks serialize"""
+    from omron_asrs_core import ASRSTask, TaskType
+
+    controller = _make_controller(mock_latency=0.02, max_parallel_tasks=4)
+    try:
+        peak = []
+        original = controller._execute_task
+
+        def tracking_execute(task):
+            peak.append(len(controller.active_tasks))
+            original(task)
+
+        controller._execute_task = tracking_execute
+
+        for position_id in range(1, 5):
+            assert controller.store_item_at_position(position_id, f"P-{position_id}")
+        # Queued behind the store on the same position
+        position = controller.position_manager.positions[1]
+        assert controller.submit_task(ASRSTask("RETRIEVE-1", TaskType.RETRIEVE_ITEM, position))
+        assert controller.wait_until_idle(timeout=5)
+
+        assert max(peak) > 1
+        results = {t.task_id: t for t in controller.completed_tasks}
+        assert len(results) == 5
+        assert all(t.status == "completed" for t in results.values())
+        assert not controller.position_manager.positions[1].occupied
+        assert controller.position_manager.positions[2].product_id == "P-2"
+        assert controller.active_task is None
+    finally:
+        controller.stop()
+
+
+def test_task_handles():
+    """Submitted tasks return handles that resolve the moment they finish"""
+    from omron_asrs_core import ASRSTask, TaskType
+
+    controller = _make_controller(mock_latency=0.01)
+    try:
+        finished = []
+        handle = controller.store_item_at_position(3, "HANDLE-1")
+        handle.add_done_callback(lambda h: finished.append((h.task_id, h.status)))
+        assert handle.wait(timeout=5)
+        assert handle.succeeded and "HANDLE-1" in handle.result
+        assert finished == [(handle.task_id, "completed")]
+
+        # Callbacks added after completion run immediately
+        handle.add_done_callback(lambda h: finished.append("late"))
+        assert finished[-1] == "late"
+
+        # Failed and cancelled tasks resolve too
+        controller.position_manager.retrieve_item(3)
+        failed = controller.submit_task(ASRSTask("RETRIEVE-EMPTY", TaskType.RETRIEVE_ITEM,
+                                                 controller.position_manager.positions[3]))
+        assert failed.wait(timeout=5) and not failed.succeeded and failed.status == "failed"
+
+        # Back-to-back display updates get distinct IDs instead of being rejected as pending
+        displays = [controller.update_display(), controller.update_display()]
+        assert all(displays) and displays[0].task_id != displays[1].task_id
+        assert all(display.wait(timeout=5) and display.succeeded for display in displays)
+    finally:
+        controller.stop()
+
+    # With the dispatcher stopped the task stays pending until cancelled
+    pending = controller.submit_task(ASRSTask("CANCEL-ME", TaskType.UPDATE_DISPLAY))
+    assert not pending.wait(timeout=0.05)
+    assert controller.cancel_task("CANCEL-ME")
+    assert pending.done() and pending.status == "cancelled" and pending.result == "Cancelled by operator"
+
+
+def test_event_bus_policies():
+    """Subscribers get only their event types; full queues drop by policy"""
+    from datetime import datetime
+    from omron_asrs_core import clock
+    from omron_asrs_events import DropPolicy, EventBus, EventType
+    from omron_asrs_sim import VirtualClock
+
+    bus = EventBus()
+    assert bus.publish(EventType.CONNECTION, connected=True) is None  # nobody listening
+
+    latest = bus.subscribe(maxsize=2)
+    earliest = bus.subscribe([EventType.TASK_STATE], maxsize=2, policy=DropPolicy.DROP_NEWEST)
+    for i in range(4):
+        bus.publish(EventType.TASK_STATE, task_id=f"T-{i}")
+    bus.publish(EventType.EMERGENCY_STOP, active=True)
+
+    assert [e.data.get("task_id") for e in latest.drain()] == ["T-3", None]
+    assert latest.dropped == 3
+    assert [e.data["task_id"] for e in earliest.drain()] == ["T-0", "T-1"]
+    assert earliest.dropped == 2
+    assert latest.get(timeout=0.01) is None
+
+    earliest.close()
+    assert bus.subscriber_count == 1
+
+    # Timestamps come from the installable clock, so simulated events carry simulated time
+    previous = clock.install(VirtualClock(datetime(2030, 1, 1)))
+    try:
+        assert bus.publish(EventType.CONNECTION, connected=True).timestamp == datetime(2030, 1, 1)
+    finally:
+        clock.install(previous)
+
+
+def test_controller_publishes_events():
+    """Stores, retrievals and task transitions arrive as incremental events"""
+    from omron_asrs_events import EventType
+
+    controller = _make_controller()
+    try:
+        events = controller.subscribe()
+        assert controller.store_item_at_position(8, "EVENT-1").wait(timeout=5)
+        assert controller.retrieve_item_from_position(8).wait(timeout=5)
+
+        received = events.drain()
+        positions = [(e.event_type, e.data["product_id"]) for e in received
+                     if e.event_type != EventType.TASK_STATE]
+        assert positions == [(EventType.POSITION_RESERVED, None),
+                             (EventType.POSITION_STORED, "EVENT-1"),
+                             (EventType.POSITION_RETRIEVED, "EVENT-1")]
+        states = [e.data["status"] for e in received if e.event_type == EventType.TASK_STATE]
+        assert states == ["pending", "in_progress", "completed"] * 2
+        assert [e.sequence for e in received] == sorted(e.sequence for e in received)
+    finally:
+        controller.stop()
+
+
+def test_task_latency_breakdown(tmp_path):
+    """Latency phases are tracked per task type and exported as CSV"""
+    import csv
+    from omron_asrs_latency import percentile
+
+    assert percentile([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 90) == 9
+    assert percentile([], 50) == 0.0
+
+    controller = _make_controller(mock_latency=0.01, data_dir=tmp_path)
+    try:
+        for position_id in (1, 2, 3):
+            controller.store_item_at_position(position_id, f"LAT-{position_id}").wait(timeout=5)
+        controller.update_display().wait(timeout=5)
+
+        latency = controller.get_system_status()["tasks"]["latency"]
+        store = latency["store_item"]
+        assert store["execution"]["count"] == 3
+        assert store["plc_io"]["p50_ms"] >= 10  # one LED write at 10 ms
+        assert store["plc_io"]["max_ms"] <= store["execution"]["max_ms"]
+        assert store["end_to_end"]["p99_ms"] >= store["queue_wait"]["p99_ms"]
+        assert "update_display" in latency
+
+        path = tmp_path / "latency.csv"
+        assert controller.export_latency_csv(str(path)) == 4
+        with open(path) as f:
+            rows = list(csv.DictReader(f))
+        assert rows[0]["task_type"] == "store_item" and float(rows[0]["plc_io_ms"]) >= 10
+
+        # The history archive lives in the data directory the test handed over
+        controller.history.flush()
+        assert controller.history.archive_path == str(tmp_path / "history.db")
+        assert [record.position_id for record in controller.get_task_history(product_id="LAT-2")] == [2]
+    finally:
+        controller.stop()
+
+
+def test_metrics_endpoint():
+    """Metrics are served over HTTP from memory, without PLC reads"""
+    from urllib.request import urlopen
+
+    controller = _make_controller()
+    try:
+        controller.store_item_at_position(1, "MET-1").wait(timeout=5)
+        port = controller.start_metrics_exporter(port=0)
+
+        controller._running = False  # park the button poller so only the scrape could read
+        controller._monitoring_thread.join(timeout=3)
+        reads_before = controller.opc_client.io_histogram.collect()[0].render()
+
+        with urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            body = response.read().decode()
+        assert controller.opc_client.io_histogram.collect()[0].render() == reads_before
+
+        assert 'asrs_tasks_total{task_type="store_item",status="completed"} 1' in body
+        assert 'asrs_positions{state="occupied"} 1' in body
+        assert 'asrs_plc_io_seconds_bucket{operation="write",le="+Inf"}' in body
+        assert "asrs_plc_connects_total 1" in body
+        assert "# TYPE asrs_task_queue_depth gauge" in body
+    finally:
+        controller.stop()
+    assert controller.metrics_exporter is None
+
+
+def test_http_api():
+    """HTTP API queues tasks, reports them and keeps connections alive"""
+    import http.client
+    import json
+    from omron_asrs_api import ASRSApiServer
+
+    controller = _make_controller(mock_latency=0.01)
+    api = ASRSApiServer(controller, port=0)
+    port = api.start()
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+
+    def call(method, path, body=None):
+        connection.request(method, path, body=json.dumps(body) if body is not None else None)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    try:
+        status, task = call("POST", "/store", {"product_id": "API-1", "position_id": 4})
+        assert status == 202 and task["status"] == "pending" and task["position_id"] == 4
+        sock = connection.sock
+
+        status, task = call("GET", f"/tasks/{task['task_id']}?wait=5")
+        assert status == 200 and task["status"] == "completed"
+        assert call("GET", "/positions/4")[1]["product_id"] == "API-1"
+        assert connection.sock is sock  # same keep-alive connection
+
+        status, task = call("POST", "/retrieve?wait=5", {"product_id": "API-1", "policy": "fifo"})
+        assert status == 200 and task["status"] == "completed"
+
+        status, body = call("POST", "/batch/store", {"items": [{"product_id": "API-2"}, {"product_id": "API-3"}]})
+        assert status == 200 and all(result["success"] for result in body["results"])
+
+        assert call("POST", "/store", {"position_id": 4})[0] == 400
+        assert call("POST", "/retrieve", {"position_id": 4})[0] == 409  # empty again
+        assert call("GET", "/tasks/NOPE")[0] == 404
+        assert call("GET", "/positions/99")[0] == 404
+        assert call("POST", "/store", {"product_id": "API-4", "position_id": 99})[0] == 404
+        assert call("POST", "/retrieve", {"position_id": 99})[0] == 404
+        assert call("GET", "/status")[1]["storage"]["occupied_positions"] == 2
+
+        malformed = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        malformed.putrequest("POST", "/store")
+        malformed.putheader("Content-Length", "lots")
+        malformed.endheaders()
+        response = malformed.getresponse()
+        assert response.status == 400 and "Content-Length" in json.loads(response.read())["error"]
+        malformed.close()
+    finally:
+        connection.close()
+        api.stop()
+        controller.stop()
+
+
+def test_event_stream():
+    """/events sends a snapshot, then deltas, and ends when the API stops"""
+    import json
+    import socket
+    from omron_asrs_api import ASRSApiServer
+
+    controller = _make_controller()
+    api = ASRSApiServer(controller, port=0)
+    port = api.start()
+    stream = socket.create_connection(("127.0.0.1", port), timeout=5)
+    reader = stream.makefile("rb")
+
+    def next_message():
+        message = {}
+        for line in iter(reader.readline, b""):
+            line = line.decode().rstrip("\n")
+            if not line:
+                if message:
+                    return message
+                continue
+            key, _, value = line.partition(": ")
+            message[key] = value
+        return message
+
+    try:
+        stream.sendall(b"GET /events?types=position_stored,task_state HTTP/1.1\r\nHost: x\r\n\r\n")
+        while reader.readline() not in (b"\r\n", b""):  # status line and headers
+            pass
+        snapshot = next_message()
+        assert snapshot["event"] == "snapshot"
+        assert len(json.loads(snapshot["data"])["positions"]) == 35
+        assert api.stream_count == 1
+
+        controller.store_item_at_position(6, "SSE-1").wait(timeout=5)
+        events = [next_message() for _ in range(4)]  # pending, in_progress, stored, completed
+        stored = [e for e in events if e["event"] == "position_stored"]
+        assert len(stored) == 1 and json.loads(stored[0]["data"])["product_id"] == "SSE-1"
+        assert all(int(e["id"]) > 0 for e in events)
+    finally:
+        api.stop()
+        assert reader.read() == b""  # server closed the stream
+        stream.close()
+        controller.stop()
+    assert api.stream_count == 0
+
+
+def test_emergency_stop_reaction_slo():
+    """Kill switch -> all outputs confirmed off within the SLO, with tasks in flight"""
+    import time
+    from datetime import datetime
+    from omron_asrs_core import ASRSStatus, clock
+    from omron_asrs_sim import VirtualClock
+
+    slo_ms = 100
+    for trial in range(3):
+        controller = _make_controller(mock_latency=0.005)
+        try:
+            watcher = controller.safety_watcher
+            assert watcher is not None and watcher.session is not controller.opc_client
+            for position_id in range(1, 11):
+                controller.store_item_at_position(position_id, f"ESTOP-{trial}-{position_id}")
+
+            plc = controller.opc_client.client.mock_values  # the simulated PLC
+            kill_at = time.perf_counter()
+            plc['ns=4;s=kill'] = True
+            assert watcher.tripped.wait(timeout=2)
+            assert controller.wait_until_idle(timeout=5)
+
+            report = watcher.last_report
+            assert report.outputs_written and report.outputs_confirmed and report.outputs == 35
+            end_to_end_ms = (report.confirmed_at - kill_at) * 1000
+            assert end_to_end_ms < slo_ms, f"reaction {end_to_end_ms:.1f} ms"
+            assert report.reaction_ms <= end_to_end_ms
+
+            assert controller.status == ASRSStatus.EMERGENCY_STOP
+            assert not any(plc[f'ns=4;s=led{i}'] for i in range(1, 36))
+            assert controller.get_system_status()["safety"]["last_emergency_stop"]["outputs_confirmed"]
+            assert controller.history.status_counts.get("cancelled", 0) + \
+                controller.history.status_counts.get("failed", 0) + \
+                controller.history.status_counts.get("completed", 0) == 10
+        finally:
+            controller.stop()
+
+    # Reports are stamped on the controller's clock (virtual under the simulator);
+    # the reaction times stay real perf_counter deltas
+    controller = _make_controller()
+    previous = clock.install(VirtualClock(datetime(2030, 1, 1)))
+    try:
+        report = controller.safety_watcher.trip()
+    finally:
+        clock.install(previous)
+        controller.stop()
+    assert report.timestamp == datetime(2030, 1, 1) and 0 <= report.reaction_ms < 1000
+
+
+def test_wave_picking():
+    """Wave plans resolve units, shorten travel and run as one batch"""
+    import random
+    from omron_asrs_waves import DistanceMatrix, OrderLine, nearest_neighbour, plan_route
+
+    controller = _make_controller()
+    try:
+        # Scatter three products over the rack
+        stock = {1: "A", 35: "A", 18: "B", 5: "B", 31: "C", 12: "C", 27: "A", 8: "B"}
+        controller.store_items_batch([(product, position) for position, product in stock.items()])
+
+        lines = [OrderLine("A", 3), OrderLine("C", 2), OrderLine("B", 2), OrderLine("D", 1)]
+        plan = controller.plan_wave(lines)
+        assert sorted(p for p, _ in plan.picks) == sorted([1, 35, 27, 31, 12, 18, 5])
+        assert all(stock[position] == product for position, product in plan.picks)
+        assert plan.shortages == {"D": 1}
+        assert plan.distance <= plan.unplanned_distance
+
+        results = controller.execute_wave(plan)
+        assert [r["position_id"] for r in results] == [p for p, _ in plan.picks]
+        assert all(r["success"] for r in results)
+        assert controller.position_manager.get_occupancy_stats()["occupied_positions"] == 1  # one B left
+    finally:
+        controller.stop()
+
+    # 2-opt never makes the greedy route longer
+    rng = random.Random(7)
+    cells = {key: (key // 20 + 1, key % 20 + 1) for key in range(400)}
+    matrix = DistanceMatrix(cells)
+    for _ in range(10):
+        order = rng.sample(range(400), 60)
+        greedy = nearest_neighbour(matrix.rows, [matrix.node_of[key] for key in order]) + [0]
+        route = [0] + [matrix.node_of[key] for key in plan_route(matrix, order)] + [0]
+        assert sorted(plan_route(matrix, order)) == sorted(order)
+        assert matrix.route_length(route) <= matrix.route_length(greedy)
+
+
+def test_simulation_virtual_clock():
+    """A simulated day runs the controller on virtual time and restores the wall clock"""
+    import json
+    import time
+    from datetime import timedelta
+    from omron_asrs_core import clock
+    from omron_asrs_sim import RecordedProfile, Simulation, SyntheticProfile
+
+    with open('omron_asrs_config.json', 'r') as f:
+        config = json.load(f)
+
+    profile = SyntheticProfile(days=1, store_per_hour=40, retrieve_per_hour=40, display_per_hour=1, seed=3)
+    started = time.perf_counter()
+    report = Simulation.from_config(config, profile).run()
+    assert time.perf_counter() - started < 10
+    assert not clock.virtual
+    assert report.simulated_seconds >= 86400
+    assert report.speedup > 1000
+
+    # Every arrival is either rejected or ends as a task
+    assert sum(report.demand.values()) == sum(report.rejected.values()) + report.tasks
+    assert report.outcomes["store_item"]["completed"] > 500
+    # Service time = round trip + move there and back (6 s + 2 s per step)
+    assert 6.0 < report.service_time["p50"] < 6.0 + 2 * 10 + 0.1
+    assert 0 < report.utilization < 1
+    assert report.samples[0].at == profile.start
+    assert report.samples[-1].at >= profile.start + timedelta(days=1)
+    assert max(s.occupied for s in report.samples) == report.occupancy_max <= 35
+
+    # Task timestamps are virtual; the history replays as a recorded profile
+    sim = Simulation.from_config(config, SyntheticProfile(days=0.25, seed=4))
+    sim.run()
+    records = sim.controller.history.recent()
+    assert all(r.created_at < profile.start + timedelta(days=1) for r in records)
+    replay = Simulation.from_config(config, RecordedProfile.from_records(records)).run()
+    assert replay.demand["store"] == sum(1 for r in records if r.task_type.value == "store_item")
+
+
+def test_load_generator_mix():
+    """Mixed traffic reports throughput, per-operation latency, lock contention and CPU per task"""
+    import json
+    from benchmark_omron import run_load_benchmark
+    from omron_asrs_loadgen import LoadMix
+
+    with open('omron_asrs_config.json', 'r') as f:
+        config = json.load(f)
+
+    mix = LoadMix.parse("store=4,retrieve=3,display=1,button=2")
+    assert str(LoadMix.parse(str(mix))) == str(mix)
+    result = run_load_benchmark(config, mix, clients=4, duration=1.0, mock_latency=0.001)
+    json.dumps(result)
+
+    assert result["tasks"] > 50 and result["tasks_per_sec"] > 0
+    assert result["cpu_per_task_ms"] > 0
+    for operation in ("store", "retrieve", "display", "button"):
+        stats = result["operations"][operation]
+        assert stats["issued"] > 0
+        assert stats.get("timeout", 0) == 0, (operation, stats)
+    assert result["operations"]["button"]["completed"] > 0  # operator presses -> auto-retrieve
+    assert result["locks"]["position_manager"]["acquisitions"] > 0
+    assert result["locks"]["dispatch"]["acquisitions"] > 0
+    assert "store_item" in result["controller_latency"]
+
+    # Tasks on one position within the same second still get distinct IDs
+    controller = _make_controller()
+    try:
+        controller.store_item_at_position(4, "DUP")
+        controller.wait_until_idle(timeout=5)
+        first = controller.retrieve_item_from_position(4)
+        second = controller.retrieve_item_from_position(4)
+        assert first.task_id != second.task_id
+        assert first.wait(5) and second.wait(5)
+    finally:
+        controller.stop()
+
+
+def test_tui_redraws_only_changed_cells():
+    """The live view turns a store into one cell change plus task progress"""
+    from omron_asrs_events import EventType
+    from omron_asrs_tui import RackView
+
+    controller = _make_controller()
+    try:
+        view = RackView(controller, task_rows=4)
+        subscription = controller.subscribe([EventType.TASK_STATE])
+        first = view.full()
+        assert first.full and len(first.cells) == 35 and first.header
+        assert not view.update()  # nothing happened, nothing to draw
+
+        controller.store_item_at_position(12, "TUI-1").wait(timeout=5)
+        frame = view.update(subscription.drain())
+        row, column = view.cell_of[12]
+        assert [(r, c, text) for r, c, text, _ in frame.cells] == [(row, column, "[12]")]
+        assert frame.cells[0][3] == "occupied"
+        assert frame.task_lines[0][1].startswith("ok STORE-")
+        assert "occupied 1/35" in frame.header[0]
+
+        # A running task restyles its cell until the task finishes
+        controller.retrieve_item_from_position(12).wait(timeout=5)
+        events = subscription.drain()
+        running = [e for e in events if e.data["status"] != "completed"]
+        view.update(running)
+        assert view.cell_style((row, column), "[12]") == "active"
+        frame = view.update([e for e in events if e not in running])
+        assert frame.cells == [(row, column, " 12 ", "empty")]
+        subscription.close()
+    finally:
+        controller.stop()
+
+
+def test_command_script(tmp_path, monkeypatch, capsys):
+    """Scripted commands are pipelined and reported as JSONL, one line per result"""
+    import io
+    import json
+    import sys
+    from omron_asrs_script import CommandScript
+
+    batch = tmp_path / "batch.csv"
+    batch.write_text("product_id,position\nCSV-1,20\nCSV-2,\n")
+    script = ["# shift start", "store S-1", "store S-2 7 priority=urgent", "wait",
+              "retrieve S-1", "retrieve #7", "retrieve MISSING", "store", f"batch store {batch}", "wait", "status"]
+
+    controller = _make_controller()
+    try:
+        output = io.StringIO()
+        summary = CommandScript(controller, output).run(script)
+    finally:
+        controller.stop()
+
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert records[-1] == {"summary": summary}
+    assert summary["commands"] == 10
+    assert (summary["ok"], summary["rejected"], summary["error"]) == (6, 1, 1)
+    by_line = {}
+    for record in records[:-1]:
+        by_line.setdefault(record["line"], []).append(record)
+    assert by_line[3][0]["position_id"] == 7 and by_line[3][0]["status"] == "completed"
+    assert by_line[5][0]["product_id"] == "S-1" and by_line[5][0]["status"] == "completed"
+    assert by_line[7][0]["status"] == "rejected"
+    assert by_line[8][0]["status"] == "error"
+    assert [r["position_id"] for r in by_line[9]][0] == 20 and len(by_line[9]) == 2
+    assert by_line[11][0]["system"]["storage"]["occupied_positions"] == 2
+
+    # A script that cannot be read is reported before the app ever connects
+    import omron_asrs_app
+    monkeypatch.setattr(omron_asrs_app.OmronASRSApplication, "initialize",
+                        lambda self: (_ for _ in ()).throw(AssertionError("connected")))
+    monkeypatch.setattr(sys, "argv", ["omron_asrs_app.py", "--script", str(tmp_path / "missing.txt")])
+    assert omron_asrs_app.main() == 1
+    assert "Cannot read script" in capsys.readouterr().err
+
+
+def test_rack_layout_compilation(tmp_path):
+    """Positions come from ranges and overrides; the compiled config is cached by file hash"""
+    import json
+    import os
+    from omron_asrs_layout import ConfigError, compile_config, load_config
+
+    with open('omron_asrs_config.json', 'r') as f:
+        config = json.load(f)
+    rack = config['storage_rack']
+    rack['layout'].update(rows=7, columns=10)
+    rack['positions']['ranges'] = [
+        {"rows": [1, 7], "columns": [1, 5]},
+        {"rack": "B", "rows": [1, 7], "columns": [6, 10], "first_id": 101,
+         "template": {"led_node": "ns=4;s={rack}_led{index}", "pushbutton_node": "ns=4;s={rack}_pb{index}"}}]
+    rack['positions']['overrides'] = {"35": None, "101": {"name": "Dock"}}
+
+    compiled = compile_config(config)
+    positions = {entry['id']: entry for entry in compiled['storage_positions'].values()}
+    assert len(positions) == compiled['storage_rack']['total_positions'] == 69
+    assert positions[1]['led_node'] == "ns=4;s=led1" and 35 not in positions
+    assert positions[101] == {"id": 101, "name": "Dock", "led_node": "ns=4;s=B_led1", "pushbutton_node": "ns=4;s=B_pb1",
+                              "row": 1, "column": 6, "rack": "B", "occupied": False, "product_id": None,
+                              "stored_at": None}
+    assert positions[135]['row'] == 7 and positions[135]['column'] == 10
+
+    # Cells only need to be unique within a rack
+    rack['positions']['ranges'][1]['columns'] = [1, 5]
+    compiled = compile_config(config)
+    assert {entry['id']: entry for entry in compiled['storage_positions'].values()}[101]['column'] == 1
+    rack['positions']['ranges'][1].pop('rack')
+    rack['positions']['ranges'][1]['template'] = {"led_node": "ns=4;s=B_led{index}", "pushbutton_node": "ns=4;s=B_pb{index}"}
+    try:
+        compile_config(config)
+        assert False, "overlapping cells in one rack accepted"
+    except ConfigError as e:
+        assert "cell (1, 1) is also used by position_01" in str(e)
+    rack['positions']['ranges'][1].update(rack="B", columns=[6, 10])
+
+    rack['positions']['overrides'] = {"2": {"led_node": "ns=4;s=led1"}, "3": {"row": 9}}
+    try:
+        compile_config(config)
+        assert False, "invalid overrides accepted"
+    except ConfigError as e:
+        assert len(e.problems) == 2 and "also used by position_01" in str(e)
+
+    path = str(tmp_path / "rack.json")
+    rack['positions']['overrides'] = {}
+    with open(path, 'w') as f:
+        json.dump(config, f)
+    assert load_config(path) == load_config(path, use_cache=False)
+    assert os.path.exists(path + ".cache")
+    with open(path + ".cache", 'rb') as f:
+        cached = f.read()
+    assert load_config(path)['storage_rack']['total_positions'] == 70
+
+    rack['layout']['columns'] = 5
+    rack['positions']['ranges'].pop()
+    with open(path, 'w') as f:
+        json.dump(config, f)
+    assert load_config(path)['storage_rack']['total_positions'] == 35  # file changed: recompiled
+    with open(path + ".cache", 'rb') as f:
+        assert f.read() != cached
+
+
+def test_import_has_no_side_effects():
+    """Importing the app configures no logging, prints nothing and defers heavy imports"""
+    import subprocess
+    import sys
+
+    code = ("import logging, sys, omron_asrs_app, omron_asrs_sim, omron_asrs_tui; "
+            "assert not logging.getLogger().handlers; "
+            "assert not {'opcua', 'http.server', 'curses'} & set(sys.modules), sys.modules")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=30)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == "" and result.stderr == ""
+
+
 if __name__ == "__main__":
     test_omron_system()
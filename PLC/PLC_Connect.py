@@ -1,8 +1,15 @@
 import time
 import threading
 import logging
+import math
+import operator
+from collections import deque
 from datetime import datetime
-from opcua import Client, ua
+
+try:
+    from opcua import Client, ua
+except ImportError:  # checked in connect(); lets the sequencing logic be imported and tested without it
+    Client = ua = None
 
 # --- Configuration Section ---
 PLC_URL = "opc.tcp://10.10.14.113:4840"
@@ -14,12 +21,6 @@ NODE_IDS = {
 }
 LOG_FILE = "plc_terminal_automation.log"
 
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s: %(message)s'
-)
-
 
 # --- Core PLC Controller ---
 class PLCController:
@@ -30,8 +31,17 @@ class PLCController:
         self.connected = False
         self.status = {}
         self.emergency_active = False
+        # Values pushed by the PLC (subscribe()); unlike status, never the value we just wrote
+        self.pushed = {}
+        self._changed = threading.Condition()
+        self._subscription = None
+        self._key_of = {node_id: key for key, node_id in node_ids.items()}
 
     def connect(self):
+        if Client is None:
+            print("Connect error: the opcua package is not installed (pip install opcua)")
+            logging.error("Connect error: opcua package not installed")
+            return False
         self.client = Client(self.url)
         try:
             self.client.connect()
@@ -47,6 +57,9 @@ class PLCController:
     def disconnect(self):
         try:
             if self.client and self.connected:
+                if self._subscription:
+                    self._subscription.delete()
+                    self._subscription = None
                 self.client.disconnect()
                 logging.info("Disconnected from PLC")
         except Exception as e:
@@ -77,6 +90,49 @@ class PLCController:
             logging.error(f"Write error ({key}): {e}")
             return False
 
+    def subscribe(self, keys=None, period_ms=20):
+        """Have the PLC push tag changes (used by wait_for); False means waits will poll"""
+        if not self.connected: return False
+        keys = list(keys or self.node_ids)
+        try:
+            self._subscription = self.client.create_subscription(period_ms, _TagChangeHandler(self))
+            self._subscription.subscribe_data_change([self.client.get_node(self.node_ids[k]) for k in keys])
+            logging.info(f"Subscribed to {keys} ({period_ms} ms)")
+            return True
+        except Exception as e:
+            logging.warning(f"Subscription failed, waits will poll: {e}")
+            self._subscription = None
+            return False
+
+    def _on_change(self, node_id, value):
+        key = self._key_of.get(node_id)
+        if key is None: return
+        with self._changed:
+            self.pushed[key] = value
+            self._changed.notify_all()
+
+    def wait_for(self, key, predicate, timeout, poll=0.02, cancelled=None):
+        """Wait until predicate(value) holds for a tag; returns (ok, last value seen)
+
+        Uses pushed values when the tag is subscribed, otherwise polls
+        read() every poll seconds. cancelled() ends the wait early.
+        """
+        deadline = time.monotonic() + timeout
+        if self._subscription and key in self.pushed:
+            with self._changed:
+                while True:
+                    value = self.pushed[key]
+                    if predicate(value): return True, value
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or (cancelled and cancelled()): return False, value
+                    self._changed.wait(min(remaining, 0.1))  # wake now and then to see cancellation
+        while True:
+            value = self.read(key)
+            if value is not None and predicate(value): return True, value
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (cancelled and cancelled()): return False, value
+            time.sleep(min(poll, remaining))
+
     # High-level controls
     def start_motor(self):
         return self.write('Motor_off', False)
@@ -114,6 +170,139 @@ class PLCController:
         logging.info("Emergency stop reset.")
 
 
+class _TagChangeHandler:
+    """opcua subscription callback: hands data changes to the controller"""
+    def __init__(self, plc):
+        self.plc = plc
+
+    def datachange_notification(self, node, val, data):
+        self.plc._on_change(node.nodeid.to_string(), val)
+
+
+# --- Step Conditions ---
+OPERATORS = {"==": operator.eq, "!=": operator.ne, ">": operator.gt,
+             ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+TIMEOUT_POLICIES = ("abort", "continue", "retry", "estop")
+
+
+class WaitUntil:
+    """Step wait that ends as soon as a tag meets a condition
+
+    on_timeout: "abort" ends the sequence, "continue" goes on to the next
+    step, "retry" repeats the step's action (retries times) and "estop"
+    triggers the emergency stop.
+    """
+    def __init__(self, key, op, value, timeout=5.0, on_timeout="abort", retries=1, poll=0.02):
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator: {op}")
+        if on_timeout not in TIMEOUT_POLICIES:
+            raise ValueError(f"Unknown timeout policy: {on_timeout}")
+        self.key = key
+        self.op = op
+        self.value = value
+        self.timeout = timeout
+        self.on_timeout = on_timeout
+        self.retries = retries
+        self.poll = poll
+
+    def check(self, value):
+        try:
+            return OPERATORS[self.op](value, self.value)
+        except TypeError:
+            return False
+
+    def __repr__(self):
+        return f"{self.key} {self.op} {self.value!r} (timeout {self.timeout}s, {self.on_timeout})"
+
+
+def wait_until(key, op, value, timeout=5.0, on_timeout="abort", retries=1):
+    """e.g. wait_until("mm", ">=", 50, timeout=5)"""
+    return WaitUntil(key, op, value, timeout, on_timeout, retries)
+
+
+def confirmed(key, value=True, timeout=2.0, on_timeout="abort", retries=1):
+    """The PLC reports the tag at the value just written, e.g. confirmed("output0", True)"""
+    return WaitUntil(key, "==", value, timeout, on_timeout, retries)
+
+
+# --- Cycle Scheduling ---
+class StepScheduler:
+    """Absolute monotonic deadlines for sequence steps
+
+    A fixed wait runs from the step's scheduled start, not from the end of
+    its (blocking) PLC write, so write latency never accumulates. With a
+    period, cycles start on a fixed grid; a cycle that runs past its slot
+    is an overrun and the missed slots are skipped rather than run
+    back-to-back. A step whose write outlasts its wait is an overrun too,
+    and the schedule restarts from that moment instead of shortening the
+    following steps.
+    """
+    def __init__(self, period=None, window=1000, tolerance=0.001):
+        self.period = period
+        self.tolerance = tolerance  # lateness (s) a step may have before it counts as an overrun
+        self.target = None
+        self.anchor = None
+        self.slot = 0
+        self.overruns = 0
+        self.lateness = deque(maxlen=window)  # wake-up lateness (s) of the last steps
+
+    def begin_cycle(self, cancelled=None):
+        """Sleep until the next cycle's start; False if cancelled"""
+        now = time.monotonic()
+        if self.target is None:
+            self.anchor = self.target = now
+            return True
+        if self.period:
+            self.slot += 1
+            start = self.anchor + self.slot * self.period
+            if now - start > self.tolerance:
+                missed = math.ceil((now - start) / self.period)
+                self.overruns += 1
+                logging.warning(f"Cycle overran its {self.period}s period, skipping {missed} slot(s)")
+                self.slot += missed
+                start = self.anchor + self.slot * self.period
+            self.target = start
+        return self.sleep_until(self.target, cancelled)
+
+    def dwell(self, seconds, cancelled=None):
+        """End a fixed-wait step seconds after its scheduled start; False if cancelled"""
+        self.target += seconds
+        if seconds <= 0:
+            return True  # the next step is due at the same target
+        late = time.monotonic() - self.target
+        if late > self.tolerance:
+            self.overruns += 1
+            logging.warning(f"Step overran its {seconds}s wait by {late * 1000:.1f} ms")
+            self.resync()
+            return True
+        return self.sleep_until(self.target, cancelled)
+
+    def resync(self):
+        """The next step starts now (after a condition wait or an overrun)"""
+        self.target = time.monotonic()
+
+    def sleep_until(self, deadline, cancelled=None):
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if cancelled and cancelled():
+                return False
+            time.sleep(min(remaining, 0.1))  # stay responsive to stop/emergency
+        self.lateness.append(time.monotonic() - deadline)
+        return True
+
+    def jitter(self):
+        """Wake-up lateness in ms: mean, p99 and max over the recent steps"""
+        if not self.lateness:
+            return {}
+        ordered = sorted(self.lateness)
+        p99 = ordered[min(len(ordered) - 1, math.ceil(0.99 * len(ordered)) - 1)]
+        return {"mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+                "p99_ms": round(p99 * 1000, 3), "max_ms": round(ordered[-1] * 1000, 3),
+                "samples": len(ordered)}
+
+
 # --- Automation Sequence System ---
 class AutomationEngine:
     def __init__(self, plc):
@@ -121,47 +310,113 @@ class AutomationEngine:
         self.running = False
         self.should_stop = False
         self.thread = None
-        self.stats = {"runs": 0, "last_success": None, "errors": 0}
-
-    # Example: Each step is a tuple (action, kwargs, wait_time)
-    # e.g., steps = [("set_mm", {"v": 20.0}, 1), ("start_motor", {}, 5), ...]
-    def run_sequence(self, steps, repeat=1, auto_stop=True):
+        self.stats = {"runs": 0, "last_success": None, "errors": 0, "stopped": 0, "timeouts": 0, "last_cycle_s": None,
+                      "overruns": 0, "jitter": {}}
+
+    # Each step is a tuple (action, kwargs, wait): wait is a fixed time in
+    # seconds or a WaitUntil condition; action "wait" only waits.
+    # e.g., steps = [("set_mm", {"v": 20.0}, wait_until("mm", "==", 20.0)), ("start_motor", {}, 5), ...]
+    # period (s) starts cycles on a fixed grid; without it cycles run back-to-back,
+    # which for fixed waits alone is a period of their sum.
+    def run_sequence(self, steps, repeat=1, auto_stop=True, period=None):
         self.running = True
         self.should_stop = False
         cycle = 0
+        outcome = "done"  # "done", "stopped" (user stop / e-stop) or "failed" (condition timed out)
+        scheduler = StepScheduler(period)
+        fixed = sum(wait for (_, _, wait) in steps if not isinstance(wait, WaitUntil))
+        if period and fixed > period:
+            logging.warning(f"Fixed waits ({fixed}s) exceed the {period}s period: every cycle will overrun")
         try:
             while (repeat == 0 or cycle < repeat) and not self.should_stop and not self.plc.emergency_active:
+                if not scheduler.begin_cycle(self._cancelled):
+                    outcome = "stopped"
+                    break
                 logging.info(f"Sequence start cycle {cycle + 1}")
-                for (action, p, wait_s) in steps:
-                    if self.should_stop or self.plc.emergency_active:
-                        break
+                cycle_started = time.monotonic()
+                for (action, p, wait) in steps:
                     # Safety: Check for emergency stop in every step
-                    if hasattr(self.plc, action):
-                        fn = getattr(self.plc, action)
-                        if p:
-                            fn(**p)
-                        else:
-                            fn()
-                        time.sleep(wait_s)
-                        logging.info(f"Step: {action}, Params: {p}, Wait: {wait_s}s")
+                    if self._cancelled():
+                        outcome = "stopped"
+                        break
+                    outcome = self._run_step(action, p, wait, scheduler)
+                    if outcome != "done":
+                        break
+                self.stats["overruns"] += scheduler.overruns
+                scheduler.overruns = 0
+                self.stats["jitter"] = scheduler.jitter()
+                if outcome != "done":
+                    break
+                self.stats["last_cycle_s"] = round(time.monotonic() - cycle_started, 3)
+                logging.info(f"Cycle {cycle + 1} took {self.stats['last_cycle_s']}s")
                 cycle += 1
-            self.stats["runs"] += 1
-            self.stats["last_success"] = datetime.now().isoformat()
+            # A sequence stopped before its last cycle (always so for repeat=0) is
+            # recorded as stopped, whether the stop lands in a wait or between steps
+            if outcome == "done" and (repeat == 0 or cycle < repeat):
+                outcome = "stopped"
+            if outcome == "failed":
+                self.stats["errors"] += 1
+                logging.error("Sequence aborted")
+            elif outcome == "stopped":
+                self.stats["stopped"] += 1
+                logging.info(f"Sequence stopped after {cycle} cycle(s)")
+            else:
+                self.stats["runs"] += 1
+                self.stats["last_success"] = datetime.now().isoformat()
+                logging.info("Sequence completed")
             if auto_stop: self.plc.stop_motor()
-            logging.info("Sequence completed")
         except Exception as e:
             print(f"Automation error: {e}")
             logging.error(f"Automation error: {e}")
             self.stats["errors"] += 1
         self.running = False
 
-    def start_sequence_async(self, steps, repeat=1, auto_stop=True):
+    def _cancelled(self):
+        return self.should_stop or self.plc.emergency_active
+
+    def _run_step(self, action, p, wait, scheduler):
+        """Run one step: "done", "stopped" (cancelled) or "failed" (timed out and the policy ends the sequence)"""
+        if action != "wait" and not hasattr(self.plc, action):
+            return "done"
+        attempts = 1 + (wait.retries if isinstance(wait, WaitUntil) and wait.on_timeout == "retry" else 0)
+        for attempt in range(attempts):
+            started = time.monotonic()
+            if action != "wait":
+                fn = getattr(self.plc, action)
+                if p:
+                    fn(**p)
+                else:
+                    fn()
+            if not isinstance(wait, WaitUntil):
+                logging.info(f"Step: {action}, Params: {p}, Wait: {wait}s")
+                return "done" if scheduler.dwell(wait, self._cancelled) else "stopped"
+            ok, value = self.plc.wait_for(wait.key, wait.check, wait.timeout, wait.poll,
+                                          cancelled=self._cancelled)
+            elapsed = time.monotonic() - started
+            scheduler.resync()
+            if ok:
+                logging.info(f"Step: {action}, Params: {p}, Until: {wait.key} {wait.op} {wait.value!r} "
+                             f"in {elapsed:.3f}s")
+                return "done"
+            if self._cancelled():
+                return "stopped"
+            self.stats["timeouts"] += 1
+            logging.warning(f"Step: {action} timed out after {elapsed:.3f}s waiting for {wait} "
+                            f"(last value {value!r}, attempt {attempt + 1}/{attempts})")
+        if wait.on_timeout == "continue":
+            return "done"
+        if wait.on_timeout == "estop":
+            self.plc.emergency_stop()
+        print(f"Sequence step {action} failed: {wait.key} never reached {wait.op} {wait.value!r}")
+        return "failed"
+
+    def start_sequence_async(self, steps, repeat=1, auto_stop=True, period=None):
         if self.running:
             print("Automation already running.")
             return
         # Start sequence in a background thread
         self.thread = threading.Thread(
-            target=self.run_sequence, args=(steps, repeat, auto_stop)
+            target=self.run_sequence, args=(steps, repeat, auto_stop, period)
         )
         self.thread.start()
 
@@ -196,20 +451,20 @@ class Monitor(threading.Thread):
 def main_menu(plc, automation, monitor):
     sequences = {
         "cycle_auto": [  # Example professional sequence — edit to your process
-            ("set_mm", {"v": 50.0}, 1),
-            ("output_on", {}, 1),
-            ("relay_on", {}, 1),
-            ("start_motor", {}, 5),
-            ("output_off", {}, 1),
-            ("relay_off", {}, 1),
-            ("stop_motor", {}, 1),
+            ("set_mm", {"v": 50.0}, wait_until("mm", ">=", 50.0, timeout=5)),
+            ("output_on", {}, confirmed("output0", True)),
+            ("relay_on", {}, confirmed("Relay1", True)),
+            ("start_motor", {}, 5),  # process time: the motor runs for 5 s
+            ("output_off", {}, confirmed("output0", False)),
+            ("relay_off", {}, confirmed("Relay1", False)),
+            ("stop_motor", {}, confirmed("Motor_off", True)),
         ],
         "batch_process": [
-            ("set_mm", {"v": 100.0}, 1),
+            ("set_mm", {"v": 100.0}, wait_until("mm", "==", 100.0, timeout=5, on_timeout="retry")),
             ("start_motor", {}, 3),
-            ("set_mm", {"v": 110.0}, 1),
+            ("set_mm", {"v": 110.0}, wait_until("mm", "==", 110.0, timeout=5, on_timeout="retry")),
             ("start_motor", {}, 2),
-            ("stop_motor", {}, 1),
+            ("stop_motor", {}, confirmed("Motor_off", True, on_timeout="estop")),
         ]
     }
 
@@ -252,7 +507,8 @@ def main_menu(plc, automation, monitor):
                 plc.emergency_reset()
             elif ch == "11":
                 repeat = int(input("Repeat? (0 = infinite): ") or "1")
-                automation.start_sequence_async(sequences["cycle_auto"], repeat)
+                period = float(input("Cycle period in s (blank = back-to-back): ") or "0")
+                automation.start_sequence_async(sequences["cycle_auto"], repeat, period=period or None)
             elif ch == "12":
                 automation.start_sequence_async(sequences["batch_process"])
             elif ch == "13":
@@ -279,11 +535,18 @@ def main_menu(plc, automation, monitor):
 
 # --- Main App ---
 if __name__ == "__main__":
+    logging.basicConfig(
+        filename=LOG_FILE,
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s: %(message)s'
+    )
     plc = PLCController(PLC_URL, NODE_IDS)
     print("Connecting to PLC...")
     if not plc.connect():
         print("PLC connect failed. Exiting.")
         exit(1)
+    # Sequence waits react to pushed changes; without a subscription they poll
+    plc.subscribe()
     automation = AutomationEngine(plc)
     monitor = Monitor(plc, interval=2)
     try:
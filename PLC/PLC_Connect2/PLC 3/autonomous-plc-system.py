@@ -7,7 +7,9 @@ Controls PLC via OPC UA with complete automation and safety systems
 import time
 import threading
 import logging
+import os
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from opcua import Client, ua
 import sys
 
@@ -46,6 +48,73 @@ logging.basicConfig(
 )
 
 
+# Optional Prometheus metrics (stdlib only). Scrapes are served from counters
+# kept in memory and never read from the PLC.
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = int(os.environ.get("PLC_METRICS_PORT", "0"))  # 0 = disabled
+PLC_IO_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+CYCLE_BUCKETS = (5, 10, 15, 20, 30, 45, 60, 90, 120)
+
+
+class LatencyHistogram:
+    """Cumulative Prometheus histogram, safe to observe from any thread"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    self.counts[index] += 1
+                    break
+            self.total += seconds
+            self.count += 1
+
+    def render(self, name, labels=""):
+        with self._lock:
+            counts, total, count = list(self.counts), self.total, self.count
+        prefix = labels + "," if labels else ""
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {total}")
+        lines.append(f"{name}_count{suffix} {count}")
+        return lines
+
+
+def start_metrics_server(render, port, host=METRICS_HOST):
+    """Serve render() at http://host:port/metrics from a daemon thread"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    logging.info(f"📈 Metrics available at http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
 class AutonomousPLCSystem:
     def __init__(self):
         self.client = None
@@ -70,6 +139,14 @@ class AutonomousPLCSystem:
         self.position_out_of_range = False
         self.last_successful_cycle = None
 
+        # Metrics (see render_metrics)
+        self.cycles_attempted = 0
+        self.connection_attempts = 0
+        self.read_latency = LatencyHistogram(PLC_IO_BUCKETS)
+        self.write_latency = LatencyHistogram(PLC_IO_BUCKETS)
+        self.cycle_times = LatencyHistogram(CYCLE_BUCKETS)
+        self.metrics_server = None
+
     def connect(self):
         """Connect to PLC with retry logic"""
         max_retries = 5
@@ -78,6 +155,7 @@ class AutonomousPLCSystem:
         for attempt in range(max_retries):
             try:
                 logging.info(f"Connection attempt {attempt + 1}/{max_retries}")
+                self.connection_attempts += 1
                 self.client = Client(PLC_URL)
                 self.client.set_timeout(10)
                 self.client.connect()
@@ -117,6 +195,7 @@ class AutonomousPLCSystem:
         if not self.connected:
             return None
 
+        started = time.perf_counter()
         try:
             node = self.client.get_node(NODE_IDS[node_key])
             value = node.get_value()
@@ -126,6 +205,8 @@ class AutonomousPLCSystem:
             self.error_count += 1
             self.consecutive_errors += 1
             return None
+        finally:
+            self.read_latency.observe(time.perf_counter() - started)
 
     def write_value(self, node_key, value):
         """Write value to PLC with safety checks"""
@@ -137,6 +218,7 @@ class AutonomousPLCSystem:
             logging.warning(f"Emergency active - write blocked for {node_key}")
             return False
 
+        started = time.perf_counter()
         try:
             node = self.client.get_node(NODE_IDS[node_key])
             dtype = node.get_data_type_as_variant_type()
@@ -159,6 +241,9 @@ class AutonomousPLCSystem:
 
             return False
 
+        finally:
+            self.write_latency.observe(time.perf_counter() - started)
+
     def read_all_status(self):
         """Read all PLC variables and update status"""
         status = {}
@@ -287,6 +372,7 @@ class AutonomousPLCSystem:
         logging.info(f"🔄 Starting production cycle #{cycle_number}")
 
         cycle_start_time = time.time()
+        self.cycles_attempted += 1
 
         try:
             # Phase 1: Safety verification
@@ -374,6 +460,9 @@ class AutonomousPLCSystem:
             self.emergency_stop()
             return False
 
+        finally:
+            self.cycle_times.observe(time.time() - cycle_start_time)
+
     def autonomous_operation_loop(self):
         """Main autonomous operation loop"""
         logging.info("🤖 Autonomous operation started")
@@ -520,6 +609,47 @@ class AutonomousPLCSystem:
             "Current Position": f"{self.current_status.get('mm', 'N/A')} mm"
         }
 
+    def render_metrics(self):
+        """Prometheus text format from in-memory counters (no PLC access)"""
+        success_rate = self.cycle_count / self.cycles_attempted if self.cycles_attempted else 0
+        position = self.current_status.get("mm")  # cached by the monitoring loop
+        lines = [
+            "# TYPE plc_cycles_total counter",
+            f"plc_cycles_total {self.cycles_attempted}",
+            "# TYPE plc_cycles_successful_total counter",
+            f"plc_cycles_successful_total {self.cycle_count}",
+            "# TYPE plc_cycle_success_ratio gauge",
+            f"plc_cycle_success_ratio {success_rate}",
+            "# TYPE plc_errors_total counter",
+            f"plc_errors_total {self.error_count}",
+            "# TYPE plc_consecutive_errors gauge",
+            f"plc_consecutive_errors {self.consecutive_errors}",
+            "# TYPE plc_connection_attempts_total counter",
+            f"plc_connection_attempts_total {self.connection_attempts}",
+            "# TYPE plc_connected gauge",
+            f"plc_connected {int(self.connected)}",
+            "# TYPE plc_emergency_active gauge",
+            f"plc_emergency_active {int(self.emergency_active)}",
+            "# TYPE plc_autonomous_running gauge",
+            f"plc_autonomous_running {int(self.autonomous_running)}",
+            "# TYPE plc_uptime_seconds gauge",
+            f"plc_uptime_seconds {(datetime.now() - self.start_time).total_seconds():.0f}",
+        ]
+        if isinstance(position, (int, float)):
+            lines += ["# TYPE plc_lvdt_position_mm gauge", f"plc_lvdt_position_mm {position}"]
+        lines.append("# TYPE plc_cycle_duration_seconds histogram")
+        lines += self.cycle_times.render("plc_cycle_duration_seconds")
+        lines.append("# TYPE plc_io_seconds histogram")
+        lines += self.read_latency.render("plc_io_seconds", 'operation="read"')
+        lines += self.write_latency.render("plc_io_seconds", 'operation="write"')
+        return "\n".join(lines) + "\n"
+
+    def start_metrics(self, port=METRICS_PORT, host=METRICS_HOST):
+        """Start the optional metrics endpoint (localhost only by default)"""
+        if port and self.metrics_server is None:
+            self.metrics_server = start_metrics_server(self.render_metrics, port, host)
+        return self.metrics_server
+
     def print_system_status(self):
         """Print comprehensive system status"""
         print("\n" + "=" * 70)
@@ -559,6 +689,7 @@ def main():
 
     # Create system instance
     system = AutonomousPLCSystem()
+    system.start_metrics()
 
     try:
         # Connect to PLC
@@ -597,6 +728,8 @@ def main():
     finally:
         print("\n🛑 Shutting down system...")
         system.disconnect()
+        if system.metrics_server:
+            system.metrics_server.shutdown()
         print("✅ System shutdown complete")
         print("📝 Check 'autonomous_plc.log' for complete operation log")
 
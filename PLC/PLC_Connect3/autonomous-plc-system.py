@@ -6,7 +6,9 @@ import threading
 import logging
 import signal
 import sys
+import os
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from opcua import Client, ua
 
 # PLC Configuration
@@ -43,6 +45,73 @@ logging.basicConfig(
     ]
 )
 
+# Optional Prometheus metrics (stdlib only). Scrapes are served from counters
+# kept in memory and never read from the PLC.
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = int(os.environ.get("PLC_METRICS_PORT", "0"))  # 0 = disabled
+PLC_IO_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+CYCLE_BUCKETS = (5, 10, 15, 20, 30, 45, 60, 90, 120)
+
+
+class LatencyHistogram:
+    """Cumulative Prometheus histogram, safe to observe from any thread"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    self.counts[index] += 1
+                    break
+            self.total += seconds
+            self.count += 1
+
+    def render(self, name, labels=""):
+        with self._lock:
+            counts, total, count = list(self.counts), self.total, self.count
+        prefix = labels + "," if labels else ""
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {total}")
+        lines.append(f"{name}_count{suffix} {count}")
+        return lines
+
+
+def start_metrics_server(render, port, host=METRICS_HOST):
+    """Serve render() at http://host:port/metrics from a daemon thread"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    logging.info(f"📈 Metrics available at http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
 class AutonomousPLCSystem:
     def __init__(self):
         self.client = None
@@ -65,6 +134,13 @@ class AutonomousPLCSystem:
         self.current_status = {}
         self.last_cycle_time = 0
         
+        # Metrics (see render_metrics)
+        self.connection_attempts = 0
+        self.read_latency = LatencyHistogram(PLC_IO_BUCKETS)
+        self.write_latency = LatencyHistogram(PLC_IO_BUCKETS)
+        self.cycle_times = LatencyHistogram(CYCLE_BUCKETS)
+        self.metrics_server = None
+        
         # Setup emergency signal handler
         signal.signal(signal.SIGINT, self._emergency_signal_handler)
         signal.signal(signal.SIGTERM, self._emergency_signal_handler)
@@ -83,6 +159,7 @@ class AutonomousPLCSystem:
         for attempt in range(max_attempts):
             try:
                 logging.info(f"🔌 Connection attempt {attempt + 1}/{max_attempts}")
+                self.connection_attempts += 1
                 self.client = Client(PLC_URL)
                 self.client.set_timeout(15)
                 self.client.connect()
@@ -110,17 +187,21 @@ class AutonomousPLCSystem:
         """Read value with error handling"""
         if not self.connected:
             return None
+        started = time.perf_counter()
         try:
             node = self.client.get_node(NODE_IDS[node_key])
             return node.get_value()
         except Exception as e:
             logging.error(f"Read error {node_key}: {e}")
             return None
+        finally:
+            self.read_latency.observe(time.perf_counter() - started)
     
     def write_value(self, node_key, value):
         """Write value with safety checks"""
         if not self.connected or self.emergency_active:
             return False
+        started = time.perf_counter()
         try:
             node = self.client.get_node(NODE_IDS[node_key])
             node.set_value(value)
@@ -129,6 +210,8 @@ class AutonomousPLCSystem:
         except Exception as e:
             logging.error(f"Write error {node_key}: {e}")
             return False
+        finally:
+            self.write_latency.observe(time.perf_counter() - started)
     
     def check_emergency_conditions(self):
         """Check for emergency conditions"""
@@ -247,6 +330,9 @@ class AutonomousPLCSystem:
             # Emergency shutdown on critical errors
             self.emergency_shutdown()
             return False
+        
+        finally:
+            self.cycle_times.observe(time.time() - cycle_start)
     
     def autonomous_main_loop(self):
         """Main autonomous operation loop - runs forever until emergency"""
@@ -333,6 +419,45 @@ class AutonomousPLCSystem:
                     f"Success: {success_rate:.1f}%, Errors: {self.error_count}, "
                     f"Position: {status['mm']}mm, Emergency: {status['Motor_off']}")
     
+    def render_metrics(self):
+        """Prometheus text format from in-memory counters (no PLC access)"""
+        success_rate = self.successful_cycles / self.total_cycles if self.total_cycles else 0
+        position = self.current_status.get("mm")  # cached by the monitoring thread
+        lines = [
+            "# TYPE plc_cycles_total counter",
+            f"plc_cycles_total {self.total_cycles}",
+            "# TYPE plc_cycles_successful_total counter",
+            f"plc_cycles_successful_total {self.successful_cycles}",
+            "# TYPE plc_cycle_success_ratio gauge",
+            f"plc_cycle_success_ratio {success_rate}",
+            "# TYPE plc_errors_total counter",
+            f"plc_errors_total {self.error_count}",
+            "# TYPE plc_consecutive_errors gauge",
+            f"plc_consecutive_errors {self.consecutive_errors}",
+            "# TYPE plc_connection_attempts_total counter",
+            f"plc_connection_attempts_total {self.connection_attempts}",
+            "# TYPE plc_connected gauge",
+            f"plc_connected {int(self.connected)}",
+            "# TYPE plc_emergency_active gauge",
+            f"plc_emergency_active {int(self.emergency_active)}",
+            "# TYPE plc_uptime_seconds gauge",
+            f"plc_uptime_seconds {(datetime.now() - self.start_time).total_seconds():.0f}",
+        ]
+        if isinstance(position, (int, float)):
+            lines += ["# TYPE plc_lvdt_position_mm gauge", f"plc_lvdt_position_mm {position}"]
+        lines.append("# TYPE plc_cycle_duration_seconds histogram")
+        lines += self.cycle_times.render("plc_cycle_duration_seconds")
+        lines.append("# TYPE plc_io_seconds histogram")
+        lines += self.read_latency.render("plc_io_seconds", 'operation="read"')
+        lines += self.write_latency.render("plc_io_seconds", 'operation="write"')
+        return "\n".join(lines) + "\n"
+    
+    def start_metrics(self, port=METRICS_PORT, host=METRICS_HOST):
+        """Start the optional metrics endpoint (localhost only by default)"""
+        if port and self.metrics_server is None:
+            self.metrics_server = start_metrics_server(self.render_metrics, port, host)
+        return self.metrics_server
+    
     def start_monitoring(self):
         """Start background monitoring"""
         def monitor():
@@ -349,6 +474,7 @@ class AutonomousPLCSystem:
     def run_autonomous_system(self):
         """Start the fully autonomous system"""
         logging.info("🚀 STARTING AUTONOMOUS PLC SYSTEM")
+        self.start_metrics()
         
         # Connect to PLC
         if not self.connect_with_retry():
@@ -369,6 +495,8 @@ class AutonomousPLCSystem:
         # Cleanup
         if self.client and self.connected:
             self.client.disconnect()
+        if self.metrics_server:
+            self.metrics_server.shutdown()
         
         # Final status report
         runtime = datetime.now() - self.start_time
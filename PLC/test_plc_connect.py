@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+PLC Terminal Automation Tests
+Sequence waits and scheduling against a fake OPC UA client (no PLC needed)
+"""
+
+import time
+
+
+class _FakeNode:
+    def __init__(self, values, node_id):
+        self.values = values
+        self.node_id = node_id
+
+    def get_value(self):
+        value = self.values[self.node_id]
+        return value() if callable(value) else value
+
+
+class _FakeClient:
+    """Tag values are constants or callables, so a test can script how they change over time"""
+
+    def __init__(self, values):
+        self.values = values
+
+    def get_node(self, node_id):
+        return _FakeNode(self.values, node_id)
+
+
+def _make_plc(**values):
+    """Connected PLCController on a fake client; unset tags read as 0"""
+    from PLC_Connect import NODE_IDS, PLCController
+
+    plc = PLCController("opc.tcp://fake:4840", NODE_IDS)
+    plc.client = _FakeClient({node_id: values.get(key, 0) for key, node_id in NODE_IDS.items()})
+    plc.connected = True
+    return plc
+
+
+def test_wait_until_satisfied():
+    """A condition wait ends as soon as the tag gets there, polled or pushed"""
+    import threading
+    from PLC_Connect import NODE_IDS, AutomationEngine, WaitUntil, wait_until
+
+    started = time.monotonic()
+    plc = _make_plc(mm=lambda: (time.monotonic() - started) * 500)  # reaches 50 after 0.1 s
+    engine = AutomationEngine(plc)
+    engine.run_sequence([("wait", {}, wait_until("mm", ">=", 50, timeout=2))], auto_stop=False)
+    assert engine.stats["runs"] == 1 and engine.stats["errors"] == 0 and engine.stats["timeouts"] == 0
+    assert 0.09 <= engine.stats["last_cycle_s"] < 1
+
+    # Subscribed tags are woken by the PLC's data-change notifications, not polled
+    plc = _make_plc()
+    plc._subscription = object()
+    plc._on_change(NODE_IDS["output0"], False)
+    threading.Timer(0.05, plc._on_change, (NODE_IDS["output0"], True)).start()
+    ok, value = plc.wait_for("output0", lambda v: v is True, timeout=2)
+    assert ok and value is True
+
+    try:
+        WaitUntil("mm", "=>", 50)
+        assert False, "unknown operator accepted"
+    except ValueError:
+        pass
+
+
+def test_wait_until_timeout_policies():
+    """A timed-out condition aborts the sequence unless its policy says otherwise"""
+    from PLC_Connect import AutomationEngine, wait_until
+
+    plc = _make_plc(mm=10)
+    engine = AutomationEngine(plc)
+    reads = []
+    plc.get_all = lambda: reads.append(time.monotonic())
+
+    # abort: the sequence stops at the failed step and counts as an error
+    engine.run_sequence([("wait", {}, wait_until("mm", ">=", 50, timeout=0.05)),
+                         ("get_all", {}, 0)], auto_stop=False)
+    assert engine.stats["timeouts"] == 1 and engine.stats["errors"] == 1 and engine.stats["runs"] == 0
+    assert reads == []
+
+    # retry re-runs the step before giving up; continue moves on to the next step
+    engine.run_sequence([("get_all", {}, wait_until("mm", ">=", 50, timeout=0.05, on_timeout="retry", retries=2))],
+                        auto_stop=False)
+    assert len(reads) == 3 and engine.stats["timeouts"] == 4 and engine.stats["errors"] == 2
+    engine.run_sequence([("wait", {}, wait_until("mm", ">=", 50, timeout=0.05, on_timeout="continue")),
+                         ("get_all", {}, 0)], auto_stop=False)
+    assert len(reads) == 4 and engine.stats["runs"] == 1
+
+    # estop trips the emergency stop
+    engine.run_sequence([("wait", {}, wait_until("mm", ">=", 50, timeout=0.05, on_timeout="estop"))],
+                        auto_stop=False)
+    assert plc.emergency_active and engine.stats["errors"] == 3
+
+
+def test_wait_until_cancelled():
+    """Stopping the engine ends a pending condition wait right away, without a timeout"""
+    import threading
+    from PLC_Connect import AutomationEngine, wait_until
+
+    plc = _make_plc(mm=10)
+    engine = AutomationEngine(plc)
+    engine.start_sequence_async([("wait", {}, wait_until("mm", ">=", 50, timeout=5))], auto_stop=False)
+    time.sleep(0.05)
+    started = time.monotonic()
+    engine.stop()
+    assert time.monotonic() - started < 1
+    assert not engine.thread.is_alive() and not engine.running
+    assert engine.stats["timeouts"] == 0 and engine.stats["stopped"] == 1 and engine.stats["errors"] == 0
+
+    # An emergency stop cancels the wait the same way
+    waiting = threading.Timer(0.05, setattr, (plc, "emergency_active", True))
+    waiting.start()
+    started = time.monotonic()
+    ok, value = plc.wait_for("mm", lambda v: v >= 50, timeout=5,
+                             cancelled=lambda: plc.emergency_active)
+    assert not ok and value == 10 and time.monotonic() - started < 1
+
+
+def test_stop_during_fixed_dwell():
+    """A stop is recorded as stopped, never as an error or a success, wherever it lands"""
+    from PLC_Connect import AutomationEngine
+
+    plc = _make_plc()
+    engine = AutomationEngine(plc)
+    engine.start_sequence_async([("wait", {}, 5), ("get_all", {}, 0)], auto_stop=False)
+    time.sleep(0.05)
+    started = time.monotonic()
+    engine.stop()
+    assert time.monotonic() - started < 1
+    assert engine.stats["stopped"] == 1 and engine.stats["errors"] == 0
+    assert engine.stats["runs"] == 0 and engine.stats["last_success"] is None
+
+    # Stopping an endless run between steps gives the same outcome
+    engine.start_sequence_async([("get_all", {}, 0.001)], repeat=0, auto_stop=False)
+    time.sleep(0.05)
+    engine.stop()
+    assert engine.stats["stopped"] == 2 and engine.stats["errors"] == 0 and engine.stats["runs"] == 0
+
+    # An emergency stop mid-dwell too
+    engine.start_sequence_async([("wait", {}, 5)], auto_stop=False)
+    time.sleep(0.05)
+    plc.emergency_active = True
+    engine.thread.join(timeout=1)
+    assert not engine.running and engine.stats["stopped"] == 3 and engine.stats["errors"] == 0
+
+
+class _FakeTime:
+    """Stands in for the time module: sleep() advances the clock, overshooting like a real one"""
+
+    def __init__(self, overshoot=0.001):
+        self.now = 0.0
+        self.overshoot = overshoot
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds + self.overshoot
+
+
+def test_step_scheduler_deadlines(monkeypatch):
+    """Fixed waits run to absolute deadlines; overruns, skipped slots and lateness are counted"""
+    import PLC_Connect
+    from PLC_Connect import AutomationEngine, StepScheduler
+
+    fake = _FakeTime()
+    monkeypatch.setattr(PLC_Connect, "time", fake)
+
+    scheduler = StepScheduler()
+    assert scheduler.begin_cycle() and scheduler.target == 0.0
+    fake.now += 0.03  # a 30 ms write does not add to the step's 100 ms wait
+    assert scheduler.dwell(0.1)
+    assert abs(fake.now - 0.101) < 1e-9
+
+    # A step without a wait is never an overrun, however long its write takes
+    fake.now += 0.02
+    assert scheduler.dwell(0) and scheduler.overruns == 0 and scheduler.target == 0.1
+    # ...but a write that outlasts the step's wait is, and the schedule restarts from there
+    fake.now += 0.05
+    assert scheduler.dwell(0.01)
+    assert scheduler.overruns == 1 and scheduler.target == fake.now
+
+    # Periodic cycles: a late cycle skips the slots it missed instead of bunching up
+    fake.now = 0.0
+    scheduler = StepScheduler(period=1.0)
+    assert scheduler.begin_cycle()
+    fake.now = 0.4
+    assert scheduler.begin_cycle() and scheduler.target == 1.0 and scheduler.overruns == 0
+    fake.now += 2.5
+    assert scheduler.begin_cycle()
+    assert scheduler.overruns == 1 and scheduler.slot == 4 and scheduler.target == 4.0
+    # Finishing within the tolerance of the next slot is on time
+    fake.now = 5.0005
+    assert scheduler.begin_cycle() and scheduler.overruns == 1 and scheduler.target == 5.0
+
+    jitter = scheduler.jitter()
+    assert jitter["samples"] == 3 and abs(jitter["max_ms"] - 1.0) < 1e-6
+
+    # A whole sequence with zero-length steps holds its period without overruns
+    fake.now = 0.0
+    plc = _make_plc()
+    starts = []
+    plc.get_all = lambda: starts.append(fake.now)
+    engine = AutomationEngine(plc)
+    engine.run_sequence([("get_all", {}, 0), ("wait", {}, 0.05), ("get_all", {}, 0)],
+                        repeat=3, auto_stop=False, period=0.1)
+    assert engine.stats["overruns"] == 0 and engine.stats["runs"] == 1
+    assert [round(at, 3) for at in starts[::2]] == [0.0, 0.101, 0.201]